@@ -1,51 +1,108 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, Response,send_file
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, request, jsonify, session, redirect, Response,send_file, g, abort
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 import sqlite3
-import uuid
+import io
+import math
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 import os
+import http.client
+import mimetypes
 import cv2
 import numpy as np
-from yolo_detector import WasteDetector
-from ultralytics import YOLO
+from yolo_detector import ModelLoader, ModelRegistry, MODEL_PATH, parse_inference_options
+from cameras import CameraRegistry
+from latency_budget import build_ladder
+from thread_budget import load_budget, apply_budget
+import telemetry
+import archive
+from profile_cache import ProfileCache
+import avatars
+import assets
+import http_cache
+import metrics
+from passwords import PasswordHasher, HasherBusy, Throttle
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-wasteai'
 
-# Chemin de la base de données
-DB_PATH = os.path.join(os.path.dirname(__file__), 'waste.db')
-
-# Initialiser le détecteur YOLO
-try:
-    YOLO_DETECTOR = WasteDetector('my_model.pt')
-    print("✅ Modèle YOLO personnalisé (my_model.pt) chargé avec succès")
-except Exception as e:
-    print(f"⚠️ Erreur chargement YOLO: {e}")
-    YOLO_DETECTOR = None
-
-# Variable globale pour la caméra
-camera = None
-detection_buffer = {}  # Buffer pour accumuler les détections
-frame_count = 0  # Compteur de frames
-SAVE_INTERVAL = 10  # Sauvegarder toutes les 10 frames
-
-def get_camera():
-    global camera
-    if camera is None:
-        camera = cv2.VideoCapture(0)
-    return camera
-
-def release_camera():
-    global camera
-    if camera is not None:
-        camera.release()
-        camera = None
+# Assets empreintés (assets.py) : url_for('static') pointe vers static/dist/ après un build
+ASSETS = assets.AssetManifest()
+app.url_defaults(ASSETS.url_defaults)
+
+def serve_static(filename):
+    """Vue static : fichiers empreintés précompressés et immuables, les autres inchangés"""
+    if not assets.is_fingerprinted(filename):
+        return app.send_static_file(filename)
+    if safe_join(app.static_folder, filename) is None:
+        abort(404)
+    path, encoding = ASSETS.compressed_file(filename, request.headers.get('Accept-Encoding'))
+    if not os.path.isfile(path):
+        abort(404)
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                         max_age=31536000, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+app.view_functions['static'] = serve_static
+
+# Chemin de la base de données (WASTEAI_DB_PATH permet de pointer vers une base de test)
+DB_PATH = os.environ.get('WASTEAI_DB_PATH', os.path.join(os.path.dirname(__file__), 'waste.db'))
+
+def get_db():
+    """Ouvrir une connexion à la base de l'application (requêtes chronométrées)"""
+    return sqlite3.connect(DB_PATH, factory=metrics.TimedConnection)
+
+# Détecteur YOLO chargé à la demande : torch n'est importé que par le thread
+# de préchauffage, jamais à l'import de l'application.
+# Avec WASTEAI_INFERENCE_SERVER (hôte:port), le modèle vit dans inference_server.py
+# et ce processus ne fait que lui transmettre les frames.
+# Budget de threads de l'hôte (thread_budget.py), appliqué avant tout import de torch
+THREAD_BUDGET = load_budget()
+apply_budget(THREAD_BUDGET)
+
+INFERENCE_SERVER = os.environ.get('WASTEAI_INFERENCE_SERVER')
+if INFERENCE_SERVER:
+    from inference_server import InferenceClient
+    MODEL_LOADER = ModelLoader(INFERENCE_SERVER, factory=InferenceClient)
+    MODELS = ModelRegistry(factory=InferenceClient)
+else:
+    MODEL_LOADER = ModelLoader(MODEL_PATH, cpus=THREAD_BUDGET.inference_cpus)
+    MODELS = ModelRegistry(cpus=THREAD_BUDGET.inference_cpus)
+# Modèle de démarrage ; d'autres versions se chargent à chaud via /api/admin/models
+MODELS.add('default', MODEL_LOADER, activate=True)
+STARTED_AT = time.monotonic()
+
+def get_detector():
+    """Retourner le détecteur YOLO s'il est prêt (lance le préchauffage sinon)"""
+    return MODELS.get()
+
+def model_unavailable_response():
+    """Réponse d'erreur quand le modèle n'est pas (encore) utilisable"""
+    if MODELS.active_loader.state == 'failed':
+        return jsonify({'success': False, 'message': 'Modèle YOLO non disponible'}), 500
+    return jsonify({'success': False, 'message': 'Modèle YOLO en cours de chargement, réessayez'}), 503
+
+# Sources caméra (cameras.py) : chacune a son worker de capture/inférence, son buffer de
+# détections et son budget de latence ; un export ONNX statique n'accepte que sa taille d'entrée
+CAMERAS = CameraRegistry.from_config(get_detector, ladder=build_ladder(fixed_imgsz=MODEL_PATH.endswith('.onnx')),
+                                     cpus=THREAD_BUDGET.camera_cpus)
+
+# En mode multi-processus (serve.py), un seul worker possède les caméras. Les autres
+# relaient les routes caméra vers son écouteur interne (127.0.0.1:CAMERA_WORKER_PORT).
+CAMERA_OWNER = True
+CAMERA_WORKER_PORT = None
+CAMERA_ENDPOINTS = {'video_feed', 'toggle_camera_route', 'get_camera_perf', 'list_camera_sources'}
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade'}
 
 # Initialiser la base de données
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
+def init_db(db_path=None):
+    conn = sqlite3.connect(db_path or DB_PATH)
     c = conn.cursor()
     
     # Table des utilisateurs
@@ -88,6 +145,13 @@ def init_db():
                   detection_date TIMESTAMP,
                   FOREIGN KEY(user_id) REFERENCES users(id))''')
     
+    # Index couvrant pour les agrégats par utilisateur (nombre, dernière détection)
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_waste_detection_user_date
+                 ON waste_detection (user_id, detection_date)''')
+    
+    # Totaux et catalogue des détections archivées en Parquet (archive.py)
+    archive.init_archive_db(c)
+    
     # Table des robots
     c.execute('''CREATE TABLE IF NOT EXISTS robots
                  (id INTEGER PRIMARY KEY,
@@ -98,6 +162,9 @@ def init_db():
                   camera_status TEXT,
                   FOREIGN KEY(user_id) REFERENCES users(id))''')
     
+    # Historique de télémétrie des robots et ses agrégats (telemetry.py)
+    telemetry.init_telemetry_db(c)
+    
     # Table des notifications
     c.execute('''CREATE TABLE IF NOT EXISTS notifications
                  (id INTEGER PRIMARY KEY,
@@ -108,6 +175,9 @@ def init_db():
                   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                   FOREIGN KEY(user_id) REFERENCES users(id))''')
     
+    # Versions de lignes pour les ETag des API (http_cache.py), après les tables suivies
+    http_cache.init_row_versions(c)
+    
     conn.commit()
     conn.close()
 
@@ -133,6 +203,92 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ==================== MÉTRIQUES ====================
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.endpoint or 'not_found'
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                             endpoint, request.method, response.status_code)
+    return response
+
+# Compression des réponses et 304 des API JSON (http_cache.py)
+HTTP_CACHE = http_cache.HttpCache(app, get_db)
+
+def user_detections_scope():
+    return [f"detections:{session.get('user_id')}"]
+
+@app.teardown_request
+def end_request(exc):
+    if g.pop('request_started', None) is not None:
+        metrics.HTTP_IN_FLIGHT.dec()
+
+@app.before_request
+def route_to_camera_worker():
+    """Relayer les routes caméra vers le worker qui possède la caméra"""
+    if CAMERA_OWNER or request.endpoint not in CAMERA_ENDPOINTS:
+        return None
+    
+    headers = {k: v for k, v in request.headers.items()
+               if k.lower() not in HOP_BY_HOP_HEADERS and k.lower() != 'host'}
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', CAMERA_WORKER_PORT, timeout=30)
+        conn.request(request.method, request.full_path, body=request.get_data(), headers=headers)
+        upstream = conn.getresponse()
+    except OSError as e:
+        print(f"❌ Worker caméra injoignable: {e}")
+        return jsonify({'success': False, 'message': 'Caméra indisponible'}), 503
+    
+    def relay():
+        try:
+            while True:
+                chunk = upstream.read1(65536)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            conn.close()
+    
+    response_headers = [(k, v) for k, v in upstream.getheaders() if k.lower() not in HOP_BY_HOP_HEADERS]
+    return Response(relay(), status=upstream.status, headers=response_headers)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Exposition des métriques au format Prometheus"""
+    metrics.MODEL_READY.set(1 if MODELS.active_loader.state == 'ready' else 0)
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+# ==================== ROUTES SANTÉ ====================
+
+@app.route('/healthz')
+def healthz():
+    """Sonde de vivacité : le processus répond"""
+    return jsonify({'status': 'ok', 'uptime_s': round(time.monotonic() - STARTED_AT, 3)})
+
+@app.before_request
+def start_model_warmup():
+    """Lancer le préchauffage dès la première requête du processus, quel que soit l'hôte WSGI
+
+    serve.py le lance déjà après le fork (et le reloader de `python app.py`) ; avec
+    gunicorn app:app, flask run ou un autre serveur, c'est la première requête (sonde
+    /readyz comprise) qui le démarre, en arrière-plan.
+    """
+    if MODELS.active_loader.state == 'idle':
+        MODELS.active_loader.start()
+
+@app.route('/readyz')
+def readyz():
+    """Sonde de disponibilité : le modèle YOLO est chargé et préchauffé"""
+    status = MODELS.active_loader.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
 # ==================== ROUTES D'AUTHENTIFICATION ====================
 
 @app.route('/')
@@ -145,6 +301,33 @@ def login_page():
         return redirect('/dashboard')
     return render_template('login.html')
 
+# ==================== HACHAGE DES MOTS DE PASSE ====================
+
+# Hachages dans un pool borné (passwords.py) : une vague de connexions n'affame pas les
+# flux caméra ni l'ingestion
+PASSWORDS = PasswordHasher()
+# Par adresse IP (toute une équipe peut sortir par le même NAT de l'usine) : 30 tentatives
+# puis 2 par seconde ; par compte : 5 puis 1 toutes les 10 s
+IP_THROTTLE = Throttle(rate=2, burst=30)
+ACCOUNT_THROTTLE = Throttle(rate=0.1, burst=5)
+
+def auth_error(message, status, retry_after):
+    response = jsonify({'success': False, 'message': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+def throttled(scope, throttle, key):
+    """Réponse 429 si la clé a épuisé ses tentatives, None sinon"""
+    wait = throttle.acquire(key)
+    if not wait:
+        return None
+    metrics.AUTH_THROTTLED.inc(scope)
+    return auth_error('Trop de tentatives, réessayez plus tard', 429, wait)
+
+def hasher_busy(e):
+    return auth_error(str(e), 503, e.retry_after)
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.json
@@ -154,14 +337,35 @@ def login():
     if not email or not password:
         return jsonify({'success': False, 'message': 'Email et mot de passe requis'}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    email_key = email.strip().lower()
+    limited = (throttled('ip', IP_THROTTLE, request.remote_addr)
+               or throttled('account', ACCOUNT_THROTTLE, email_key))
+    if limited:
+        return limited
+    
+    conn = get_db()
     c = conn.cursor()
     c.execute('SELECT id, password, role FROM users WHERE email = ?', (email,))
     user = c.fetchone()
+    # Connexion fermée pendant le hachage : il peut attendre dans la file
+    conn.close()
     
-    if user and check_password_hash(user[1], password):
+    try:
+        valid = PASSWORDS.verify(user[1], password) if user else PASSWORDS.verify_unknown(password)
+        # Hachage d'une ancienne méthode (WASTEAI_PASSWORD_METHOD a changé) : recalculé maintenant
+        rehashed = PASSWORDS.hash(password) if valid and PASSWORDS.needs_rehash(user[1]) else None
+    except HasherBusy as e:
+        return hasher_busy(e)
+    
+    if valid:
+        ACCOUNT_THROTTLE.reset(email_key)
+        conn = get_db()
+        c = conn.cursor()
         # Mettre à jour last_login
         c.execute('UPDATE users SET last_login = ? WHERE id = ?', (datetime.now(), user[0]))
+        if rehashed:
+            # Seulement si personne n'a changé le mot de passe entre-temps
+            c.execute('UPDATE users SET password = ? WHERE id = ? AND password = ?', (rehashed, user[0], user[1]))
         conn.commit()
         conn.close()
         
@@ -171,7 +375,6 @@ def login():
         session['role'] = user[2] if user[2] else 'user'
         return jsonify({'success': True, 'message': 'Connexion réussie'})
     
-    conn.close()
     return jsonify({'success': False, 'message': 'Email ou mot de passe incorrect'}), 401
 
 @app.route('/api/register', methods=['POST'])
@@ -183,10 +386,16 @@ def register():
     if not email or not password:
         return jsonify({'success': False, 'message': 'Email et mot de passe requis'}), 400
     
-    hashed_password = generate_password_hash(password)
+    limited = throttled('ip', IP_THROTTLE, request.remote_addr)
+    if limited:
+        return limited
+    try:
+        hashed_password = PASSWORDS.hash(password)
+    except HasherBusy as e:
+        return hasher_busy(e)
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         # Vérifier si c'est le premier utilisateur
@@ -211,9 +420,8 @@ def logout():
 
 # ==================== ROUTES PROFIL ====================
 
-# Configuration upload
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'profiles')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Configuration upload (traitement et stockage des photos : avatars.py)
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -238,27 +446,53 @@ def api_logout():
 
 
 
-@app.route('/api/profile', methods=['GET'])
-@login_required
-def get_profile():
-    """Récupérer les informations du profil"""
-    user_id = session.get('user_id')
-    
-    conn = sqlite3.connect(DB_PATH)
+def load_profile(user_id):
+    """Lire le profil en base (chargeur du cache PROFILES)"""
+    conn = get_db()
     c = conn.cursor()
     c.execute('SELECT email, username, profile_picture, role, created_at FROM users WHERE id = ?', (user_id,))
     user = c.fetchone()
     conn.close()
     
-    if user:
-        return jsonify({
-            'success': True,
-            'email': user[0],
-            'username': user[1] or '',
-            'profile_picture': user[2] or '',
-            'role': user[3] if user[3] else 'user',
-            'created_at': user[4]
-        })
+    if not user:
+        return None
+    return {
+        'email': user[0],
+        'username': user[1] or '',
+        'profile_picture': user[2] or '',
+        'role': user[3] if user[3] else 'user',
+        'created_at': user[4]
+    }
+
+# Profils par utilisateur : l'en-tête de chaque page ne relit plus la base (profile_cache.py)
+PROFILES = ProfileCache(load_profile)
+
+def invalidate_profile(user_id):
+    """Invalider le profil en cache après une modification
+
+    Si l'utilisateur modifie son propre profil, sa session retient la date : les autres
+    workers relisent alors leur entrée au lieu d'attendre son expiration.
+    """
+    PROFILES.invalidate(user_id)
+    if user_id == session.get('user_id'):
+        session['profile_changed_at'] = time.time()
+
+def cached_profile_response(payload, etag):
+    """Réponse JSON avec ETag : le navigateur revalide à chaque page, 304 si inchangé"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/profile', methods=['GET'])
+@login_required
+def get_profile():
+    """Récupérer les informations du profil"""
+    profile, etag = PROFILES.get(session.get('user_id'), session.get('profile_changed_at', 0))
+    
+    if profile:
+        picture = avatars.avatar_url(profile['profile_picture'], avatars.PROFILE_AVATAR_SIZE)
+        return cached_profile_response({'success': True, **profile, 'profile_picture': picture}, etag)
     
     return jsonify({'success': False, 'message': 'Utilisateur non trouvé'}), 404
 
@@ -271,14 +505,15 @@ def update_profile():
     username = data.get('username', '').strip()
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         c.execute('UPDATE users SET username = ? WHERE id = ?', (username, user_id))
         conn.commit()
         conn.close()
         
-        # Mettre à jour la session
+        # Mettre à jour la session et le cache de profil
         session['username'] = username
+        invalidate_profile(user_id)
         
         return jsonify({'success': True, 'message': 'Profil mis à jour'})
     except Exception as e:
@@ -304,28 +539,52 @@ def change_password():
     if len(new_password) < 6:
         return jsonify({'success': False, 'message': 'Le mot de passe doit contenir au moins 6 caractères'}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    limited = throttled('account', ACCOUNT_THROTTLE, f'user:{user_id}')
+    if limited:
+        return limited
+    
+    conn = get_db()
     c = conn.cursor()
     c.execute('SELECT password FROM users WHERE id = ?', (user_id,))
     user = c.fetchone()
+    conn.close()
     
-    if not user or not check_password_hash(user[0], current_password):
-        conn.close()
-        return jsonify({'success': False, 'message': 'Mot de passe actuel incorrect'}), 401
+    try:
+        if not user or not PASSWORDS.verify(user[0], current_password):
+            return jsonify({'success': False, 'message': 'Mot de passe actuel incorrect'}), 401
+        hashed_password = PASSWORDS.hash(new_password)
+    except HasherBusy as e:
+        return hasher_busy(e)
     
-    hashed_password = generate_password_hash(new_password)
+    conn = get_db()
+    c = conn.cursor()
     c.execute('UPDATE users SET password = ? WHERE id = ?', (hashed_password, user_id))
     conn.commit()
     conn.close()
     
     return jsonify({'success': True, 'message': 'Mot de passe modifié avec succès'})
 
+def is_picture_referenced(picture):
+    """Une photo (même empreinte) peut appartenir à plusieurs comptes"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('SELECT 1 FROM users WHERE profile_picture = ? LIMIT 1', (picture,))
+    referenced = c.fetchone() is not None
+    conn.close()
+    return referenced
+
+# Suppression en arrière-plan des vignettes remplacées (avatars.py)
+AVATAR_CLEANER = avatars.AvatarCleaner(is_picture_referenced)
+
 @app.route('/api/profile/upload-picture', methods=['POST'])
 @login_required
 def upload_profile_picture():
-    """Uploader une photo de profil"""
+    """Uploader une photo de profil (réencodée en vignettes WebP/JPEG)"""
     user_id = session.get('user_id')
     
+    if request.content_length and request.content_length > avatars.AVATAR_MAX_BYTES + 64 * 1024:
+        return jsonify({'success': False, 'message': 'Image trop volumineuse'}), 413
+    
     if 'file' not in request.files:
         return jsonify({'success': False, 'message': 'Aucun fichier envoyé'}), 400
     
@@ -334,65 +593,59 @@ def upload_profile_picture():
     if file.filename == '':
         return jsonify({'success': False, 'message': 'Aucun fichier sélectionné'}), 400
     
-    if file and allowed_file(file.filename):
-        # Créer le dossier s'il n'existe pas
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        
-        # Générer un nom unique
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"{user_id}_{uuid.uuid4().hex}.{ext}"
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        
-        # Supprimer l'ancienne photo si elle existe
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('SELECT profile_picture FROM users WHERE id = ?', (user_id,))
-        old_picture = c.fetchone()
-        
-        if old_picture and old_picture[0]:
-            old_path = os.path.join(os.path.dirname(__file__), 'static', old_picture[0].lstrip('/static/'))
-            if os.path.exists(old_path):
-                try:
-                    os.remove(old_path)
-                except:
-                    pass
-        
-        # Sauvegarder le nouveau fichier
-        file.save(filepath)
-        
-        # Mettre à jour la BDD
-        picture_url = f"/static/uploads/profiles/{filename}"
-        c.execute('UPDATE users SET profile_picture = ? WHERE id = ?', (picture_url, user_id))
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Photo de profil mise à jour',
-            'picture_url': picture_url
-        })
+    if not allowed_file(file.filename):
+        return jsonify({'success': False, 'message': 'Type de fichier non autorisé (png, jpg, jpeg, gif, webp)'}), 400
     
-    return jsonify({'success': False, 'message': 'Type de fichier non autorisé (png, jpg, jpeg, gif)'}), 400
+    try:
+        # Un octet de plus que la limite suffit à la détecter sans tout lire
+        picture = avatars.process_upload(file.read(avatars.AVATAR_MAX_BYTES + 1))
+    except avatars.AvatarError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('SELECT profile_picture FROM users WHERE id = ?', (user_id,))
+    old_picture = c.fetchone()
+    c.execute('UPDATE users SET profile_picture = ? WHERE id = ?', (picture, user_id))
+    conn.commit()
+    conn.close()
+    invalidate_profile(user_id)
+    
+    # L'ancienne photo est supprimée en arrière-plan si plus personne ne l'utilise
+    if old_picture and old_picture[0] and old_picture[0] != picture:
+        AVATAR_CLEANER.schedule(old_picture[0])
+    
+    return jsonify({
+        'success': True,
+        'message': 'Photo de profil mise à jour',
+        'picture_url': avatars.avatar_url(picture, avatars.HEADER_AVATAR_SIZE),
+        'picture_urls': {size: avatars.avatar_url(picture, size) for size in avatars.AVATAR_SIZES}
+    })
+
+@app.route('/avatars/<name>')
+def serve_avatar(name):
+    """Vignette adressée par contenu : cache d'un an, format selon l'en-tête Accept"""
+    path = avatars.variant_path(name, request.headers.get('Accept'))
+    if path is None:
+        return jsonify({'success': False, 'message': 'Image introuvable'}), 404
+    response = send_file(path, max_age=31536000, conditional=True)
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.vary.add('Accept')
+    return response
 
 @app.route('/api/user/info', methods=['GET'])
 @login_required
 def get_user_info():
     """Récupérer les infos utilisateur pour le header"""
-    user_id = session.get('user_id')
+    profile, etag = PROFILES.get(session.get('user_id'), session.get('profile_changed_at', 0))
     
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('SELECT username, profile_picture, email FROM users WHERE id = ?', (user_id,))
-    user = c.fetchone()
-    conn.close()
-    
-    if user:
-        return jsonify({
+    if profile:
+        return cached_profile_response({
             'success': True,
-            'username': user[0] or user[2].split('@')[0],  # Username ou partie avant @ de l'email
-            'profile_picture': user[1] or '',
-            'email': user[2]
-        })
+            'username': profile['username'] or profile['email'].split('@')[0],  # Username ou partie avant @ de l'email
+            'profile_picture': avatars.avatar_url(profile['profile_picture'], avatars.HEADER_AVATAR_SIZE),
+            'email': profile['email']
+        }, etag)
     
     return jsonify({'success': False}), 404
 
@@ -416,11 +669,12 @@ def add_waste_detection():
     if not waste_type:
         return jsonify({'success': False, 'message': 'Type de déchet requis'}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     c.execute('''INSERT INTO waste_detection (user_id, waste_type, quantity, detection_date)
                  VALUES (?, ?, ?, ?)''',
               (user_id, waste_type, quantity, detection_date))
+    http_cache.bump_versions(c, http_cache.detection_scopes(user_id))
     conn.commit()
     conn.close()
     
@@ -433,123 +687,147 @@ def add_waste_detection():
 def camera_page():
     return render_template('camera.html', email=session.get('email'))
 
-def gen_frames():
-    global frame_count, detection_buffer
-    
-    cam = get_camera()
-    if not cam.isOpened():
-        print("❌ Caméra non accessible (isOpened=False)")
-    else:
-        print("📸 Flux caméra démarré")
-
-    while True:
-        success, frame = cam.read()
-        if not success:
-            print("❌ Echec lecture frame caméra")
-            # Générer une image d'erreur
-            error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(error_frame, "ERREUR CAMERA", (50, 240), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', error_frame)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            break
-        else:
-            # Detection YOLO si disponible
-            detections_summary = {}
-            if YOLO_DETECTOR:
-                frame, detections_summary = YOLO_DETECTOR.detect_from_frame(frame)
-                
-                # Accumuler les détections dans le buffer
-                if detections_summary:
-                    for waste_type, count in detections_summary.items():
-                        if waste_type not in detection_buffer:
-                            detection_buffer[waste_type] = 0
-                        detection_buffer[waste_type] += count
-            
-            # Sauvegarder toutes les SAVE_INTERVAL frames
-            frame_count += 1
-            if frame_count >= SAVE_INTERVAL and detection_buffer:
-                # Sauvegarder dans la BD
-                user_id = session.get('user_id')
-                if user_id and YOLO_DETECTOR:
-                    try:
-                        YOLO_DETECTOR.save_detections_to_db(user_id, detection_buffer)
-                        print(f"✅ Détections sauvegardées: {detection_buffer}")
-                    except Exception as e:
-                        print(f"❌ Erreur sauvegarde détections: {e}")
-                
-                # Réinitialiser le buffer et le compteur
-                detection_buffer = {}
-                frame_count = 0
-            
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+def get_camera_source(name=None):
+    """Source demandée (défaut : la première), ou réponse 404"""
+    source = CAMERAS.get(name)
+    if source is None:
+        return None, (jsonify({'success': False, 'message': f'Source caméra inconnue: {name}'}), 404)
+    return source, None
+
+@app.route('/video_feed', defaults={'source': None})
+@app.route('/video_feed/<source>')
+@login_required
+def video_feed(source):
+    camera_source, error = get_camera_source(source)
+    if error:
+        return error
+    get_detector()  # Lancer le préchauffage du modèle en parallèle de la caméra
+    camera_source.start(session.get('user_id'))
+    overlay = request.args.get('overlay') == '1'
+    return Response(camera_source.frames(overlay), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/api/camera/sources', methods=['GET'])
+@login_required
+def list_camera_sources():
+    """Sources déclarées, état de leur worker et point de fonctionnement"""
+    return jsonify({'success': True, 'default': CAMERAS.default, 'sources': CAMERAS.status()})
 
-@app.route('/video_feed')
+@app.route('/api/camera/perf', methods=['GET'])
 @login_required
-def video_feed():
-    return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+def get_camera_perf():
+    """FPS glissant et percentiles par étape (capture, inférence, dessin, encodage)"""
+    camera_source, error = get_camera_source(request.args.get('source'))
+    if error:
+        return error
+    window = request.args.get('window', 120, type=int)
+    window = max(2, min(window, camera_source.perf.capacity))
+    return jsonify({'success': True, 'source': camera_source.name, 'window': window,
+                    **camera_source.perf.summary(window), 'budget': camera_source.budget.status()})
 
 @app.route('/api/robot/status', methods=['GET'])
 @login_required
 def get_robot_status():
     user_id = session.get('user_id')
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     c.execute('SELECT location, battery_level, is_active FROM robots WHERE user_id = ?', (user_id,))
     robot = c.fetchone()
+    # La télémétrie, plus récente que la ligne robots, donne la batterie et l'activité
+    last = telemetry.latest(conn, user_id)
     conn.close()
     
-    if robot:
-        return jsonify({
-            'success': True,
-            'location': robot[0],
-            'battery': robot[1],
-            'is_active': robot[2]
-        })
-    
-    return jsonify({
+    status = {
         'success': True,
         'location': 'Glacier Moderne, Bonamoussadi, Douala Cameroun',
         'battery': 85,
         'is_active': False
-    })
+    }
+    if robot:
+        status.update(location=robot[0], battery=robot[1], is_active=robot[2])
+    if last:
+        if last['battery'] is not None:
+            status['battery'] = round(last['battery'])
+        if last['is_active'] is not None:
+            status['is_active'] = bool(last['is_active'])
+        status['position'] = {'lat': last['lat'], 'lon': last['lon']} if last['lat'] is not None else None
+        status['updated_at'] = last['ts']
+    return jsonify(status)
+
+@app.route('/api/robot/telemetry', methods=['POST'])
+def ingest_robot_telemetry():
+    """
+    Ingestion par lots de la télémétrie du robot
+    {"user_id": 1, "samples": [{"ts": 1700000000.5, "battery": 84.5, "lat": 4.06, "lon": 9.74, "is_active": true}]}
+    Comme /api/detection/batch, le robot s'identifie par user_id (ou la session)
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = session.get('user_id') or data.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'user_id et samples requis'}), 400
+    try:
+        rows = telemetry.parse_samples(data.get('samples'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    conn = get_db()
+    try:
+        inserted = telemetry.ingest(conn, user_id, rows)
+        telemetry.maybe_apply_retention(conn)
+    finally:
+        conn.close()
+    return jsonify({'success': True, 'received': len(rows), 'inserted': inserted}), 201
+
+@app.route('/api/robot/telemetry', methods=['GET'])
+@login_required
+def get_robot_telemetry():
+    """
+    Historique pour les graphiques : ?start=&end= (secondes epoch, défaut : dernières 24 h)
+    &resolution=raw|minute|hour (défaut : la plus fine sous telemetry.MAX_POINTS points)
+    """
+    user_id = session.get('user_id')
+    now = time.time()
+    end = request.args.get('end', now, type=float)
+    start = request.args.get('start', end - 86400, type=float)
+    resolution = request.args.get('resolution')
+    # float() accepte nan et inf : seules des dates finies (et représentables en ms) passent
+    if not all(math.isfinite(value) and 0 <= value < 1e11 for value in (start, end)):
+        return jsonify({'success': False, 'message': 'Plage ou résolution invalide'}), 400
+    if start >= end or (resolution and resolution not in telemetry.RESOLUTIONS):
+        return jsonify({'success': False, 'message': 'Plage ou résolution invalide'}), 400
+    
+    conn = get_db()
+    resolution, points = telemetry.query_range(conn, user_id, int(start * 1000), int(end * 1000), resolution)
+    conn.close()
+    return jsonify({'success': True, 'resolution': resolution, 'points': points})
 
 @app.route('/api/camera/toggle', methods=['POST'])
 @login_required
 def toggle_camera_route():
-    global detection_buffer, frame_count
-    
     data = request.json
     action = data.get('action')
+    camera_source, error = get_camera_source(data.get('source'))
+    if error:
+        return error
     
     if action == 'start':
-        get_camera()
-        # Réinitialiser le buffer et le compteur au démarrage
-        detection_buffer = {}
-        frame_count = 0
-    elif action == 'stop':
-        release_camera()
-        # Sauvegarder les détections restantes avant d'arrêter
-        user_id = session.get('user_id')
-        if user_id and detection_buffer and YOLO_DETECTOR:
+        options = None
+        if data.get('options'):
             try:
-                YOLO_DETECTOR.save_detections_to_db(user_id, detection_buffer)
-                print(f"✅ Détections finales sauvegardées: {detection_buffer}")
-            except Exception as e:
-                print(f"❌ Erreur sauvegarde détections finales: {e}")
-        detection_buffer = {}
-        frame_count = 0
+                options = parse_inference_options(data['options'])
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+        get_detector()  # Lancer le préchauffage du modèle en parallèle de la caméra
+        camera_source.start(session.get('user_id'), options)
+    elif action == 'stop':
+        # Le worker s'arrête et enregistre les détections restantes
+        camera_source.stop()
     
     return jsonify({
         'success': True,
         'message': f'Caméra {"activée" if action == "start" else "désactivée"}',
-        'status': action
+        'status': action,
+        'source': camera_source.name
     })
 
 @app.route('/api/camera/recent-detections', methods=['GET'])
@@ -559,7 +837,7 @@ def get_recent_detections():
     user_id = session.get('user_id')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         # Récupérer les détections des 30 dernières secondes
@@ -588,10 +866,11 @@ def get_recent_detections():
 
 @app.route('/api/robot/stats', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(user_detections_scope)
 def get_robot_stats():
     user_id = session.get('user_id')
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     
     c.execute('''SELECT COUNT(*), SUM(quantity) FROM waste_detection 
@@ -600,7 +879,8 @@ def get_robot_stats():
     detections_today = result[0] or 0
     quantity_today = result[1] or 0
     
-    c.execute('''SELECT COUNT(*), SUM(quantity) FROM waste_detection 
+    # Total historique : détections archivées comprises (vue archive.py)
+    c.execute('''SELECT SUM(detections), SUM(quantity) FROM waste_detection_all 
                  WHERE user_id = ?''', (user_id,))
     result = c.fetchone()
     total_detections = result[0] or 0
@@ -623,7 +903,7 @@ def add_robot():
     battery = data.get('battery', 85)
     is_active = data.get('is_active', False)
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     c.execute('SELECT id FROM robots WHERE user_id = ?', (user_id,))
     
@@ -635,8 +915,13 @@ def add_robot():
         c.execute('''INSERT INTO robots (user_id, location, battery_level, is_active, camera_status)
                      VALUES (?, ?, ?, ?, ?)''',
                   (user_id, location, battery, is_active, 'inactive'))
-    
     conn.commit()
+    
+    # L'état courant rejoint aussi l'historique (et le dernier échantillon lu par /api/robot/status)
+    try:
+        telemetry.ingest(conn, user_id, telemetry.parse_samples([{'battery': battery, 'is_active': is_active}]))
+    except ValueError:
+        pass  # Batterie hors de 0-100 : seule la ligne robots est mise à jour
     conn.close()
     
     return jsonify({'success': True, 'message': 'Robot mis à jour'})
@@ -662,11 +947,12 @@ def record_detection():
         return jsonify({'success': False, 'message': 'user_id et waste_type requis'}), 400
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         c.execute('''INSERT INTO waste_detection (user_id, waste_type, quantity, detection_date)
                      VALUES (?, ?, ?, ?)''',
                   (user_id, waste_type, quantity, detection_date))
+        http_cache.bump_versions(c, http_cache.detection_scopes(user_id))
         conn.commit()
         conn.close()
         
@@ -692,7 +978,7 @@ def record_batch_detection():
         return jsonify({'success': False, 'message': 'user_id et detections requis'}), 400
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         for detection in detections:
@@ -705,6 +991,7 @@ def record_batch_detection():
                              VALUES (?, ?, ?, ?)''',
                           (user_id, waste_type, quantity, detection_date))
         
+        http_cache.bump_versions(c, http_cache.detection_scopes(user_id))
         conn.commit()
         conn.close()
         
@@ -730,8 +1017,9 @@ def yolo_detect_image():
     user_id = session.get('user_id')
     
     # Charger YOLO
-    if not load_yolo():
-        return jsonify({'success': False, 'message': 'Modèle YOLO non disponible'}), 500
+    detector = get_detector()
+    if not detector:
+        return model_unavailable_response()
     
     if 'file' not in request.files:
         return jsonify({'success': False, 'message': 'Aucun fichier uploadé'}), 400
@@ -741,13 +1029,20 @@ def yolo_detect_image():
     if file.filename == '':
         return jsonify({'success': False, 'message': 'Fichier vide'}), 400
     
+    # Options d'inférence facultatives : conf, iou, classes, imgsz, max_det
+    try:
+        options = parse_inference_options(request.form)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
     try:
         # Sauvegarder le fichier temporairement
         temp_path = f'temp_{datetime.now().timestamp()}.jpg'
         file.save(temp_path)
         
-        # Détection
-        detections, results = YOLO_DETECTOR.detect_from_image(temp_path)
+        # Détection (sliced=1/0 force ou désactive l'inférence par tuiles, sinon automatique)
+        sliced = {'1': True, '0': False}.get(request.form.get('sliced'))
+        detections, results = detector.detect_from_image(temp_path, sliced=sliced, options=options)
         
         # Nettoyer
         os.remove(temp_path)
@@ -783,21 +1078,18 @@ def predict():
     if 'image' not in request.files:
         return "No image found", 400
     
+    detector = get_detector()
+    if not detector:
+        return model_unavailable_response()
+    
     file = request.files['image']
     image = cv2.imdecode(np.frombuffer(file.read(), np.uint8), cv2.IMREAD_COLOR)    
     
-    results = model(image)
-    names = results[0].names
-    bboxes = results[0].boxes    
+    if image is None:
+        return "Invalid image", 400
     
-    for box in bboxes:
-        x1, y1, x2, y2 = box.xyxy[0].tolist()
-        label = names[int(box.cls[0])]
-        confidence = box.conf[0]        
-        
-        cv2.rectangle(image, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-        cv2.putText(image, f"{label} {confidence:.2f}", (int(x1), int(y1)-10), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+    boxes, scores, classes = detector.predict(image)
+    detector.draw_detections(image, boxes, scores, classes)
 
     _, img_encoded = cv2.imencode(".jpg", image)    
     return send_file(io.BytesIO(img_encoded.tobytes()), mimetype="image/jpeg")
@@ -811,16 +1103,17 @@ def yolo_detect_webcam():
     duration = data.get('duration', 10)
     save_to_db = data.get('save_to_db', True)
     
-    if not YOLO_DETECTOR:
-        return jsonify({'success': False, 'message': 'Modèle YOLO non disponible'}), 500
+    detector = get_detector()
+    if not detector:
+        return model_unavailable_response()
     
     try:
         # Détection webcam
-        detections = YOLO_DETECTOR.detect_from_webcam(user_id, duration)
+        detections = detector.detect_from_webcam(user_id, duration)
         
         # Enregistrer dans la BD si demandé
         if save_to_db and detections:
-            YOLO_DETECTOR.save_detections_to_db(user_id, detections)
+            detector.save_detections_to_db(user_id, detections)
         
         return jsonify({
             'success': True,
@@ -844,7 +1137,7 @@ def yolo_save_detections():
         return jsonify({'success': False, 'message': 'Aucune détection à enregistrer'}), 400
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         for waste_type, quantity in detections.items():
@@ -852,6 +1145,7 @@ def yolo_save_detections():
                          VALUES (?, ?, ?, ?)''',
                      (user_id, waste_type, quantity, datetime.now()))
         
+        http_cache.bump_versions(c, http_cache.detection_scopes(user_id))
         conn.commit()
         conn.close()
         
@@ -869,6 +1163,7 @@ def yolo_save_detections():
 
 @app.route('/api/stats/monthly-distribution', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(user_detections_scope)
 def get_monthly_distribution():
     """Statistiques d'un mois spécifique pour le diagramme circulaire"""
     user_id = session.get('user_id')
@@ -878,11 +1173,11 @@ def get_monthly_distribution():
     target_month = f"{year}-{month}"
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         c.execute('''SELECT waste_type, SUM(quantity) 
-                     FROM waste_detection 
+                     FROM waste_detection_all 
                      WHERE user_id = ? 
                      AND strftime('%Y-%m', detection_date) = ?
                      GROUP BY waste_type''', (user_id, target_month))
@@ -902,17 +1197,18 @@ def get_monthly_distribution():
 
 @app.route('/api/stats/last-month', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(user_detections_scope)
 def get_last_month_stats():
     """Statistiques du mois dernier"""
     user_id = session.get('user_id')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         # Get last month data
         c.execute('''SELECT waste_type, SUM(quantity) 
-                     FROM waste_detection 
+                     FROM waste_detection_all 
                      WHERE user_id = ? 
                      AND strftime('%Y-%m', detection_date) = strftime('%Y-%m', 'now', '-1 month')
                      GROUP BY waste_type''', (user_id,))
@@ -932,17 +1228,18 @@ def get_last_month_stats():
 
 @app.route('/api/stats/total', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(user_detections_scope)
 def get_total_stats():
     """Statistiques totales"""
     user_id = session.get('user_id')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         # Get all time data
         c.execute('''SELECT waste_type, SUM(quantity) 
-                     FROM waste_detection 
+                     FROM waste_detection_all 
                      WHERE user_id = ? 
                      GROUP BY waste_type''', (user_id,))
         
@@ -961,6 +1258,7 @@ def get_total_stats():
 
 @app.route('/api/chart/monthly', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(user_detections_scope)
 def get_monthly_chart():
     """Données pour le graphique mensuel"""
     user_id = session.get('user_id')
@@ -968,7 +1266,7 @@ def get_monthly_chart():
     waste_type = request.args.get('waste_type', 'all')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         months = ['Jan', 'Fev', 'Mar', 'Avr', 'Mai', 'Juin', 'Juil', 'Aout', 'Sep', 'Oct', 'Nov', 'Dec']
@@ -977,14 +1275,14 @@ def get_monthly_chart():
         for month_num in range(1, 13):
             if waste_type == 'all':
                 c.execute('''SELECT SUM(quantity) 
-                             FROM waste_detection 
+                             FROM waste_detection_all 
                              WHERE user_id = ? 
                              AND strftime('%Y', detection_date) = ? 
                              AND strftime('%m', detection_date) = ?''',
                          (user_id, str(year), f'{month_num:02d}'))
             else:
                 c.execute('''SELECT SUM(quantity) 
-                             FROM waste_detection 
+                             FROM waste_detection_all 
                              WHERE user_id = ? 
                              AND waste_type = ?
                              AND strftime('%Y', detection_date) = ? 
@@ -1006,6 +1304,7 @@ def get_monthly_chart():
 
 @app.route('/api/chart/weekly', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(user_detections_scope)
 def get_weekly_chart():
     """Données pour le graphique hebdomadaire"""
     user_id = session.get('user_id')
@@ -1013,7 +1312,7 @@ def get_weekly_chart():
     waste_type = request.args.get('waste_type', 'all')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         days = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
@@ -1030,13 +1329,13 @@ def get_weekly_chart():
             
             if waste_type == 'all':
                 c.execute('''SELECT SUM(quantity) 
-                             FROM waste_detection 
+                             FROM waste_detection_all 
                              WHERE user_id = ? 
                              AND DATE(detection_date) = ?''',
                          (user_id, date_str))
             else:
                 c.execute('''SELECT SUM(quantity) 
-                             FROM waste_detection 
+                             FROM waste_detection_all 
                              WHERE user_id = ? 
                              AND waste_type = ?
                              AND DATE(detection_date) = ?''',
@@ -1064,16 +1363,145 @@ def admin_users_page():
     """Page de gestion des utilisateurs (admin uniquement)"""
     return render_template('admin_users.html', email=session.get('email'))
 
+@app.route('/api/admin/models', methods=['GET'])
+@login_required
+@admin_required
+def get_models():
+    """Modèles du registre, modèle actif, routage et statistiques par voie"""
+    return jsonify({'success': True, **MODELS.status()})
+
+@app.route('/api/admin/models/load', methods=['POST'])
+@login_required
+@admin_required
+def load_model():
+    """Charger un modèle en arrière-plan ; il remplace le modèle actif une fois préchauffé"""
+    data = request.json or {}
+    name = data.get('name')
+    path = data.get('path')
+    if not name or not path:
+        return jsonify({'success': False, 'message': 'Nom et chemin du modèle requis'}), 400
+    # En mode distant, `path` est l'adresse d'un autre serveur d'inférence
+    if not INFERENCE_SERVER and (not path.endswith(('.pt', '.onnx')) or not os.path.isfile(path)):
+        return jsonify({'success': False, 'message': f'Fichier de modèle introuvable: {path}'}), 400
+    try:
+        key = MODELS.load(name, path, version=data.get('version'), activate=data.get('activate', True))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    return jsonify({'success': True, 'key': key, 'message': 'Chargement en cours'}), 202
+
+@app.route('/api/admin/models/activate', methods=['POST'])
+@login_required
+@admin_required
+def activate_model():
+    """Basculer le trafic vers un modèle déjà prêt"""
+    try:
+        MODELS.activate((request.json or {}).get('key'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'active': MODELS.active_key})
+
+@app.route('/api/admin/models/routing', methods=['PUT'])
+@login_required
+@admin_required
+def set_model_routing():
+    """Routage vers un candidat : {key, percent, mode: 'ab' | 'shadow'} ; percent 0 = arrêt"""
+    data = request.json or {}
+    try:
+        MODELS.set_routing(data.get('key'), float(data.get('percent', 0)), data.get('mode', 'shadow'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, **MODELS.status()})
+
+@app.route('/api/admin/models/<path:key>', methods=['DELETE'])
+@login_required
+@admin_required
+def unload_model(key):
+    """Décharger un modèle qui n'est ni actif ni candidat"""
+    try:
+        MODELS.unload(key)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True})
+
+# Tri de la liste des utilisateurs : paramètre sort -> expression SQL
+ADMIN_USERS_SORTS = {
+    'email': 'u.email',
+    'role': 'u.role',
+    'created_at': 'u.created_at',
+    'last_login': 'u.last_login',
+    'detections': 'detections',
+    'last_detection': 'last_detection',
+}
+ADMIN_USERS_PER_PAGE = 25
+ADMIN_USERS_MAX_PER_PAGE = 100
+
 @app.route('/api/admin/users', methods=['GET'])
 @login_required
 @admin_required
+@HTTP_CACHE.versioned(lambda: ['users', 'detections'])
 def get_all_users():
-    """Récupérer la liste de tous les utilisateurs"""
+    """Liste paginée des utilisateurs, avec recherche, tri et activité de chacun
+
+    Paramètres : page, per_page, search (email ou nom), role, sort, order (asc/desc).
+    Le nombre de détections et la dernière détection viennent d'un seul agrégat par
+    utilisateur, sur l'index (user_id, detection_date) et les totaux archivés. Trié sur une
+    colonne de users, l'agrégat ne porte que sur les utilisateurs de la page.
+    """
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(1, request.args.get('per_page', ADMIN_USERS_PER_PAGE, type=int)), ADMIN_USERS_MAX_PER_PAGE)
+    search = request.args.get('search', '').strip()
+    role = request.args.get('role', 'all')
+    sort = request.args.get('sort', 'created_at')
+    if sort not in ADMIN_USERS_SORTS:
+        sort = 'created_at'
+    order = 'ASC' if request.args.get('order', 'desc').lower() == 'asc' else 'DESC'
+    
+    where = []
+    params = []
+    if search:
+        pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        where.append("(u.email LIKE ? ESCAPE '\\' OR u.username LIKE ? ESCAPE '\\')")
+        params += [pattern, pattern]
+    if role in ('admin', 'user'):
+        # Les anciens comptes sans rôle sont des utilisateurs
+        where.append("COALESCE(u.role, 'user') = ?")
+        params.append(role)
+    filter_sql = ('WHERE ' + ' AND '.join(where)) if where else ''
+    order_sql = f'{ADMIN_USERS_SORTS[sort]} {order}, u.id {order}'
+    offset = (page - 1) * per_page
+    
+    if sort in ('detections', 'last_detection'):
+        # Tri sur l'activité : agrégat de tous les utilisateurs, puis la page
+        page_sql, users_sql, activity_filter = '', 'users u', ''
+        where_sql, limit_sql = filter_sql, 'LIMIT ? OFFSET ?'
+    else:
+        # Page d'abord (index de users), agrégat limité à ses utilisateurs
+        page_sql = f'''WITH page AS (SELECT u.* FROM users u {filter_sql}
+                                     ORDER BY {order_sql} LIMIT ? OFFSET ?)'''
+        users_sql, activity_filter = 'page u', 'WHERE user_id IN (SELECT id FROM page)'
+        where_sql, limit_sql = '', ''
+    
+    query = f'''{page_sql}
+                SELECT u.id, u.email, u.role, u.created_at, u.last_login, u.username,
+                       COALESCE(a.detections, 0) AS detections, a.last_detection AS last_detection
+                FROM {users_sql}
+                LEFT JOIN (SELECT user_id, SUM(detections) AS detections, MAX(last_detection) AS last_detection
+                           FROM (SELECT user_id, COUNT(*) AS detections, MAX(detection_date) AS last_detection
+                                 FROM waste_detection {activity_filter} GROUP BY user_id
+                                 UNION ALL
+                                 SELECT user_id, SUM(detections), MAX(day)
+                                 FROM waste_detection_daily {activity_filter} GROUP BY user_id)
+                           GROUP BY user_id) a ON a.user_id = u.id
+                {where_sql}
+                ORDER BY {order_sql}
+                {limit_sql}'''
+    
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
-        c.execute('''SELECT id, email, role, created_at, last_login 
-                     FROM users ORDER BY created_at DESC''')
+        c.execute(f'SELECT COUNT(*) FROM users u {filter_sql}', params)
+        total = c.fetchone()[0]
+        c.execute(query, params + [per_page, offset])
         users = c.fetchall()
         conn.close()
         
@@ -1084,10 +1512,20 @@ def get_all_users():
                 'email': user[1],
                 'role': user[2] if user[2] else 'user',
                 'created_at': user[3],
-                'last_login': user[4]
+                'last_login': user[4],
+                'username': user[5],
+                'detections': user[6],
+                'last_detection': user[7]
             })
         
-        return jsonify({'success': True, 'users': users_list})
+        return jsonify({
+            'success': True,
+            'users': users_list,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'total_pages': (total + per_page - 1) // per_page
+        })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -1107,11 +1545,12 @@ def update_user_role(user_id):
         return jsonify({'success': False, 'message': 'Vous ne pouvez pas vous rétrograder vous-même'}), 400
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         c.execute('UPDATE users SET role = ? WHERE id = ?', (new_role, user_id))
         conn.commit()
         conn.close()
+        invalidate_profile(user_id)
         
         return jsonify({'success': True, 'message': f'Rôle mis à jour en {new_role}'})
     except Exception as e:
@@ -1126,36 +1565,57 @@ def delete_user(user_id):
     if user_id == session.get('user_id'):
         return jsonify({'success': False, 'message': 'Vous ne pouvez pas vous supprimer vous-même'}), 400
     
+    conn = purge = None
+    committed = False
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
-        # Supprimer les détections de l'utilisateur
+        # Supprimer les détections de l'utilisateur (base et archive : partitions préparées,
+        # échangées juste avant le commit)
         c.execute('DELETE FROM waste_detection WHERE user_id = ?', (user_id,))
+        purge = archive.purge_user(conn, user_id)
         
-        # Supprimer le robot de l'utilisateur
+        # Supprimer le robot de l'utilisateur et sa télémétrie
         c.execute('DELETE FROM robots WHERE user_id = ?', (user_id,))
+        telemetry.delete_user_telemetry(c, user_id)
         
-        # Supprimer l'utilisateur
+        # Supprimer l'utilisateur (sa photo est nettoyée en arrière-plan)
+        c.execute('SELECT profile_picture FROM users WHERE id = ?', (user_id,))
+        picture = c.fetchone()
         c.execute('DELETE FROM users WHERE id = ?', (user_id,))
         
+        purge.apply()
         conn.commit()
+        committed = True
         conn.close()
+        purge.finish()
+        invalidate_profile(user_id)
+        if picture and picture[0]:
+            AVATAR_CLEANER.schedule(picture[0])
         
         return jsonify({'success': True, 'message': 'Utilisateur supprimé'})
     except Exception as e:
+        if not committed:
+            # Transaction annulée : les partitions retrouvent leur contenu d'origine
+            if conn is not None:
+                conn.rollback()
+                conn.close()
+            if purge is not None:
+                purge.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
 # ==================== ROUTES NOTIFICATIONS ====================
 
 @app.route('/api/notifications', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(lambda: [f"notifications:{session.get('user_id')}"])
 def get_notifications():
     """Récupérer toutes les notifications de l'utilisateur"""
     user_id = session.get('user_id')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         c.execute('''SELECT id, message, type, is_read, created_at 
@@ -1195,7 +1655,7 @@ def mark_notification_read(notification_id):
     user_id = session.get('user_id')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         c.execute('UPDATE notifications SET is_read = 1 WHERE id = ? AND user_id = ?', 
@@ -1215,7 +1675,7 @@ def mark_all_notifications_read():
     user_id = session.get('user_id')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         c.execute('UPDATE notifications SET is_read = 1 WHERE user_id = ?', (user_id,))
@@ -1234,7 +1694,7 @@ def delete_notification(notification_id):
     user_id = session.get('user_id')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         c.execute('DELETE FROM notifications WHERE id = ? AND user_id = ?', 
@@ -1257,6 +1717,7 @@ def detections_page():
 
 @app.route('/api/detections/list', methods=['GET'])
 @login_required
+@HTTP_CACHE.versioned(user_detections_scope)
 def get_detections_list():
     """Récupérer la liste des détections avec filtres et pagination"""
     user_id = session.get('user_id')
@@ -1269,7 +1730,7 @@ def get_detections_list():
     per_page = 20
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         query = '''SELECT id, waste_type, quantity, detection_date 
@@ -1295,12 +1756,20 @@ def get_detections_list():
         total = c.fetchone()[0]
         
         # Add pagination
+        offset = (page - 1) * per_page
         query += ' ORDER BY detection_date DESC LIMIT ? OFFSET ?'
-        params.extend([per_page, (page - 1) * per_page])
+        params.extend([per_page, offset])
         
         c.execute(query, params)
         detections = c.fetchall()
         
+        # Les détections archivées, plus anciennes, suivent celles de la base
+        archived_total = archive.count_archived(conn, user_id, start_date, end_date, waste_type)
+        if archived_total and len(detections) < per_page:
+            detections += archive.read_archived(conn, user_id, start_date, end_date, waste_type,
+                                                offset=max(0, offset - total),
+                                                limit=per_page - len(detections))
+        total += archived_total
         conn.close()
         
         return jsonify({
@@ -1329,7 +1798,7 @@ def export_detections_csv():
     waste_type = request.args.get('waste_type', 'all')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         query = '''SELECT id, waste_type, quantity, detection_date 
@@ -1353,6 +1822,7 @@ def export_detections_csv():
         
         c.execute(query, params)
         detections = c.fetchall()
+        detections += archive.read_archived(conn, user_id, start_date, end_date, waste_type)
         conn.close()
         
         si = StringIO()
@@ -1392,7 +1862,7 @@ def export_detections_pdf():
     waste_type = request.args.get('waste_type', 'all')
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         query = '''SELECT id, waste_type, quantity, detection_date 
@@ -1416,6 +1886,7 @@ def export_detections_pdf():
         
         c.execute(query, params)
         detections = c.fetchall()
+        detections += archive.read_archived(conn, user_id, start_date, end_date, waste_type)
         conn.close()
         
         buffer = BytesIO()
@@ -1472,4 +1943,7 @@ def test_api():
     return render_template('test_api.html')
 
 if __name__ == '__main__':
+    # Avec le reloader, seul le processus enfant (WERKZEUG_RUN_MAIN) sert les requêtes
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        MODEL_LOADER.start()
     app.run(debug=True, port=5000)
\ No newline at end of file
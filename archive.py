@@ -0,0 +1,302 @@
+"""
+Archivage des détections anciennes en partitions Parquet mensuelles
+
+    python archive.py --older-than-days 365 --vacuum
+
+Les lignes de waste_detection plus vieilles que l'âge demandé quittent SQLite pour des
+fichiers Parquet compressés (zstd), un dossier par mois :
+
+    archive/waste_detection/2024-03/part-20250101T020000.parquet
+
+Ce qui reste en base :
+- waste_detection_daily : totaux par utilisateur, jour et type de déchet ; la vue
+  waste_detection_all (détections vivantes + totaux archivés) sert aux statistiques ;
+- archive_partitions : catalogue des fichiers (mois, dates min/max, lignes). Seuls les
+  fichiers catalogués sont lus : un fichier écrit par un archivage interrompu est ignoré.
+
+La liste et les exports lisent les partitions quand la plage demandée remonte avant la
+date la plus récente archivée. polars n'est importé que par l'archivage et ces lectures.
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+ARCHIVE_DIR = os.environ.get('WASTEAI_ARCHIVE_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+ARCHIVE_AFTER_DAYS = int(os.environ.get('WASTEAI_ARCHIVE_AFTER_DAYS', 365))
+
+def init_archive_db(c):
+    """Créer les tables de l'archive (appelé par init_db)"""
+    c.execute('''CREATE TABLE IF NOT EXISTS waste_detection_daily
+                 (user_id INTEGER NOT NULL,
+                  day TEXT NOT NULL,
+                  waste_type TEXT NOT NULL,
+                  detections INTEGER NOT NULL,
+                  quantity INTEGER NOT NULL,
+                  PRIMARY KEY (user_id, day, waste_type)) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS archive_partitions
+                 (path TEXT PRIMARY KEY,
+                  month TEXT NOT NULL,
+                  min_date TEXT NOT NULL,
+                  max_date TEXT NOT NULL,
+                  rows INTEGER NOT NULL,
+                  created_at TIMESTAMP)''')
+    # Détections vivantes et totaux archivés, même forme pour SUM(quantity) / SUM(detections)
+    c.execute('''CREATE VIEW IF NOT EXISTS waste_detection_all AS
+                 SELECT user_id, waste_type, quantity, detection_date, 1 AS detections
+                 FROM waste_detection
+                 UNION ALL
+                 SELECT user_id, waste_type, quantity, day, detections
+                 FROM waste_detection_daily''')
+
+# ==================== ARCHIVAGE ====================
+
+def archive_detections(db_path, older_than_days=ARCHIVE_AFTER_DAYS, archive_dir=ARCHIVE_DIR, now=None):
+    """Déplacer les détections antérieures à la date limite vers les partitions mensuelles
+
+    Tout se fait sous un verrou d'écriture SQLite : les lignes lues, agrégées et supprimées
+    sont exactement les mêmes. Retourne le nombre de lignes archivées par mois.
+    """
+    import polars as pl
+
+    cutoff = ((now or datetime.now()) - timedelta(days=older_than_days)).strftime('%Y-%m-%d')
+    stamp = (now or datetime.now()).strftime('%Y%m%dT%H%M%S')
+    conn = sqlite3.connect(db_path)
+    written = []
+    try:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        # Les robots envoient des valeurs JSON quelconques (/api/detection/batch) : tout est
+        # converti au type des partitions pour qu'une ligne atypique ne bloque pas l'archivage
+        c.execute('''SELECT id, CAST(user_id AS INTEGER), CAST(waste_type AS TEXT), CAST(quantity AS INTEGER),
+                            CAST(detection_date AS TEXT)
+                     FROM waste_detection
+                     WHERE detection_date < ? ORDER BY detection_date''', (cutoff,))
+        rows = c.fetchall()
+        if not rows:
+            conn.rollback()
+            return {}
+
+        frame = pl.DataFrame(rows, schema={'id': pl.Int64, 'user_id': pl.Int64, 'waste_type': pl.Utf8,
+                                           'quantity': pl.Int64, 'detection_date': pl.Utf8}, orient='row')
+        date = pl.col('detection_date')
+        frame = frame.with_columns(
+            pl.when(date.str.contains(r'^\d{4}-\d{2}')).then(date.str.slice(0, 7))
+            .otherwise(pl.lit('invalid')).alias('month'))
+        counts = {}
+        for (month,), part in frame.group_by('month', maintain_order=True):
+            # Tri par utilisateur : les statistiques des groupes de lignes Parquet permettent
+            # de sauter ceux des autres utilisateurs à la lecture
+            part = part.drop('month').sort(['user_id', 'detection_date'])
+            folder = os.path.join(archive_dir, 'waste_detection', month)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f'part-{stamp}.parquet')
+            part.write_parquet(path + '.tmp', compression='zstd', row_group_size=64_000)
+            os.replace(path + '.tmp', path)
+            written.append(path)
+            c.execute('''INSERT INTO archive_partitions (path, month, min_date, max_date, rows, created_at)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      (os.path.relpath(path, archive_dir), month, part['detection_date'].min(),
+                       part['detection_date'].max(), part.height, datetime.now()))
+            counts[month] = part.height
+
+        c.execute('''INSERT INTO waste_detection_daily (user_id, day, waste_type, detections, quantity)
+                     SELECT CAST(user_id AS INTEGER), day, CAST(waste_type AS TEXT), COUNT(*), SUM(quantity)
+                     FROM (SELECT *, SUBSTR(CAST(detection_date AS TEXT), 1, 10) AS day
+                           FROM waste_detection WHERE detection_date < ?)
+                     GROUP BY 1, 2, 3
+                     ON CONFLICT (user_id, day, waste_type) DO UPDATE SET
+                         detections = detections + excluded.detections,
+                         quantity = quantity + excluded.quantity''', (cutoff,))
+        c.execute('DELETE FROM waste_detection WHERE detection_date < ?', (cutoff,))
+        conn.commit()
+        return counts
+    except Exception:
+        conn.rollback()
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        conn.close()
+
+class PurgeFiles:
+    """Partitions réécrites par purge_user, échangées dans la transaction de l'appelant
+
+    Les nouvelles versions sont écrites à côté (.tmp). apply() les met en place juste avant
+    le commit, en gardant les originaux (.bak) ; finish() supprime les originaux après le
+    commit, rollback() les restaure si la transaction échoue. Les fichiers changent sous le
+    verrou d'écriture SQLite : deux suppressions simultanées ne réécrivent pas la même
+    partition à partir du même original.
+    """
+
+    def __init__(self):
+        self.removed = 0
+        self._staged = []    # (chemin, .tmp ou None si la partition disparaît)
+        self._applied = []
+
+    def stage(self, path, tmp):
+        self._staged.append((path, tmp))
+
+    def apply(self):
+        for path, tmp in self._staged:
+            os.replace(path, path + '.bak')
+            self._applied.append((path, tmp))
+            if tmp is not None:
+                os.replace(tmp, path)
+
+    def finish(self):
+        for path, _ in self._applied:
+            os.remove(path + '.bak')
+        self._staged = self._applied = []
+
+    def rollback(self):
+        for path, _ in reversed(self._applied):
+            os.replace(path + '.bak', path)
+        for _, tmp in self._staged:
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+        self._staged = self._applied = []
+
+def purge_user(conn, user_id, archive_dir=ARCHIVE_DIR):
+    """Retirer un utilisateur des partitions (réécrit seulement celles qui le contiennent)
+
+    Appelé par delete_user, dans sa transaction : le catalogue est mis à jour par `conn`,
+    les fichiers sont préparés et retournés (PurgeFiles) ; l'appelant appelle apply() juste
+    avant son commit, puis finish(), ou rollback() en cas d'échec.
+    """
+    c = conn.cursor()
+    c.execute('DELETE FROM waste_detection_daily WHERE user_id = ?', (user_id,))
+    c.execute('SELECT path FROM archive_partitions')
+    paths = [row[0] for row in c.fetchall()]
+    files = PurgeFiles()
+    if not paths:
+        return files
+
+    import polars as pl
+
+    try:
+        for relpath in paths:
+            path = os.path.join(archive_dir, relpath)
+            if not os.path.exists(path):
+                continue
+            # Partitions triées par utilisateur : les statistiques des groupes de lignes évitent
+            # de lire celles (ou les parties) où il n'apparaît pas
+            if not pl.scan_parquet(path).filter(pl.col('user_id') == user_id).select(pl.len()).collect().item():
+                continue
+            part = pl.read_parquet(path)
+            kept = part.filter(pl.col('user_id') != user_id)
+            files.removed += part.height - kept.height
+            if kept.height:
+                kept.write_parquet(path + '.tmp', compression='zstd', row_group_size=64_000)
+                files.stage(path, path + '.tmp')
+                c.execute('''UPDATE archive_partitions SET rows = ?, min_date = ?, max_date = ?
+                             WHERE path = ?''',
+                          (kept.height, kept['detection_date'].min(), kept['detection_date'].max(), relpath))
+            else:
+                files.stage(path, None)
+                c.execute('DELETE FROM archive_partitions WHERE path = ?', (relpath,))
+    except Exception:
+        files.rollback()
+        raise
+    return files
+
+# ==================== LECTURE ====================
+
+def _partitions(conn, start_date, end_date, archive_dir):
+    """Fichiers catalogués qui recoupent [start_date, end_date] (dates 'YYYY-MM-DD')"""
+    query = 'SELECT path FROM archive_partitions WHERE 1 = 1'
+    params = []
+    if start_date:
+        query += ' AND max_date >= ?'
+        params.append(start_date)
+    if end_date:
+        # max_date/min_date contiennent l'heure : comparer au lendemain de end_date
+        query += ' AND min_date < DATE(?, \'+1 day\')'
+        params.append(end_date)
+    c = conn.cursor()
+    c.execute(query + ' ORDER BY month DESC', params)
+    return [os.path.join(archive_dir, row[0]) for row in c.fetchall()]
+
+def scan_archived(conn, user_id, start_date=None, end_date=None, waste_type=None, archive_dir=ARCHIVE_DIR):
+    """Requête polars paresseuse sur les détections archivées d'un utilisateur, None si aucune
+
+    Mêmes filtres que /api/detections/list, triée par date décroissante.
+    """
+    paths = _partitions(conn, start_date, end_date, archive_dir)
+    if not paths:
+        return None
+
+    import polars as pl
+
+    query = pl.scan_parquet(paths).filter(pl.col('user_id') == user_id)
+    day = pl.col('detection_date').str.slice(0, 10)
+    if start_date:
+        query = query.filter(day >= start_date)
+    if end_date:
+        query = query.filter(day <= end_date)
+    if waste_type and waste_type != 'all':
+        query = query.filter(pl.col('waste_type') == waste_type)
+    return query.select(['id', 'waste_type', 'quantity', 'detection_date']).sort('detection_date', descending=True)
+
+def count_archived(conn, user_id, start_date=None, end_date=None, waste_type=None):
+    """Nombre de détections archivées, lu dans les totaux journaliers (sans ouvrir de Parquet)
+
+    Le jour des totaux est le préfixe de detection_date, comme le filtre de scan_archived :
+    le compte correspond exactement aux lignes que read_archived peut rendre.
+    """
+    query = 'SELECT COALESCE(SUM(detections), 0) FROM waste_detection_daily WHERE user_id = ?'
+    params = [user_id]
+    if start_date:
+        query += ' AND day >= ?'
+        params.append(start_date)
+    if end_date:
+        query += ' AND day <= ?'
+        params.append(end_date)
+    if waste_type and waste_type != 'all':
+        query += ' AND waste_type = ?'
+        params.append(waste_type)
+    c = conn.cursor()
+    c.execute(query, params)
+    return c.fetchone()[0]
+
+def read_archived(conn, user_id, start_date=None, end_date=None, waste_type=None, offset=0, limit=None):
+    """Détections archivées en tuples (id, waste_type, quantity, detection_date)"""
+    query = scan_archived(conn, user_id, start_date, end_date, waste_type)
+    if query is None:
+        return []
+    return query.slice(offset, limit).collect().rows()
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivage des détections anciennes en Parquet")
+    parser.add_argument('--db', default=None, help="Base SQLite (défaut: WASTEAI_DB_PATH ou waste.db)")
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--vacuum', action='store_true', help="Réduire le fichier de base après archivage")
+    args = parser.parse_args()
+
+    db_path = args.db or os.environ.get('WASTEAI_DB_PATH',
+                                        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'waste.db'))
+    conn = sqlite3.connect(db_path)
+    init_archive_db(conn.cursor())
+    conn.commit()
+    conn.close()
+
+    counts = archive_detections(db_path, args.older_than_days, args.archive_dir)
+    if not counts:
+        print(f"ℹ️ Aucune détection de plus de {args.older_than_days} jours")
+        return
+    for month, rows in counts.items():
+        print(f"📦 {month}: {rows} détections archivées")
+    print(f"✅ {sum(counts.values())} détections archivées dans {args.archive_dir}")
+
+    if args.vacuum:
+        size = os.path.getsize(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute('VACUUM')
+        conn.close()
+        print(f"🧹 Base réduite: {size / 1e6:.1f} Mo -> {os.path.getsize(db_path) / 1e6:.1f} Mo")
+
+if __name__ == '__main__':
+    main()
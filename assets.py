@@ -0,0 +1,156 @@
+"""
+Assets statiques empreintés et précompressés
+
+    python assets.py            # construire static/dist/ et son manifeste
+
+Chaque fichier de static/js, static/css et static/img est copié dans static/dist/ sous
+un nom qui contient l'empreinte de son contenu (camera.3f2a9c01b7e4.js), avec ses
+variantes gzip (.gz) et brotli (.br, si le module brotli est installé) pour le texte.
+Les url(...) des CSS sont réécrites vers les images empreintées.
+
+À l'exécution, url_for('static', filename='js/camera.js') pointe vers la version
+empreintée (les templates ne changent pas) ; ces fichiers sont servis précompressés
+avec un cache d'un an (immutable) : une page déjà visitée ne redemande aucun asset.
+Sans build, ou pour un fichier modifié depuis le build, l'URL d'origine est conservée.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+# Images d'abord : les CSS qui les référencent sont réécrites avec leurs noms empreintés
+ASSET_DIRS = ('img', 'js', 'css')
+COMPRESSIBLE = {'.js', '.css', '.svg', '.json', '.txt'}
+HASH_LENGTH = 12
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+def _compressors():
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    try:
+        import brotli
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    except ImportError:
+        pass  # brotli optionnel : gzip seul
+    return compressors
+
+def _rewrite_css(data, name, manifest):
+    """Remplacer les url() relatives par les chemins empreintés (même arborescence dans dist)"""
+    folder = os.path.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('data:', 'http:', 'https:', '/', '#')):
+            return match.group(0)
+        target = os.path.normpath(os.path.join(folder, url)).replace(os.sep, '/')
+        entry = manifest.get(target)
+        if entry is None:
+            return match.group(0)
+        relative = os.path.relpath(entry['path'][len(DIST_DIR) + 1:], folder).replace(os.sep, '/')
+        return f'url({quote}{relative}{quote})'
+
+    return _CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+def build(static_dir=STATIC_DIR):
+    """Construire static/dist/ ; retourne le manifeste {source: {'path', 'hash', 'source_hash'}}"""
+    dist = os.path.join(static_dir, DIST_DIR)
+    staging = dist + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    compressors = _compressors()
+    manifest = {}
+
+    for folder in ASSET_DIRS:
+        root = os.path.join(static_dir, folder)
+        for current, _, files in os.walk(root):
+            for filename in sorted(files):
+                source = os.path.join(current, filename)
+                name = os.path.relpath(source, static_dir).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    original = f.read()
+                data = _rewrite_css(original, name, manifest) if filename.endswith('.css') else original
+                stem, ext = os.path.splitext(name)
+                path = f'{DIST_DIR}/{stem}.{_digest(data)}{ext}'
+                target = os.path.join(staging, path[len(DIST_DIR) + 1:])
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    f.write(data)
+                if ext in COMPRESSIBLE:
+                    for suffix, compress in compressors:
+                        compressed = compress(data)
+                        if len(compressed) < len(data):
+                            with open(target + suffix, 'wb') as f:
+                                f.write(compressed)
+                manifest[name] = {'path': path, 'hash': _digest(data), 'source_hash': _digest(original)}
+
+    with open(os.path.join(staging, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    # Remplacement d'un bloc : une page ne référence jamais un build à moitié écrit
+    shutil.rmtree(dist, ignore_errors=True)
+    os.replace(staging, dist)
+    return manifest
+
+# ==================== SERVICE ====================
+
+class AssetManifest:
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = static_dir
+        self.paths = {}   # 'js/camera.js' -> 'dist/js/camera.<empreinte>.js'
+        self.load()
+
+    def load(self):
+        """Lire le manifeste ; une source modifiée depuis le build garde son URL d'origine"""
+        path = os.path.join(self.static_dir, DIST_DIR, MANIFEST_NAME)
+        self.paths = {}
+        if not os.path.exists(path):
+            return self
+        try:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Manifeste d'assets ignoré ({path}): {e}")
+            return self
+        stale = 0
+        for name, entry in manifest.items():
+            source = os.path.join(self.static_dir, name)
+            try:
+                with open(source, 'rb') as f:
+                    fresh = _digest(f.read()) == entry['source_hash']
+            except OSError:
+                fresh = False
+            if fresh:
+                self.paths[name] = entry['path']
+            else:
+                stale += 1
+        if stale:
+            print(f"⚠️ {stale} asset(s) modifié(s) depuis le build : relancer python assets.py")
+        return self
+
+    def url_defaults(self, endpoint, values):
+        """Hook Flask url_defaults : url_for('static') pointe vers le fichier empreinté"""
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.paths.get(values['filename'], values['filename'])
+
+    def compressed_file(self, filename, accept_encoding):
+        """(chemin, encodage) de la meilleure variante acceptée d'un fichier de dist/"""
+        path = os.path.join(self.static_dir, filename)
+        accepted = {token.split(';')[0].strip() for token in (accept_encoding or '').split(',')}
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if encoding in accepted and os.path.exists(path + suffix):
+                return path + suffix, encoding
+        return path, None
+
+def is_fingerprinted(filename):
+    return filename.startswith(DIST_DIR + '/')
+
+if __name__ == '__main__':
+    manifest = build()
+    compressed = sum(1 for entry in manifest.values() if os.path.splitext(entry['path'])[1] in COMPRESSIBLE)
+    print(f"✅ {len(manifest)} assets empreintés ({compressed} précompressés) dans static/{DIST_DIR}/")
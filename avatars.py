@@ -0,0 +1,175 @@
+"""
+Photos de profil : décodage, vignettes fixes et adressage par contenu
+
+L'original envoyé n'est jamais servi : il est décodé (OpenCV), recadré au carré puis
+réencodé en quelques tailles fixes, en WebP et en JPEG :
+
+    static/uploads/avatars/<empreinte>-<taille>.webp|.jpg
+
+L'empreinte est le SHA-256 des octets envoyés : une URL ne désigne qu'un seul contenu,
+les vignettes sont donc servies avec un cache d'un an (immutable), et la même photo
+envoyée deux fois ne produit qu'un seul jeu de fichiers. La colonne users.profile_picture
+contient /avatars/<empreinte> ; avatar_url() ajoute la taille voulue.
+
+Les vignettes d'une ancienne photo sont supprimées par un thread de fond, si plus aucun
+utilisateur ne la référence.
+"""
+import glob
+import hashlib
+import os
+import queue
+import threading
+import time
+
+# Plafond de pixels du décodeur (protection contre les images compressées piégées) :
+# lu par OpenCV au premier décodage
+os.environ.setdefault('OPENCV_IO_MAX_IMAGE_PIXELS', str(50_000_000))
+
+import cv2
+import numpy as np
+
+AVATAR_FOLDER = os.environ.get('WASTEAI_AVATAR_DIR',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'avatars'))
+# Originaux enregistrés avant le passage aux vignettes
+LEGACY_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads', 'profiles')
+AVATAR_URL_PREFIX = '/avatars/'
+AVATAR_MAX_BYTES = int(os.environ.get('WASTEAI_AVATAR_MAX_BYTES', 5 * 1024 * 1024))
+AVATAR_MAX_SIDE = 8000
+# En-tête (40 px) et page profil (150 px), en 1x et 2x
+AVATAR_SIZES = (40, 80, 150, 300)
+HEADER_AVATAR_SIZE = 80
+PROFILE_AVATAR_SIZE = 300
+WEBP_QUALITY = 82
+JPEG_QUALITY = 85
+
+class AvatarError(ValueError):
+    """Image refusée (format, taille) : message destiné à l'utilisateur"""
+
+def _decode(data):
+    if len(data) > AVATAR_MAX_BYTES:
+        raise AvatarError(f"Image trop volumineuse (max {AVATAR_MAX_BYTES // (1024 * 1024)} Mo)")
+    # IMREAD_UNCHANGED : garder la transparence pour la composer sur fond blanc
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise AvatarError("Image illisible (png, jpg, jpeg, gif, webp)")
+    if max(image.shape[:2]) > AVATAR_MAX_SIDE:
+        raise AvatarError(f"Image trop grande (max {AVATAR_MAX_SIDE} px de côté)")
+    if image.dtype != np.uint8:
+        image = cv2.convertScaleAbs(image, alpha=255 / np.iinfo(image.dtype).max)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        alpha = image[:, :, 3:].astype(np.float32) / 255
+        image = (image[:, :, :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+    return image
+
+def _square(image):
+    """Recadrage carré centré"""
+    height, width = image.shape[:2]
+    side = min(height, width)
+    y, x = (height - side) // 2, (width - side) // 2
+    return image[y:y + side, x:x + side]
+
+def process_upload(data, folder=AVATAR_FOLDER):
+    """Décoder une photo envoyée et écrire ses vignettes, retourne la valeur de profile_picture
+
+    Lève AvatarError si l'image est refusée.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    os.makedirs(folder, exist_ok=True)
+    paths = [_path(folder, digest, size, ext) for size in AVATAR_SIZES for ext in ('webp', 'jpg')]
+    if all(os.path.exists(path) for path in paths):
+        # Déjà traitée (même photo) : rafraîchir la date protège du nettoyage en cours
+        for path in paths:
+            os.utime(path)
+        return AVATAR_URL_PREFIX + digest
+
+    image = _square(_decode(data))
+    for size in AVATAR_SIZES:
+        # Jamais d'agrandissement : une petite image garde sa résolution
+        thumb = image if image.shape[0] <= size else cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA)
+        for ext, params in (('webp', [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY]),
+                            ('jpg', [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY, cv2.IMWRITE_JPEG_PROGRESSIVE, 1])):
+            ok, encoded = cv2.imencode(f'.{ext}', thumb, params)
+            if not ok:
+                raise AvatarError("Impossible d'encoder la vignette")
+            path = _path(folder, digest, size, ext)
+            # Écriture atomique : un lecteur ne voit jamais une vignette partielle
+            with open(path + '.tmp', 'wb') as f:
+                f.write(encoded.tobytes())
+            os.replace(path + '.tmp', path)
+    return AVATAR_URL_PREFIX + digest
+
+def _path(folder, digest, size, ext):
+    return os.path.join(folder, f'{digest}-{size}.{ext}')
+
+def avatar_url(picture, size):
+    """URL d'une vignette à partir de users.profile_picture (anciennes URL inchangées)"""
+    if picture and picture.startswith(AVATAR_URL_PREFIX):
+        return f'{picture}-{size}'
+    return picture or ''
+
+def variant_path(name, accept, folder=AVATAR_FOLDER):
+    """Fichier servi pour /avatars/<empreinte>-<taille> : WebP si accepté, JPEG sinon"""
+    digest, _, size = name.rpartition('-')
+    if not digest.isalnum() or not size.isdigit() or int(size) not in AVATAR_SIZES:
+        return None
+    ext = 'webp' if 'image/webp' in (accept or '') else 'jpg'
+    path = _path(folder, digest, int(size), ext)
+    return path if os.path.exists(path) else None
+
+# ==================== NETTOYAGE ====================
+
+class AvatarCleaner:
+    """Supprime en arrière-plan les vignettes des photos qui ne sont plus référencées
+
+    is_referenced(picture) -> bool : vérifié au moment de la suppression, car une même
+    photo (même empreinte) peut appartenir à plusieurs utilisateurs.
+    """
+
+    def __init__(self, is_referenced, folder=AVATAR_FOLDER, legacy_folder=LEGACY_FOLDER, grace_s=60):
+        self.is_referenced = is_referenced
+        self.folder = folder
+        self.legacy_folder = legacy_folder
+        # Vignettes réutilisées il y a moins de grace_s : l'utilisateur qui vient d'envoyer
+        # la même photo n'est peut-être pas encore enregistré en base
+        self.grace_s = grace_s
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def schedule(self, picture):
+        if not picture:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='avatar-cleaner', daemon=True)
+                self._thread.start()
+        self._queue.put(picture)
+
+    def _loop(self):
+        while True:
+            picture = self._queue.get()
+            try:
+                self.remove(picture)
+            except Exception as e:
+                print(f"⚠️ Nettoyage photo de profil {picture}: {e}")
+
+    def remove(self, picture):
+        if self.is_referenced(picture):
+            return 0
+        if picture.startswith(AVATAR_URL_PREFIX):
+            digest = picture[len(AVATAR_URL_PREFIX):]
+            paths = glob.glob(os.path.join(self.folder, f'{glob.escape(digest)}-*'))
+            if any(time.time() - os.path.getmtime(path) < self.grace_s for path in paths):
+                return 0
+        elif picture.startswith('/static/uploads/profiles/'):
+            paths = [os.path.join(self.legacy_folder, os.path.basename(picture))]
+        else:
+            return 0
+        removed = 0
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+                removed += 1
+        return removed
@@ -0,0 +1,3 @@
+"""
+Outils de mesure de performance de WasteAI (à lancer avec python -m benchmarks.<outil>)
+"""
@@ -0,0 +1,203 @@
+"""
+Micro-benchmark de WasteDetector : detect_from_image, detect_from_frame et inférence groupée
+
+    python -m benchmarks.bench_inference --save-baseline   # enregistrer la référence
+    python -m benchmarks.bench_inference                   # comparer à la référence
+
+Chaque configuration (méthode, taille d'entrée, taille de lot, threads) tourne dans un
+processus neuf : la latence à froid et le pic de RSS ne dépendent pas des précédentes.
+Le code de sortie vaut 1 si une mesure régresse au-delà de la tolérance.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.common import ROOT_DIR, latency_summary, peak_rss_mb, read_json, write_json
+
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, 'benchmarks', 'baseline_inference.json')
+DEFAULT_IMAGES = [os.path.join(ROOT_DIR, 'test.jpg')] + sorted(glob.glob(os.path.join(ROOT_DIR, 'static', 'img', '*.jpeg')))
+
+# ==================== EXÉCUTION D'UNE CONFIGURATION ====================
+
+def run_config(config):
+    """Mesurer une configuration dans le processus courant"""
+    threads = config['threads']
+    # Doit précéder l'import de torch pour limiter le pool OpenMP
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+
+    import cv2
+    # Calibration (thread_budget.py) : OpenCV et le pool inter-op peuvent différer de torch
+    cv2.setNumThreads(config.get('opencv_threads', threads))
+
+    from yolo_detector import WasteDetector, import_yolo
+    started = time.perf_counter()
+    import_yolo()
+    import torch
+    torch.set_num_threads(threads)
+    if config.get('interop_threads'):
+        torch.set_num_interop_threads(config['interop_threads'])
+    detector = WasteDetector(config['model'])
+    if not detector.model:
+        raise RuntimeError(f"Impossible de charger {config['model']}")
+    detector.imgsz = config['imgsz']
+    load_s = time.perf_counter() - started
+
+    images = config['images']
+    frames = [cv2.imread(path) for path in images]
+    method, batch = config['method'], config['batch']
+
+    def call(i):
+        if method == 'image':
+            detector.detect_from_image(images[i % len(images)])
+        elif method == 'frame':
+            # detect_from_frame dessine sur la frame : on travaille sur une copie
+            detector.detect_from_frame(frames[i % len(frames)].copy())
+        else:
+            detector.predict_batch([frames[(i + k) % len(frames)] for k in range(batch)])
+
+    started = time.perf_counter()
+    call(0)
+    cold_ms = round(1000 * (time.perf_counter() - started), 3)
+
+    for i in range(config['warmup']):
+        call(i)
+
+    samples = []
+    for i in range(config['iterations']):
+        started = time.perf_counter()
+        call(i)
+        samples.append(time.perf_counter() - started)
+
+    summary = latency_summary(samples)
+    return {
+        'load_s': round(load_s, 3),
+        'cold_ms': cold_ms,
+        'warm': summary,
+        'images_per_s': round(summary['throughput_per_s'] * batch, 3),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def run_isolated(config):
+    """Lancer une configuration dans un sous-processus et récupérer son résultat JSON"""
+    proc = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_inference', '--worker', json.dumps(config)],
+        cwd=ROOT_DIR, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Configuration {config_key(config)} en échec:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def config_key(config):
+    key = f"{config['method']}-b{config['batch']}-{config['imgsz']}px-t{config['threads']}"
+    if 'opencv_threads' in config:
+        key += f"-cv{config['opencv_threads']}"
+    return key
+
+def build_matrix(args):
+    """Produit cartésien des paramètres ; detect_from_image/frame ne traitent qu'une image"""
+    configs = []
+    for threads in args.threads:
+        for imgsz in args.imgsz:
+            for batch in args.batch:
+                methods = ['image', 'frame'] if batch == 1 else ['batch']
+                for method in methods:
+                    configs.append({
+                        'model': args.model,
+                        'images': args.images,
+                        'method': method,
+                        'batch': batch,
+                        'imgsz': imgsz,
+                        'threads': threads,
+                        'warmup': args.warmup,
+                        'iterations': args.iterations
+                    })
+    return configs
+
+# ==================== COMPARAISON ====================
+
+def compare(current, baseline, tolerance):
+    """Lister les régressions au-delà de la tolérance relative"""
+    regressions = []
+    for key, result in current.items():
+        ref = baseline.get(key)
+        if not ref:
+            continue
+        checks = [
+            ('cold_ms', result['cold_ms'], ref['cold_ms'], True),
+            ('p50_ms', result['warm']['p50_ms'], ref['warm']['p50_ms'], True),
+            ('p95_ms', result['warm']['p95_ms'], ref['warm']['p95_ms'], True),
+            ('peak_rss_mb', result['peak_rss_mb'], ref['peak_rss_mb'], True),
+            ('images_per_s', result['images_per_s'], ref['images_per_s'], False)
+        ]
+        for name, value, ref_value, lower_is_better in checks:
+            if not ref_value:
+                continue
+            change = (value - ref_value) / ref_value
+            if (lower_is_better and change > tolerance) or (not lower_is_better and -change > tolerance):
+                regressions.append(f"{key} {name}: {ref_value} -> {value} ({change:+.1%})")
+    return regressions
+
+# ==================== MAIN ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark d'inférence de WasteDetector")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--model', default=None, help="Modèle à mesurer (défaut: MODEL_PATH)")
+    parser.add_argument('--images', nargs='+', default=DEFAULT_IMAGES)
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[320, 480, 640])
+    parser.add_argument('--batch', nargs='+', type=int, default=[1, 4])
+    parser.add_argument('--threads', nargs='+', type=int, default=sorted({1, max(1, (os.cpu_count() or 1) // 2)}))
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Régression relative tolérée (0.15 = 15%%)")
+    parser.add_argument('--save-baseline', action='store_true', help="Enregistrer les résultats comme référence")
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_config(json.loads(args.worker))))
+        return
+
+    if args.model is None:
+        from yolo_detector import MODEL_PATH
+        args.model = MODEL_PATH
+
+    results = {}
+    for config in build_matrix(args):
+        key = config_key(config)
+        result = run_isolated(config)
+        results[key] = result
+        print(f"⏱️ {key:<24} froid {result['cold_ms']:>9.1f} ms | p50 {result['warm']['p50_ms']:>8.1f} ms "
+              f"| p95 {result['warm']['p95_ms']:>8.1f} ms | {result['images_per_s']:>7.2f} img/s "
+              f"| RSS {result['peak_rss_mb']:>7.1f} Mo")
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'model': args.model,
+            'images': [os.path.relpath(p, ROOT_DIR) for p in args.images]
+        },
+        'results': results
+    }
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        write_json(args.baseline, report)
+        return
+
+    regressions = compare(results, read_json(args.baseline)['results'], args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} régression(s) au-delà de {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"\n✅ Aucune régression au-delà de {args.tolerance:.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark de montée en charge des requêtes de lecture de app.py
+
+    python -m benchmarks.bench_queries --scales 10000 100000 1000000 10000000
+
+Pour chaque volume, une base synthétique est générée (benchmarks.seed) puis chaque route
+de lecture est appelée via le client de test Flask : on obtient la courbe de latence par
+route et le plan (EXPLAIN QUERY PLAN) de chaque requête SQL réellement exécutée.
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.common import latency_summary, write_json
+
+def read_routes():
+    """Routes de lecture : (nom, chemin) ; les filtres couvrent les variantes de requêtes"""
+    now = datetime.now()
+    last_year = now.year - 1
+    return [
+        ('stats_monthly_distribution', f"/api/stats/monthly-distribution?year={now.year}&month={now.month:02d}"),
+        ('stats_last_month', '/api/stats/last-month'),
+        ('stats_total', '/api/stats/total'),
+        ('chart_monthly_all', f"/api/chart/monthly?year={now.year}&waste_type=all"),
+        ('chart_monthly_type', f"/api/chart/monthly?year={now.year}&waste_type=Plastique"),
+        ('chart_weekly_all', '/api/chart/weekly?week_offset=0&waste_type=all'),
+        ('chart_weekly_type', '/api/chart/weekly?week_offset=4&waste_type=Verre'),
+        ('detections_list_first', '/api/detections/list?page=1'),
+        ('detections_list_deep', '/api/detections/list?page=200'),
+        ('detections_list_filtered',
+         f"/api/detections/list?start_date={last_year}-01-01&end_date={last_year}-06-30&waste_type=Papier"),
+        ('export_csv', f"/api/detections/export/csv?start_date={now.year}-01-01"),
+        ('recent_detections', '/api/camera/recent-detections'),
+        ('robot_stats', '/api/robot/stats'),
+        ('robot_status', '/api/robot/status'),
+        ('user_info', '/api/user/info'),
+        ('profile', '/api/profile'),
+        ('notifications', '/api/notifications'),
+        ('admin_users', '/api/admin/users')
+    ]
+
+def explain(db_path, statement):
+    """Plan d'exécution SQLite d'une requête (paramètres déjà développés par la trace)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute('EXPLAIN QUERY PLAN ' + statement).fetchall()
+        return [row[3] for row in rows]
+    finally:
+        conn.close()
+
+def bench_scale(webapp, db_path, user_id, repeat):
+    """Mesurer toutes les routes de lecture sur la base courante"""
+    client = webapp.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['email'] = 'bench@wasteai.test'
+        sess['role'] = 'admin'
+
+    original_get_db = webapp.get_db
+    results = {}
+    for name, path in read_routes():
+        # Premier appel tracé : capture des requêtes SQL exécutées par la route
+        statements = []
+
+        def traced_get_db():
+            conn = original_get_db()
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        webapp.get_db = traced_get_db
+        try:
+            status = client.get(path).status_code
+        finally:
+            webapp.get_db = original_get_db
+
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.get(path)
+            samples.append(time.perf_counter() - started)
+
+        queries = []
+        for statement in dict.fromkeys(statements):
+            if statement.lstrip().upper().startswith('SELECT'):
+                queries.append({'sql': ' '.join(statement.split()), 'plan': explain(db_path, statement)})
+
+        results[name] = {'status': status, 'latency': latency_summary(samples), 'queries': queries}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Courbes de latence des requêtes de lecture selon le volume")
+    parser.add_argument('--scales', nargs='+', type=int, default=[10000, 100000, 1000000],
+                        help="Nombres total de détections à tester")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5, help="Appels mesurés par route")
+    parser.add_argument('--report', default=os.path.join('models', 'query_scaling.json'))
+    parser.add_argument('--keep', help="Dossier où conserver les bases générées")
+    args = parser.parse_args()
+
+    workdir = args.keep or tempfile.mkdtemp(prefix='wasteai-queries-')
+    os.makedirs(workdir, exist_ok=True)
+    # Pointer l'application vers une base jetable avant son import
+    os.environ['WASTEAI_DB_PATH'] = os.path.join(workdir, 'bootstrap.db')
+
+    from benchmarks.seed import seed_database
+    import app as webapp
+
+    report = {'users': args.users, 'scales': {}}
+    try:
+        for scale in args.scales:
+            db_path = os.path.join(workdir, f"scale_{scale}.db")
+            if not os.path.exists(db_path):
+                started = time.perf_counter()
+                seed_database(db_path, args.users, max(1, scale // args.users), quiet=True)
+                print(f"🌱 {scale:,} détections générées en {time.perf_counter() - started:.1f}s")
+
+            webapp.DB_PATH = db_path
+            # Utilisateur le plus actif : le pire cas pour les requêtes par utilisateur
+            conn = sqlite3.connect(db_path)
+            user_id = conn.execute('''SELECT user_id FROM waste_detection GROUP BY user_id
+                                      ORDER BY COUNT(*) DESC LIMIT 1''').fetchone()[0]
+            conn.close()
+
+            report['scales'][scale] = bench_scale(webapp, db_path, user_id, args.repeat)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    scales = args.scales
+    print(f"\n{'p50 ms':<28}" + ''.join(f"{scale:>14,}" for scale in scales))
+    for name, _ in read_routes():
+        row = ''.join(f"{report['scales'][scale][name]['latency']['p50_ms']:>14.2f}" for scale in scales)
+        print(f"{name:<28}{row}")
+
+    largest = report['scales'][scales[-1]]
+    print(f"\nPlans d'exécution au volume {scales[-1]:,}:")
+    for name, result in largest.items():
+        # Les graphiques exécutent la même requête par mois/jour : un plan distinct suffit
+        plans = {}
+        for query in result['queries']:
+            plans.setdefault(tuple(query['plan']), []).append(query['sql'])
+        for plan, statements in plans.items():
+            print(f"  [{name}] x{len(statements)} {statements[0][:100]}")
+            for step in plan:
+                print(f"      {step}")
+
+    write_json(args.report, report)
+
+if __name__ == '__main__':
+    main()
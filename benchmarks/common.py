@@ -0,0 +1,60 @@
+"""
+Fonctions partagées par les benchmarks : percentiles, résumés de latence, images de test
+"""
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def percentile(samples, q):
+    """Percentile q (0-100) d'une liste de mesures, 0.0 si vide"""
+    if not samples:
+        return 0.0
+    return float(np.percentile(np.asarray(samples, dtype=np.float64), q))
+
+def latency_summary(samples_s):
+    """Résumer des latences en secondes : percentiles en ms et débit en requêtes/s"""
+    total = sum(samples_s)
+    return {
+        'count': len(samples_s),
+        'mean_ms': round(1000 * total / len(samples_s), 3) if samples_s else 0.0,
+        'p50_ms': round(1000 * percentile(samples_s, 50), 3),
+        'p95_ms': round(1000 * percentile(samples_s, 95), 3),
+        'p99_ms': round(1000 * percentile(samples_s, 99), 3),
+        'max_ms': round(1000 * max(samples_s), 3) if samples_s else 0.0,
+        'throughput_per_s': round(len(samples_s) / total, 3) if total else 0.0
+    }
+
+def list_images(folder):
+    """Lister les images d'un dossier, triées pour des exécutions reproductibles"""
+    paths = []
+    for pattern in ('*' + ext for ext in IMAGE_EXTENSIONS):
+        paths.extend(glob.glob(os.path.join(folder, pattern)))
+    return sorted(set(paths))
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant en Mo"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Octets sous macOS, kilo-octets sous Linux
+        return round(peak / 1e6 if sys.platform == 'darwin' else peak / 1024, 1)
+    except ImportError:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / 1e6, 1)
+
+def write_json(path, data):
+    """Écrire un rapport JSON lisible"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"📝 Rapport écrit: {path}")
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,164 @@
+"""
+Test de charge HTTP de l'API Flask sur une base temporaire pré-remplie
+
+    python -m benchmarks.load_test --clients 16 --duration 60
+
+Tout tourne sur la machine locale : la base est créée dans un dossier temporaire,
+l'application est servie par werkzeug dans un thread et les clients virtuels se
+connectent via /api/login avant de rejouer un mélange de requêtes réaliste.
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import latency_summary, write_json
+
+# Types proposés dans les filtres du tableau de bord
+WASTE_TYPES = ['all', 'Plastique', 'Papier', 'Carton', 'Métal', 'Verre']
+
+def request_mix(rng, user_id):
+    """Choisir la prochaine requête d'un client virtuel"""
+    now = datetime.now()
+    mix = [
+        (10, 'stats_total', 'GET', '/api/stats/total', None),
+        (6, 'stats_last_month', 'GET', '/api/stats/last-month', None),
+        (6, 'stats_monthly_distribution', 'GET',
+         f"/api/stats/monthly-distribution?year={now.year}&month={rng.randint(1, 12):02d}", None),
+        (8, 'chart_monthly', 'GET',
+         f"/api/chart/monthly?year={now.year}&waste_type={rng.choice(WASTE_TYPES)}", None),
+        (8, 'chart_weekly', 'GET',
+         f"/api/chart/weekly?week_offset={rng.randint(0, 8)}&waste_type={rng.choice(WASTE_TYPES)}", None),
+        (14, 'detections_list', 'GET',
+         f"/api/detections/list?page={rng.randint(1, 10)}&waste_type={rng.choice(WASTE_TYPES)}", None),
+        (16, 'detection_record', 'POST', '/api/detection/record',
+         {'user_id': user_id, 'waste_type': rng.choice(WASTE_TYPES[1:]), 'quantity': rng.randint(1, 3)}),
+        (2, 'export_csv', 'GET', f"/api/detections/export/csv?waste_type={rng.choice(WASTE_TYPES)}", None),
+        (8, 'notifications', 'GET', '/api/notifications', None),
+        (10, 'user_info', 'GET', '/api/user/info', None),
+        (4, 'robot_stats', 'GET', '/api/robot/stats', None)
+    ]
+    weights = [entry[0] for entry in mix]
+    return rng.choices(mix, weights=weights)[0][1:]
+
+# ==================== CLIENTS VIRTUELS ====================
+
+class Recorder:
+    """Collecte thread-safe des latences et erreurs par route"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, name, elapsed, ok):
+        with self.lock:
+            self.samples.setdefault(name, []).append(elapsed)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+def virtual_client(base_url, email, password, user_id, deadline, recorder, seed):
+    import requests
+
+    rng = random.Random(seed)
+    http = requests.Session()
+
+    started = time.perf_counter()
+    resp = http.post(f"{base_url}/api/login", json={'email': email, 'password': password})
+    recorder.record('login', time.perf_counter() - started, resp.status_code == 200)
+    if resp.status_code != 200:
+        return
+
+    while time.monotonic() < deadline:
+        name, method, path, body = request_mix(rng, user_id)
+        started = time.perf_counter()
+        try:
+            resp = http.request(method, base_url + path, json=body)
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            ok = False
+        recorder.record(name, time.perf_counter() - started, ok)
+
+# ==================== MAIN ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge de l'API Flask WasteAI")
+    parser.add_argument('--clients', type=int, default=8, help="Clients virtuels concurrents")
+    parser.add_argument('--users', type=int, default=20, help="Utilisateurs synthétiques en base")
+    parser.add_argument('--detections', type=int, default=2000, help="Détections par utilisateur")
+    parser.add_argument('--duration', type=float, default=30, help="Durée du test en secondes")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--report', help="Chemin d'un rapport JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='wasteai-load-')
+    db_path = os.path.join(workdir, 'waste.db')
+    # A positionner avant l'import de l'application
+    os.environ['WASTEAI_DB_PATH'] = db_path
+
+    try:
+        from werkzeug.serving import make_server
+        from benchmarks.seed import seed_database, SEED_PASSWORD
+        import app as webapp
+
+        users = seed_database(db_path, args.users, args.detections, seed=args.seed)
+
+        # Les logs d'accès de werkzeug coûteraient plus cher que certaines routes
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, webapp.app, threaded=True)
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"🚀 Application servie sur {base_url} ({args.clients} clients, {args.duration}s)")
+
+        recorder = Recorder()
+        deadline = time.monotonic() + args.duration
+        started = time.monotonic()
+        clients = []
+        for i in range(args.clients):
+            user_id, email = users[i % len(users)]
+            thread = threading.Thread(target=virtual_client,
+                                      args=(base_url, email, SEED_PASSWORD, user_id, deadline,
+                                            recorder, args.seed + i))
+            thread.start()
+            clients.append(thread)
+        for thread in clients:
+            thread.join()
+        elapsed = time.monotonic() - started
+        server.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    routes = {}
+    print(f"\n{'Route':<28} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in sorted(recorder.samples):
+        summary = latency_summary(recorder.samples[name])
+        summary['errors'] = recorder.errors.get(name, 0)
+        summary['requests_per_s'] = round(summary['count'] / elapsed, 2)
+        routes[name] = summary
+        print(f"{name:<28} {summary['count']:>7} {summary['errors']:>5} {summary['requests_per_s']:>8.1f} "
+              f"{summary['p50_ms']:>8.1f} {summary['p95_ms']:>8.1f} {summary['p99_ms']:>8.1f}")
+
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    overall = latency_summary(all_samples)
+    overall['errors'] = sum(recorder.errors.values())
+    overall['requests_per_s'] = round(len(all_samples) / elapsed, 2)
+    print(f"{'TOTAL':<28} {overall['count']:>7} {overall['errors']:>5} {overall['requests_per_s']:>8.1f} "
+          f"{overall['p50_ms']:>8.1f} {overall['p95_ms']:>8.1f} {overall['p99_ms']:>8.1f}")
+
+    if args.report:
+        write_json(args.report, {
+            'clients': args.clients,
+            'users': args.users,
+            'detections_per_user': args.detections,
+            'duration_s': round(elapsed, 2),
+            'overall': overall,
+            'routes': routes
+        })
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Génération de bases SQLite synthétiques (utilisateurs, détections, notifications)
+
+    python -m benchmarks.seed --db scratch.db --users 1000 --detections 10000
+
+Les détections suivent une répartition réaliste des types de déchets, un volume croissant
+vers les dates récentes et un profil horaire d'équipes de jour. La génération est
+vectorisée avec NumPy et insérée par lots : 10 millions de lignes restent abordables.
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from yolo_detector import WASTE_CLASSES
+
+SEED_PASSWORD = 'loadtest-password'
+BATCH_ROWS = 200000
+
+# Répartition observée sur le tapis : beaucoup de plastique et de papier, peu de verre
+WASTE_WEIGHTS = {
+    'Plastique': 0.38,
+    'Papier': 0.24,
+    'Carton': 0.18,
+    'Métal': 0.12,
+    'Verre': 0.08
+}
+
+# Activité horaire (équipes de jour, creux à midi, quasi rien la nuit)
+HOUR_WEIGHTS = [0.2, 0.1, 0.1, 0.1, 0.2, 0.5, 2, 4, 6, 6, 6, 5, 3, 5, 6, 6, 5, 4, 2, 1, 0.5, 0.4, 0.3, 0.2]
+
+def user_email(index):
+    return f"user{index:05d}@wasteai.test"
+
+def generate_detections(rng, user_ids, count, now, days):
+    """Générer count détections : (user_id, waste_type, quantity, detection_date)"""
+    waste_types = np.array(list(WASTE_WEIGHTS))
+    weights = np.array(list(WASTE_WEIGHTS.values()))
+    hours = np.array(HOUR_WEIGHTS) / sum(HOUR_WEIGHTS)
+
+    # Plus de volume récemment : u^1.5 concentre les tirages près de 0 jour
+    day_offsets = (days * rng.random(count) ** 1.5).astype(np.int64)
+    seconds = (rng.choice(24, size=count, p=hours) * 3600
+               + rng.integers(0, 3600, size=count))
+    midnight = np.datetime64(now.date(), 'us')
+    stamps = (midnight - day_offsets.astype('timedelta64[D]')
+              + seconds.astype('timedelta64[s]')
+              + rng.integers(0, 1000000, size=count).astype('timedelta64[us]'))
+    # Même format que str(datetime) utilisé par l'application : "AAAA-MM-JJ HH:MM:SS.ffffff"
+    dates = np.char.replace(np.datetime_as_string(stamps, unit='us'), 'T', ' ')
+
+    return zip(rng.choice(user_ids, size=count).tolist(),
+               waste_types[rng.choice(len(waste_types), size=count, p=weights)].tolist(),
+               rng.integers(1, 6, size=count).tolist(),
+               dates.tolist())
+
+def seed_database(db_path, users=20, detections_per_user=500, days=365, seed=42, quiet=False):
+    """Créer le schéma de l'application puis insérer utilisateurs et détections
+
+    Retourne la liste des (user_id, email) créés ; tous partagent SEED_PASSWORD.
+    """
+    import app
+    app.init_db(db_path)
+    assert set(WASTE_WEIGHTS) == set(WASTE_CLASSES.values())
+
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    # Un seul hachage pour tous : le coût du hachage n'a rien à faire dans le remplissage
+    password_hash = generate_password_hash(SEED_PASSWORD)
+
+    conn = sqlite3.connect(db_path)
+    # Base jetable : pas de journal ni de fsync pendant le chargement
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    c = conn.cursor()
+
+    created = []
+    for index in range(users):
+        email = user_email(index)
+        c.execute('INSERT INTO users (email, password, role, created_at, username) VALUES (?, ?, ?, ?, ?)',
+                  (email, password_hash, 'admin' if index == 0 else 'user',
+                   now - timedelta(days=days), f"user{index}"))
+        created.append((c.lastrowid, email))
+    c.executemany('INSERT INTO notifications (user_id, message, type) VALUES (?, ?, ?)',
+                  [(user_id, 'Bienvenue sur WasteAI', 'info') for user_id, _ in created])
+
+    user_ids = np.array([user_id for user_id, _ in created])
+    remaining = users * detections_per_user
+    inserted = 0
+    while remaining > 0:
+        batch = min(BATCH_ROWS, remaining)
+        c.executemany('''INSERT INTO waste_detection (user_id, waste_type, quantity, detection_date)
+                         VALUES (?, ?, ?, ?)''', generate_detections(rng, user_ids, batch, now, days))
+        conn.commit()
+        remaining -= batch
+        inserted += batch
+        if not quiet:
+            print(f"   {inserted:,} détections insérées", end='\r')
+
+    conn.commit()
+    conn.close()
+    if not quiet:
+        print(f"🌱 {users} utilisateur(s) x {detections_per_user} détection(s) dans {db_path}")
+    return created
+
+def main():
+    parser = argparse.ArgumentParser(description="Générer une base WasteAI synthétique")
+    parser.add_argument('--db', required=True, help="Fichier SQLite à créer (écrasé s'il existe)")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--detections', type=int, default=1000, help="Détections par utilisateur")
+    parser.add_argument('--days', type=int, default=730, help="Profondeur d'historique en jours")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.abspath(args.db) == os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'waste.db')):
+        raise SystemExit("❌ Refus d'écraser la base de production waste.db")
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    # L'import de l'application initialise la base pointée par WASTEAI_DB_PATH
+    os.environ.setdefault('WASTEAI_DB_PATH', os.path.abspath(args.db))
+    seed_database(args.db, args.users, args.detections, args.days, args.seed)
+
+if __name__ == '__main__':
+    main()
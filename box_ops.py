@@ -0,0 +1,58 @@
+"""
+Opérations vectorisées sur des boîtes xyxy NumPy (IoU, NMS inter-tuiles à mémoire bornée)
+"""
+import numpy as np
+
+# Boîtes considérées par la NMS (les mieux notées) : borne le temps de calcul quand un
+# seuil de confiance bas multiplie les candidates
+NMS_MAX_CANDIDATES = 5000
+
+def box_area(boxes):
+    return np.prod(np.clip(boxes[:, 2:] - boxes[:, :2], 0, None), axis=1)
+
+def box_intersection(a, b):
+    """Aires d'intersection entre deux ensembles de boîtes (N x M)"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    return np.prod(np.clip(br - tl, 0, None), axis=2)
+
+def box_iou(a, b):
+    """IoU entre deux ensembles de boîtes xyxy (N x M)"""
+    inter = box_intersection(a, b)
+    return inter / (box_area(a)[:, None] + box_area(b)[None, :] - inter + 1e-9)
+
+def box_ios(a, b):
+    """Intersection sur la plus petite des deux aires (N x M)
+
+    Une boîte coupée au bord d'une tuile est presque incluse dans la boîte complète vue
+    par la tuile voisine : son IoU est faible mais son IoS proche de 1.
+    """
+    inter = box_intersection(a, b)
+    return inter / (np.minimum(box_area(a)[:, None], box_area(b)[None, :]) + 1e-9)
+
+def nms(boxes, scores, classes, threshold=0.5, metric='iou', max_candidates=NMS_MAX_CANDIDATES):
+    """NMS par classe, retourne les indices conservés par score décroissant
+
+    Seules les `max_candidates` boîtes les mieux notées sont considérées. NMS gloutonne :
+    la meilleure boîte restante d'une classe est conservée, puis seule sa ligne de
+    recouvrement avec les candidates de sa classe est calculée. La mémoire reste
+    linéaire, même avec des dizaines de milliers de boîtes (seuil bas, grande image en tuiles).
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    overlap = box_ios if metric == 'ios' else box_iou
+    order = np.argsort(-scores, kind='stable')[:max_candidates]
+    keep = []
+    for cls in np.unique(classes[order]):
+        # Deux classes différentes ne se suppriment jamais
+        candidates = order[classes[order] == cls]
+        while len(candidates):
+            best, candidates = candidates[0], candidates[1:]
+            keep.append(best)
+            if len(candidates):
+                # Supprimer les boîtes moins bien classées qui recouvrent la boîte conservée
+                candidates = candidates[overlap(boxes[best:best + 1], boxes[candidates])[0] <= threshold]
+    keep = np.array(keep, dtype=np.int64)
+    rank = np.empty(len(boxes), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return keep[np.argsort(rank[keep])]
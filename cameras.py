@@ -0,0 +1,352 @@
+"""
+Registre des sources caméra : un thread de capture/inférence par source
+
+Chaque source (index de périphérique, fichier vidéo, flux RTSP/HTTP local) a son propre
+worker, son buffer de détections, sa cadence d'enregistrement, ses mesures par étape et
+son contrôleur de budget de latence. Le worker publie la dernière frame annotée ; les
+requêtes /video_feed/<source> ne font que la relayer, quel que soit le nombre de clients.
+
+Configuration JSON (WASTEAI_CAMERA_SOURCES, défaut cameras.json) :
+
+    {
+        "0": {"uri": 0},
+        "tapis-2": {"uri": "rtsp://127.0.0.1:8554/tapis2", "save_interval": 30},
+        "demo": {"uri": "videos/tapis.mp4", "loop": true, "user_id": 1,
+                 "options": {"classes": "Plastique,Métal", "conf": 0.4}}
+    }
+
+`options` (conf, iou, classes, imgsz, max_det) suit parse_inference_options ; le
+contrôleur de latence peut seulement réduire imgsz et max_det sous ces valeurs.
+
+Sans fichier, une seule source "0" (première webcam) est déclarée. Les ROI (roi.py) sont
+associées aux sources par leur nom. Les objets sont suivis d'une frame à l'autre
+(tracker.py) : le buffer ne reçoit que les nouveaux objets, pas une unité par frame.
+"""
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from frame_perf import FrameTimingRing, draw_overlay
+from latency_budget import LatencyBudgetController
+from roi import load_rois
+from thread_budget import pin_current_thread
+from tracker import IoUTracker
+from yolo_detector import DEFAULT_OPTIONS, WASTE_CLASSES, parse_inference_options
+
+SOURCES_CONFIG_PATH = os.environ.get('WASTEAI_CAMERA_SOURCES',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cameras.json'))
+DEFAULT_SOURCES = {'0': {'uri': 0}}
+SAVE_INTERVAL = 10  # Sauvegarder toutes les 10 frames
+# Seuil d'inférence des flux suivis : les détections faibles prolongent les pistes existantes
+TRACK_LOW_THRESHOLD = 0.1
+
+def _parse_uri(uri):
+    """Index de périphérique ("0", 0) ou chemin/URL passé tel quel à OpenCV"""
+    if isinstance(uri, int):
+        return uri
+    return int(uri) if str(uri).isdigit() else str(uri)
+
+def _error_frame(message="ERREUR CAMERA"):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(frame, message, (50, 240), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    return frame
+
+def _multipart(jpeg):
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+
+class CameraSource:
+    def __init__(self, name, uri, get_detector, roi=None, save_interval=SAVE_INTERVAL,
+                 loop=False, user_id=None, ladder=None, options=DEFAULT_OPTIONS, cpus=None):
+        self.name = name
+        self.uri = _parse_uri(uri)
+        self.get_detector = get_detector
+        self.roi = roi
+        self.save_interval = save_interval
+        self.loop = loop
+        # Propriétaire des détections : fixé par la configuration ou par l'utilisateur qui démarre
+        self.default_user_id = user_id
+        self.user_id = user_id
+        self.perf = FrameTimingRing(capacity=512)
+        self.budget = LatencyBudgetController(ladder=ladder)
+        self.default_options = options
+        self.options = options
+        self.tracker = IoUTracker(high_threshold=options.conf, low_threshold=TRACK_LOW_THRESHOLD)
+        self.items_counted = 0
+        self.error = None
+        # Cœurs réservés aux workers caméra (thread_budget), None = pas d'affinité : capture,
+        # suivi et encodage ; l'inférence passe sur les cœurs du détecteur (inference_cpus)
+        self.cpus = cpus
+
+        # État du worker : seul son thread le modifie pendant qu'il tourne
+        self.detection_buffer = {}
+        self.frame_count = 0
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # Dernière frame publiée (annotée, JPEG) et numéro de séquence pour les lecteurs
+        self._published = threading.Condition()
+        self._frame = None
+        self._jpeg = None
+        self._timings = {}
+        self._seq = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, user_id=None, options=None):
+        """Démarrer le worker (sans effet s'il tourne déjà)
+
+        `options` (InferenceOptions) remplace celles de la configuration pour cette session.
+        """
+        with self._lock:
+            if self.running:
+                return
+            self.user_id = self.default_user_id or user_id
+            self.options = options or self.default_options
+            # Le seuil demandé est celui du comptage ; l'inférence descend à TRACK_LOW_THRESHOLD
+            self.tracker.high_threshold = self.options.conf
+            # Le buffer n'est pas remis à zéro ici : le worker précédent l'a vidé en base en
+            # sortant, et ce qui n'a pas pu être enregistré est retenté au prochain vidage
+            self.frame_count = 0
+            self.tracker.reset()
+            self.error = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f'camera-{self.name}', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Arrêter le worker ; il enregistre lui-même ses détections restantes en sortant"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._stop.set()
+        # Attente hors verrou : le worker le prend pour son dernier vidage
+        thread.join(timeout=5)
+        with self._lock:
+            if thread.is_alive():
+                # Inférence lente en cours : le worker s'arrêtera et videra son buffer à la
+                # fin de la frame ; start() reste sans effet d'ici là
+                print(f"⚠️ [{self.name}] Worker encore actif, arrêt différé")
+            elif self._thread is thread:
+                self._thread = None
+        with self._published:
+            self._published.notify_all()
+
+    def flush(self):
+        """Enregistrer le buffer de détections au nom du propriétaire de la source
+
+        Appelé par le thread du worker uniquement. Le buffer n'est vidé qu'une fois enregistré :
+        après une erreur, il est retenté au vidage suivant.
+        """
+        if not self.detection_buffer:
+            return
+        detector = self.get_detector()
+        if not self.user_id:
+            # Source sans propriétaire : rien à enregistrer
+            self.detection_buffer = {}
+            return
+        if not detector:
+            return
+        try:
+            detector.save_detections_to_db(self.user_id, self.detection_buffer)
+            print(f"✅ [{self.name}] Détections sauvegardées: {self.detection_buffer}")
+            self.detection_buffer = {}
+        except Exception as e:
+            print(f"❌ [{self.name}] Erreur sauvegarde détections: {e}")
+
+    # ---------- Worker ----------
+
+    def _open(self):
+        capture = cv2.VideoCapture(self.uri)
+        if not capture.isOpened():
+            print(f"❌ [{self.name}] Source non accessible: {self.uri}")
+        else:
+            print(f"📸 [{self.name}] Flux caméra démarré ({self.uri})")
+        return capture
+
+    def _run(self):
+        pin_current_thread(self.cpus)
+        capture = self._open()
+        # Un fichier vidéo est lu à sa cadence nominale, pas aussi vite que possible
+        is_file = isinstance(self.uri, str) and os.path.isfile(self.uri)
+        period = 1 / (capture.get(cv2.CAP_PROP_FPS) or 25) if is_file else 0
+        frame_index = 0
+        # Détections de la dernière frame inférée, redessinées sur les frames sautées
+        last_detections = None
+        try:
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                success, frame = capture.read()
+                if not success and self.loop and is_file:
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    success, frame = capture.read()
+                timings = {'capture': time.perf_counter() - started}
+                if not success:
+                    print(f"❌ [{self.name}] Echec lecture frame caméra")
+                    metrics.FRAMES_DROPPED.inc(self.name, 'read_error')
+                    self.error = 'read_error'
+                    self._publish(_error_frame(), timings, record=False)
+                    break
+
+                last_detections = self._process(frame, frame_index, last_detections, timings)
+                frame_index += 1
+                self._publish(frame, timings)
+
+                if period:
+                    self._stop.wait(max(0.0, period - (time.perf_counter() - started)))
+        finally:
+            capture.release()
+            # Arrêt, erreur de lecture ou fin de fichier : les objets comptés sont enregistrés
+            # avant qu'un start() ne réutilise la source
+            with self._lock:
+                self.flush()
+                self.frame_count = 0
+
+    def _process(self, frame, frame_index, last_detections, timings):
+        """Inférence (une frame sur `stride`), suivi, dessin et comptage des nouveaux objets"""
+        detector = self.get_detector()
+        if detector:
+            inferred = self.budget.should_infer(frame_index)
+            if inferred:
+                point = self.budget.point
+                started = time.perf_counter()
+                try:
+                    options = self.options._replace(
+                        conf=min(TRACK_LOW_THRESHOLD, self.options.conf),
+                        imgsz=min(point.imgsz, self.options.imgsz or point.imgsz),
+                        max_det=min(point.max_det, self.options.max_det))
+                    boxes, scores, classes = detector.infer_frame(frame, self.roi, options)
+                    timings['inference'] = time.perf_counter() - started
+                    self.budget.observe(timings['inference'])
+                    
+                    track_ids, counted = self.tracker.update(boxes, scores, classes)
+                    # Détections faibles non rattachées à une piste : ni dessinées ni comptées
+                    tracked = track_ids >= 0
+                    last_detections = (boxes[tracked], scores[tracked], classes[tracked], track_ids[tracked])
+                    
+                    # Seules les pistes confirmées à cette frame entrent dans le buffer
+                    for cls in counted:
+                        waste_type = WASTE_CLASSES.get(cls, f'Déchet_{cls}')
+                        self.detection_buffer[waste_type] = self.detection_buffer.get(waste_type, 0) + 1
+                    self.items_counted += len(counted)
+                except Exception as e:
+                    print(f"❌ [{self.name}] Erreur détection frame: {e}")
+                    last_detections = None
+                    timings['inference'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if self.roi is not None:
+                self.roi.draw(frame)
+            if last_detections is not None:
+                detector.draw_detections(frame, *last_detections)
+            timings['draw'] = time.perf_counter() - started
+
+        # Sauvegarder toutes les save_interval frames, seulement si de nouveaux objets sont apparus
+        self.frame_count += 1
+        if self.frame_count >= self.save_interval and self.detection_buffer:
+            self.flush()
+            self.frame_count = 0
+        return last_detections
+
+    def _publish(self, frame, timings, record=True):
+        started = time.perf_counter()
+        ret, buffer = cv2.imencode('.jpg', frame)
+        timings['encode'] = time.perf_counter() - started
+        if not ret:
+            metrics.FRAMES_DROPPED.inc(self.name, 'encode_error')
+            return
+        if record:
+            self.perf.record(timings)
+            metrics.FRAMES_PROCESSED.inc(self.name)
+        with self._published:
+            self._frame = frame
+            self._jpeg = buffer.tobytes()
+            self._timings = timings
+            self._seq += 1
+            self._published.notify_all()
+
+    # ---------- Lecteurs ----------
+
+    def frames(self, overlay=False):
+        """Flux multipart des frames publiées, jusqu'à l'arrêt de la source"""
+        seq = 0
+        while True:
+            with self._published:
+                self._published.wait_for(lambda: self._seq != seq or not self.running, timeout=5)
+                if self._seq == seq:
+                    if not self.running:
+                        return
+                    continue
+                seq, frame, jpeg, timings = self._seq, self._frame, self._jpeg, self._timings
+            if overlay:
+                # Incrustation propre à ce lecteur : sur une copie, réencodée
+                frame = draw_overlay(frame.copy(), self.perf, timings)
+                ret, buffer = cv2.imencode('.jpg', frame)
+                if not ret:
+                    continue
+                jpeg = buffer.tobytes()
+            yield _multipart(jpeg)
+
+    def status(self):
+        return {
+            'name': self.name,
+            'uri': str(self.uri),
+            'running': self.running,
+            'error': self.error,
+            'roi': self.roi is not None,
+            'save_interval': self.save_interval,
+            'options': self.options._asdict(),
+            'buffered': dict(self.detection_buffer),
+            'active_tracks': len(self.tracker),
+            'items_counted': self.items_counted,
+            'budget': self.budget.status()
+        }
+
+class CameraRegistry:
+    def __init__(self, sources):
+        self.sources = sources
+        self.default = next(iter(sources))
+
+    @classmethod
+    def from_config(cls, get_detector, path=SOURCES_CONFIG_PATH, rois=None, ladder=None, cpus=None):
+        config = DEFAULT_SOURCES
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    config = json.load(f) or DEFAULT_SOURCES
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Sources caméra par défaut ({path}): {e}")
+        rois = load_rois() if rois is None else rois
+        sources = {}
+        for name, entry in config.items():
+            name = str(name)
+            try:
+                options = parse_inference_options(entry.get('options', {}))
+            except ValueError as e:
+                print(f"⚠️ [{name}] Options d'inférence ignorées: {e}")
+                options = DEFAULT_OPTIONS
+            sources[name] = CameraSource(name, entry['uri'], get_detector, roi=rois.get(name),
+                                         save_interval=entry.get('save_interval', SAVE_INTERVAL),
+                                         loop=entry.get('loop', False), user_id=entry.get('user_id'),
+                                         options=options,
+                                         ladder=ladder, cpus=cpus)
+        return cls(sources)
+
+    def get(self, name=None):
+        """Source par nom (défaut : la première déclarée), None si inconnue"""
+        return self.sources.get(self.default if name is None else str(name))
+
+    def status(self):
+        return [source.status() for source in self.sources.values()]
+
+    def stop_all(self):
+        for source in self.sources.values():
+            source.stop()
@@ -0,0 +1,74 @@
+"""
+Chronométrage par étape des frames caméra (capture, inférence, dessin, encodage JPEG)
+
+Les mesures vont dans un tampon circulaire NumPy préalloué. Il n'y a qu'un écrivain par
+flux (la boucle de frames) : il écrit la ligne puis publie le compteur, sans verrou. Les
+lecteurs copient les lignes publiées ; au pire la plus ancienne ligne d'une fenêtre pleine
+est en cours de réécriture, ce qui est sans effet sur des percentiles.
+"""
+import time
+
+import cv2
+import numpy as np
+
+STAGES = ('capture', 'inference', 'draw', 'encode')
+
+class FrameTimingRing:
+    def __init__(self, capacity=512, stages=STAGES):
+        self.capacity = capacity
+        self.stages = tuple(stages)
+        # Colonne 0 : horodatage monotone de fin de frame, puis une colonne par étape (s)
+        self._data = np.zeros((capacity, len(self.stages) + 1), dtype=np.float64)
+        self._count = 0
+
+    def record(self, timings, timestamp=None):
+        """Enregistrer les durées d'une frame (dict étape -> secondes)"""
+        row = self._data[self._count % self.capacity]
+        row[0] = time.monotonic() if timestamp is None else timestamp
+        for column, stage in enumerate(self.stages, start=1):
+            row[column] = timings.get(stage, 0.0)
+        # Publication après écriture de la ligne
+        self._count += 1
+
+    def snapshot(self, window=None):
+        """Copie des `window` dernières frames, de la plus ancienne à la plus récente"""
+        count = self._count
+        size = min(count, self.capacity, window or self.capacity)
+        indexes = np.arange(count - size, count) % self.capacity
+        return self._data[indexes].copy()
+
+    def summary(self, window=None):
+        """FPS glissant et percentiles p50/p99 par étape, en millisecondes"""
+        rows = self.snapshot(window)
+        frames = len(rows)
+        elapsed = float(rows[-1, 0] - rows[0, 0]) if frames > 1 else 0.0
+        stages = {}
+        for column, stage in enumerate(self.stages, start=1):
+            values = rows[:, column] * 1000 if frames else np.zeros(1)
+            stages[stage] = {
+                'p50_ms': round(float(np.percentile(values, 50)), 2),
+                'p99_ms': round(float(np.percentile(values, 99)), 2)
+            }
+        totals = rows[:, 1:].sum(axis=1) * 1000 if frames else np.zeros(1)
+        return {
+            'frames': frames,
+            'total_frames': self._count,
+            'fps': round((frames - 1) / elapsed, 2) if elapsed > 0 else 0.0,
+            'stages': stages,
+            'total': {
+                'p50_ms': round(float(np.percentile(totals, 50)), 2),
+                'p99_ms': round(float(np.percentile(totals, 99)), 2)
+            }
+        }
+
+def draw_overlay(frame, ring, timings):
+    """Incruster le FPS et les durées de la frame courante (mode debug)"""
+    summary = ring.summary(window=60)
+    lines = [f"FPS {summary['fps']:.1f}"]
+    lines += [f"{stage} {timings.get(stage, 0.0) * 1000:.1f} ms" for stage in ring.stages]
+    height = frame.shape[0]
+    for i, text in enumerate(reversed(lines)):
+        y = height - 10 - 18 * i
+        cv2.putText(frame, text, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 3)
+        cv2.putText(frame, text, (10, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+    return frame
@@ -0,0 +1,151 @@
+"""
+Compression des réponses et GET conditionnels (ETag faibles, 304)
+
+Deux niveaux de 304 pour les API JSON :
+
+1. Versions de lignes : des triggers SQLite incrémentent un compteur par périmètre à chaque
+   écriture (row_versions : 'detections:<user_id>', 'detections', 'notifications:<user_id>',
+   'users') ; les insertions de détections le font une fois par requête (bump_versions). Une route décorée par HttpCache.versioned() calcule son ETag à partir de ces
+   compteurs, de l'URL et de l'utilisateur, en une lecture de clé primaire : si le client
+   a déjà cette version, le 304 part sans exécuter la route.
+2. Les autres réponses JSON reçoivent un ETag faible calculé sur le corps : la requête est
+   exécutée, mais seuls les en-têtes repartent si rien n'a changé.
+
+Enfin, les réponses textuelles au-delà de COMPRESS_MIN_BYTES sont compressées en brotli
+(si le module est installé) ou gzip selon Accept-Encoding. Les flux (vidéo, relais caméra)
+et les fichiers déjà encodés ne sont pas touchés.
+"""
+import gzip
+import hashlib
+import json
+from datetime import date
+from functools import wraps
+
+from flask import make_response, request, session
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = {'application/json', 'text/html', 'text/css', 'text/javascript',
+                      'application/javascript', 'text/csv', 'text/plain', 'image/svg+xml'}
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip seul
+
+# (table, colonne utilisateur, périmètres) : chaque écriture incrémente ces compteurs
+_VERSIONED_TABLES = (
+    ('waste_detection', 'user_id', ("'detections:' || {row}.user_id", "'detections'")),
+    ('waste_detection_daily', 'user_id', ("'detections:' || {row}.user_id", "'detections'")),
+    ('notifications', 'user_id', ("'notifications:' || {row}.user_id",)),
+    ('users', 'id', ("'users'",)),
+)
+
+# Écritures sans trigger : les insertions de détections arrivent par lots (ingestion, flux
+# caméra, seed), un trigger par ligne y doublait presque le coût d'écriture. Les routes
+# d'ingestion appellent bump_versions() une fois par requête.
+_STATEMENT_BUMPED = {('waste_detection', 'INSERT')}
+
+def detection_scopes(user_id):
+    """Périmètres invalidés par une écriture de détections de `user_id`"""
+    return [f'detections:{user_id}', 'detections']
+
+def bump_versions(c, scopes):
+    """Incrémenter les compteurs `scopes`, dans la transaction de l'écriture"""
+    c.executemany('''INSERT INTO row_versions (scope, version) VALUES (?, 1)
+                     ON CONFLICT (scope) DO UPDATE SET version = version + 1''',
+                  [(scope,) for scope in scopes])
+
+def init_row_versions(c):
+    """Créer row_versions et ses triggers (appelé par init_db, après les tables suivies)"""
+    c.execute('''CREATE TABLE IF NOT EXISTS row_versions
+                 (scope TEXT PRIMARY KEY,
+                  version INTEGER NOT NULL) WITHOUT ROWID''')
+    for table, _, scopes in _VERSIONED_TABLES:
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            if (table, event) in _STATEMENT_BUMPED:
+                c.execute(f'DROP TRIGGER IF EXISTS {table}_version_{event.lower()}')
+                continue
+            bumps = ''.join(
+                f'''INSERT INTO row_versions (scope, version) VALUES ({scope.format(row=row)}, 1)
+                    ON CONFLICT (scope) DO UPDATE SET version = version + 1;'''
+                for scope in scopes
+            )
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                          AFTER {event} ON {table} BEGIN {bumps} END''')
+
+def _etag(*parts):
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+class HttpCache:
+    def __init__(self, app, get_db):
+        self.get_db = get_db
+        app.after_request(self.finalize)
+
+    def versions(self, scopes):
+        conn = self.get_db()
+        c = conn.cursor()
+        c.execute(f'''SELECT scope, version FROM row_versions
+                      WHERE scope IN ({', '.join('?' * len(scopes))})''', scopes)
+        found = dict(c.fetchall())
+        conn.close()
+        return [found.get(scope, 0) for scope in scopes]
+
+    def versioned(self, scopes):
+        """Décorateur de route GET : 304 sans exécuter la route si les versions n'ont pas bougé
+
+        `scopes()` retourne les périmètres dont dépend la réponse. La date du jour fait partie
+        de l'ETag : « aujourd'hui », « mois dernier »... changent à minuit sans écriture.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                names = scopes()
+                etag = _etag(request.path, sorted(request.args.items(multi=True)), session.get('user_id'),
+                             names, self.versions(names), date.today())
+                if request.if_none_match.contains_weak(etag):
+                    response = make_response('', 304)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            return wrapper
+        return decorator
+
+    def finalize(self, response):
+        """Hook after_request : ETag sur le corps des JSON non versionnés, puis compression"""
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        if (request.method == 'GET' and response.status_code == 200
+                and response.mimetype == 'application/json' and 'ETag' not in response.headers):
+            response.set_etag(hashlib.sha1(response.get_data()).hexdigest()[:24], weak=True)
+            response.headers.setdefault('Cache-Control', 'private, no-cache')
+            response.make_conditional(request)
+        return self.compress(response)
+
+    def compress(self, response):
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        accepted = {token.split(';')[0].strip() for token in request.headers.get('Accept-Encoding', '').split(',')}
+        if brotli is not None and 'br' in accepted:
+            encoding, data = 'br', brotli.compress(data, quality=BROTLI_QUALITY)
+        elif 'gzip' in accepted:
+            encoding, data = 'gzip', gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+        else:
+            return response
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        # Un ETag fort désigne des octets précis : il devient faible une fois compressé
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
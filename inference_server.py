@@ -0,0 +1,428 @@
+"""
+Serveur d'inférence YOLO dédié : un seul processus détient le modèle
+
+    python inference_server.py --model my_model.pt --address 127.0.0.1:5050 --threads 4
+    WASTEAI_INFERENCE_SERVER=127.0.0.1:5050 python serve.py --workers 8
+
+Les workers web ne chargent plus torch : ils écrivent leurs frames dans des slots de
+mémoire partagée (multiprocessing.shared_memory) et n'envoient sur le canal IPC qu'un
+petit message (slot, forme, options d'inférence). Les pixels ne sont jamais picklés ; seules les boîtes
+(quelques dizaines d'octets par détection) reviennent par le canal. Le nombre de threads
+d'inférence se règle ici, une seule fois pour toute la machine (défaut : budget calibré
+par thread_budget.py, cœurs d'inférence compris).
+
+Chaque connexion possède son anneau de slots, créé par le serveur et supprimé quand elle
+se ferme. Un thread d'inférence unique regroupe les frames de toutes les connexions en
+micro-lots (--max-batch, --batch-wait).
+
+Le canal (multiprocessing.connection) dépickle ce qu'il reçoit : seul un client qui connaît
+la clé peut s'y connecter. Clé : WASTEAI_INFERENCE_AUTHKEY, sinon une clé aléatoire créée
+par le serveur dans WASTEAI_INFERENCE_KEY_FILE (défaut models/inference.key, lisible par
+son seul propriétaire) et lue par les clients de la même machine. Écouter sur une adresse
+autre que la boucle locale exige une clé explicite.
+"""
+import argparse
+import ipaddress
+import os
+import secrets
+import queue
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+import metrics
+from thread_budget import apply_budget, load_budget, pin_current_thread
+from yolo_detector import IMG_SIZE, MODEL_PATH, WasteDetector, import_yolo
+
+DEFAULT_ADDRESS = '127.0.0.1:5050'
+AUTHKEY_PATH = os.environ.get('WASTEAI_INFERENCE_KEY_FILE',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'inference.key'))
+
+# Un slot contient une frame 1080p BGR ; agrandi à la demande pour les images plus grandes
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+DEFAULT_SLOTS = 4
+
+def parse_address(address):
+    """"hôte:port" -> socket TCP, sinon chemin de socket Unix"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return address
+
+def _release(shm):
+    """Fermer un segment (les vues NumPy encore vivantes empêchent close, pas unlink)"""
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+def is_loopback(address):
+    """Socket Unix ou TCP sur la boucle locale (127.0.0.0/8, ::1, localhost)"""
+    parsed = parse_address(address)
+    if isinstance(parsed, str):
+        return True
+    host = parsed[0].strip('[]')
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def load_authkey(create=False, path=AUTHKEY_PATH):
+    """Clé du canal : WASTEAI_INFERENCE_AUTHKEY, sinon le fichier de clé local
+
+    Le serveur (`create`) génère le fichier s'il n'existe pas ; un client sans clé lève
+    RuntimeError.
+    """
+    explicit = os.environ.get('WASTEAI_INFERENCE_AUTHKEY')
+    if explicit:
+        return explicit.encode()
+    try:
+        with open(path, 'rb') as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    if not create:
+        raise RuntimeError(f"Clé du serveur d'inférence introuvable ({path}) : "
+                           f"démarrer inference_server.py ou définir WASTEAI_INFERENCE_AUTHKEY")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    key = secrets.token_hex(32).encode()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Créée au même instant par un autre serveur
+        return load_authkey(path=path)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    print(f"🔑 Clé du serveur d'inférence créée: {path}")
+    return key
+
+# ==================== SERVEUR ====================
+
+class _Connection:
+    """État d'un client : canal, anneau de slots et verrou d'envoi"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.shm = None
+        self.slots = 0
+        self.slot_bytes = 0
+        self.send_lock = threading.Lock()
+
+    def open_ring(self, slots, slot_bytes):
+        self.close_ring()
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        return self.shm.name
+
+    def close_ring(self):
+        if self.shm is not None:
+            _release(self.shm)
+            self.shm.unlink()
+            self.shm = None
+
+    def frame(self, slot, shape):
+        """Vue sans copie sur la frame écrite par le client dans `slot`
+
+        Lève ValueError si l'anneau est fermé ou si la frame ne tient pas dans son slot.
+        """
+        if self.shm is None:
+            raise ValueError("anneau non ouvert")
+        if not 0 <= slot < self.slots:
+            raise ValueError(f"slot {slot} hors de l'anneau ({self.slots} slots)")
+        if int(np.prod(shape)) > self.slot_bytes:
+            raise ValueError(f"frame {tuple(shape)} plus grande que le slot ({self.slot_bytes} octets)")
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def send(self, message):
+        with self.send_lock:
+            try:
+                self.conn.send(message)
+            except (OSError, EOFError):
+                pass  # Client parti : sa fermeture est traitée par son thread de lecture
+
+class InferenceServer:
+    def __init__(self, detector, address=DEFAULT_ADDRESS, authkey=None,
+                 max_batch=8, batch_wait=0.002):
+        self.detector = detector
+        self.address = address
+        if authkey is None and not os.environ.get('WASTEAI_INFERENCE_AUTHKEY') and not is_loopback(address):
+            raise ValueError(f"Écoute sur {address} (hors boucle locale) : "
+                             f"définir WASTEAI_INFERENCE_AUTHKEY, partagée avec les workers web")
+        self.authkey = authkey or load_authkey(create=True)
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        # Requêtes ('detect', connexion, slot, forme, options) et fermetures ('close', connexion) :
+        # une seule file, donc un anneau n'est libéré qu'après ses dernières frames
+        self._jobs = queue.Queue()
+        self._listener = None
+
+    def serve_forever(self):
+        self._listener = Listener(parse_address(self.address), backlog=64, authkey=self.authkey)
+        threading.Thread(target=self._inference_loop, name='inference', daemon=True).start()
+        print(f"🚀 Serveur d'inférence à l'écoute sur {self.address}")
+        try:
+            while True:
+                try:
+                    conn = self._listener.accept()
+                except Exception as e:
+                    # Client non authentifié ou déconnecté pendant la poignée de main
+                    print(f"⚠️ Connexion refusée: {e}")
+                    continue
+                threading.Thread(target=self._read_loop, args=(_Connection(conn),),
+                                 name='inference-conn', daemon=True).start()
+        finally:
+            self._listener.close()
+
+    def _read_loop(self, client):
+        """Lire les messages d'un client jusqu'à sa déconnexion"""
+        try:
+            while True:
+                message = client.conn.recv()
+                kind = message[0]
+                if kind == 'detect':
+                    _, slot, shape, options = message
+                    self._jobs.put(('detect', client, slot, shape, options))
+                elif kind == 'open':
+                    # Le client n'ouvre (ou agrandit) son anneau qu'une fois ses frames rendues
+                    _, slots, slot_bytes = message
+                    name = client.open_ring(slots, slot_bytes)
+                    client.send(('opened', name, slots, slot_bytes))
+                elif kind == 'close':
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            self._jobs.put(('close', client))
+
+    def _next_batch(self):
+        """Attendre une requête puis regrouper celles qui arrivent dans la fenêtre batch_wait"""
+        batch = [self._jobs.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._jobs.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _inference_loop(self):
+        # Seul thread d'inférence : s'il mourait, tous les workers attendraient recv() à jamais
+        while True:
+            try:
+                self._process(self._next_batch())
+            except Exception as e:
+                print(f"⚠️ Lot d'inférence abandonné: {e}")
+
+    def _process(self, batch):
+        groups = {}
+        closing = []
+        for job in batch:
+            if job[0] == 'close':
+                closing.append(job[1])
+            else:
+                # Un appel modèle par jeu d'options (InferenceOptions est hashable)
+                try:
+                    groups.setdefault(job[4], []).append(job)
+                except TypeError as e:
+                    job[1].send(('error', job[2], f"options invalides: {e}"))
+
+        for options, jobs in groups.items():
+            self._run(jobs, options)
+
+        for client in closing:
+            try:
+                client.close_ring()
+                client.conn.close()
+            except Exception as e:
+                print(f"⚠️ Fermeture d'un client d'inférence: {e}")
+
+    def _run(self, jobs, options):
+        # Une requête invalide (forme démesurée, anneau fermé) n'est refusée qu'à son client
+        valid, images = [], []
+        for job in jobs:
+            _, client, slot, shape, _ = job
+            try:
+                images.append(client.frame(slot, shape))
+                valid.append(job)
+            except Exception as e:
+                client.send(('error', slot, f"frame invalide: {e}"))
+        if not valid:
+            return
+        try:
+            results = self.detector._infer(images, options, 'server')
+        except Exception as e:
+            for _, client, slot, *_ in valid:
+                client.send(('error', slot, str(e)))
+            return
+        finally:
+            del images
+        for (_, client, slot, *_), (boxes, scores, classes) in zip(valid, results):
+            client.send(('result', slot, boxes, scores, classes))
+
+# ==================== CLIENT ====================
+
+class RemoteInferenceError(RuntimeError):
+    """Inférence refusée ou échouée côté serveur"""
+
+class _Channel:
+    """Connexion d'un thread client au serveur et anneau de slots associé"""
+
+    def __init__(self, address, authkey, slots):
+        self.conn = Client(parse_address(address), authkey=authkey)
+        self.slots = slots
+        self.shm = None
+        self.slot_bytes = 0
+
+    def ensure_capacity(self, nbytes):
+        if self.shm is not None and nbytes <= self.slot_bytes:
+            return
+        slot_bytes = max(nbytes, self.slot_bytes, DEFAULT_SLOT_BYTES)
+        self.conn.send(('open', self.slots, slot_bytes))
+        _, name, _, slot_bytes = self.conn.recv()
+        if self.shm is not None:
+            _release(self.shm)
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Le segment appartient au serveur : sans cela le resource_tracker de ce processus
+        # le supprimerait (avec un avertissement) à sa sortie
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+        self.slot_bytes = slot_bytes
+
+    def write(self, slot, image):
+        view = np.ndarray(image.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        view[...] = image
+
+    def close(self):
+        try:
+            self.conn.send(('close',))
+            self.conn.close()
+        except OSError:
+            pass
+        if self.shm is not None:
+            _release(self.shm)
+
+class InferenceClient(WasteDetector):
+    """WasteDetector dont l'inférence est déléguée au serveur d'inférence
+
+    Même interface que WasteDetector (predict, detect_from_frame, ...) : seul _infer change.
+    Chaque thread appelant ouvre sa propre connexion et son propre anneau de slots.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, slots=DEFAULT_SLOTS, authkey=None):
+        self.model_path = address
+        self.imgsz = IMG_SIZE
+        self.address = address
+        self.slots = slots
+        self.authkey = authkey
+        self._local = threading.local()
+        try:
+            self._channel()
+            # Marqueur non nul : les méthodes héritées testent `if not self.model`
+            self.model = f"inference-server://{address}"
+            print(f"✅ Serveur d'inférence joint: {address}")
+        except Exception as e:
+            print(f"❌ Serveur d'inférence injoignable ({address}): {e}")
+            self.model = None
+
+    def _channel(self):
+        channel = getattr(self._local, 'channel', None)
+        if channel is None:
+            # Clé relue à chaque connexion : un serveur démarré après l'application est rejoint
+            authkey = self.authkey or load_authkey()
+            channel = self._local.channel = _Channel(self.address, authkey, self.slots)
+        return channel
+
+    def _infer(self, images, options, method):
+        options = options._replace(imgsz=options.imgsz or self.imgsz)
+        with metrics.INFERENCE_SECONDS.time(method):
+            try:
+                return self._remote_infer(images, options)
+            except RemoteInferenceError:
+                raise  # Erreur signalée par le serveur : le canal est resté synchronisé
+            except Exception:
+                # Serveur redémarré, ou échange interrompu (réponses encore en route dans le
+                # canal) : nouvelle connexion au prochain appel
+                channel = self._local.__dict__.pop('channel', None)
+                if channel is not None:
+                    channel.close()
+                raise
+
+    def _remote_infer(self, images, options):
+        channel = self._channel()
+        images = [np.ascontiguousarray(image, dtype=np.uint8) for image in images]
+        results = [None] * len(images)
+        # Au plus `slots` frames en vol : on attend leurs résultats avant de réutiliser l'anneau
+        for start in range(0, len(images), channel.slots):
+            chunk = images[start:start + channel.slots]
+            channel.ensure_capacity(max(image.nbytes for image in chunk))
+            for slot, image in enumerate(chunk):
+                channel.write(slot, image)
+                channel.conn.send(('detect', slot, image.shape, options))
+            # Toutes les réponses du lot sont lues avant de lever : sinon l'appel suivant
+            # de ce thread recevrait des résultats d'anciennes frames
+            errors = []
+            for _ in chunk:
+                kind, slot, *payload = channel.conn.recv()
+                if kind == 'error':
+                    errors.append(payload[0])
+                else:
+                    results[start + slot] = tuple(payload)
+            if errors:
+                raise RemoteInferenceError(f"Serveur d'inférence: {errors[0]}")
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur d'inférence YOLO partagé par les workers web")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--address', default=DEFAULT_ADDRESS, help="hôte:port ou chemin de socket Unix")
+    parser.add_argument('--threads', type=int, default=None,
+                        help="Threads d'inférence torch/onnxruntime (défaut : budget calibré de l'hôte)")
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--batch-wait', type=float, default=0.002,
+                        help="Attente max (s) pour compléter un micro-lot")
+    args = parser.parse_args()
+
+    if not is_loopback(args.address) and not os.environ.get('WASTEAI_INFERENCE_AUTHKEY'):
+        print(f"❌ Écoute sur {args.address} hors boucle locale : définir WASTEAI_INFERENCE_AUTHKEY "
+              f"(même valeur pour les workers web)")
+        sys.exit(1)
+
+    # Seul endroit où se règle le parallélisme de l'inférence, avant l'import de torch
+    budget = load_budget()
+    if args.threads is not None:
+        budget = budget._replace(inference_threads=args.threads)
+        # --threads explicite : l'emporte aussi sur OMP_NUM_THREADS hérité de l'environnement
+        os.environ['OMP_NUM_THREADS'] = os.environ['MKL_NUM_THREADS'] = str(args.threads)
+    # Processus entier sur les cœurs d'inférence : tous ses threads en héritent
+    pin_current_thread(budget.inference_cpus)
+    apply_budget(budget)
+    if import_yolo() is None:
+        sys.exit(1)
+    apply_budget(budget)
+
+    detector = WasteDetector(args.model)
+    if not detector.model or not detector.warmup():
+        sys.exit(1)
+    # Premier lot à la taille maximale : les noyaux du batching sont prêts avant le trafic
+    dummy = np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+    detector.predict_batch([dummy] * args.max_batch)
+
+    server = InferenceServer(detector, args.address, max_batch=args.max_batch, batch_wait=args.batch_wait)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("👋 Arrêt du serveur d'inférence")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Contrôleur de budget de latence : adapter la résolution et la fréquence d'inférence
+
+Le même réglage fixe (640 px, chaque frame) ne convient ni au serveur 8 cœurs ni au robot
+2 cœurs. Le contrôleur parcourt une échelle de points de fonctionnement, du plus précis
+au plus économe, en comparant la latence d'inférence mesurée au budget par frame :
+
+    coût amorti = latence d'inférence moyenne (EMA) / pas de frames
+
+Il descend d'un cran quand le coût amorti dépasse le budget pendant `degrade_after`
+inférences, et ne remonte qu'après `upgrade_after` inférences nettement sous le budget
+(`upgrade_ratio`). L'écart entre les deux seuils et les deux délais évite d'osciller.
+"""
+import os
+import time
+from collections import namedtuple
+
+from yolo_detector import IMG_SIZE
+
+# Budget par frame affichée (défaut : 15 FPS)
+FRAME_BUDGET_MS = float(os.environ.get('WASTEAI_FRAME_BUDGET_MS', 1000 / 15))
+
+# imgsz : entrée du modèle ; stride : une frame inférée sur `stride` ; max_det : boîtes max
+OperatingPoint = namedtuple('OperatingPoint', ['imgsz', 'stride', 'max_det'])
+
+def build_ladder(max_imgsz=IMG_SIZE, fixed_imgsz=False):
+    """Échelle du plus précis au plus économe
+
+    On réduit d'abord max_det (NMS moins coûteuse), puis la résolution, et en dernier
+    recours la fréquence d'inférence. Un modèle à entrée fixe (export ONNX statique)
+    ne peut que jouer sur le pas et max_det.
+    """
+    sizes = [max_imgsz] if fixed_imgsz else [s for s in (640, 512, 416, 320) if s <= max_imgsz] or [max_imgsz]
+    ladder = [OperatingPoint(sizes[0], 1, 300), OperatingPoint(sizes[0], 1, 100)]
+    ladder += [OperatingPoint(size, 1, 100) for size in sizes[1:]]
+    ladder += [OperatingPoint(sizes[-1], stride, 50) for stride in (2, 3, 4)]
+    return ladder
+
+class LatencyBudgetController:
+    """Un contrôleur par flux caméra : seul son thread de frames appelle observe()"""
+
+    def __init__(self, budget_ms=FRAME_BUDGET_MS, ladder=None, alpha=0.2,
+                 degrade_after=5, upgrade_after=60, upgrade_ratio=0.6):
+        self.budget_s = budget_ms / 1000
+        self.ladder = ladder or build_ladder()
+        self.alpha = alpha
+        self.degrade_after = degrade_after
+        self.upgrade_after = upgrade_after
+        self.upgrade_ratio = upgrade_ratio
+        self.level = 0
+        self.changes = 0
+        self.last_change = None
+        self._reset()
+
+    @property
+    def point(self):
+        return self.ladder[self.level]
+
+    def _reset(self):
+        # Les mesures de l'ancien point ne disent rien du nouveau
+        self.ema_s = None
+        self._over = 0
+        self._under = 0
+
+    def should_infer(self, frame_index):
+        """Inférer cette frame ? (une frame sur `stride`)"""
+        return frame_index % self.point.stride == 0
+
+    def observe(self, inference_s):
+        """Enregistrer la latence d'une inférence, retourne le point de fonctionnement courant"""
+        self.ema_s = inference_s if self.ema_s is None else self.ema_s + self.alpha * (inference_s - self.ema_s)
+        amortized = self.ema_s / self.point.stride
+
+        if amortized > self.budget_s:
+            self._over += 1
+            self._under = 0
+            if self._over >= self.degrade_after and self.level < len(self.ladder) - 1:
+                self._move(+1, amortized)
+        elif amortized < self.budget_s * self.upgrade_ratio:
+            self._under += 1
+            self._over = 0
+            if self._under >= self.upgrade_after and self.level > 0:
+                self._move(-1, amortized)
+        else:
+            self._over = self._under = 0
+        return self.point
+
+    def _move(self, step, amortized):
+        previous = self.point
+        self.level += step
+        self.changes += 1
+        self.last_change = {
+            'at': time.time(),
+            'direction': 'down' if step > 0 else 'up',
+            'from': previous._asdict(),
+            'amortized_ms': round(amortized * 1000, 2)
+        }
+        print(f"⚙️ Budget latence : {previous} -> {self.point} (coût amorti {amortized * 1000:.1f} ms)")
+        self._reset()
+
+    def status(self):
+        """Point de fonctionnement courant et mesures qui l'ont motivé"""
+        return {
+            'operating_point': self.point._asdict(),
+            'level': self.level,
+            'levels': len(self.ladder),
+            'budget_ms': round(self.budget_s * 1000, 2),
+            'inference_ema_ms': round(self.ema_s * 1000, 2) if self.ema_s is not None else None,
+            'amortized_ms': round(self.ema_s * 1000 / self.point.stride, 2) if self.ema_s is not None else None,
+            'changes': self.changes,
+            'last_change': self.last_change
+        }
@@ -0,0 +1,225 @@
+"""
+Métriques d'exécution au format texte Prometheus, sans dépendance externe
+
+Compteurs, jauges et histogrammes à buckets fixes : une observation coûte une recherche
+dichotomique et une prise de verrou, ce qui permet de les laisser actives en production.
+"""
+import bisect
+import sqlite3
+import threading
+import time
+
+# Buckets de latence en secondes (requêtes HTTP, SQL, inférence)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# ==================== TYPES DE MÉTRIQUES ====================
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} attend les labels {self.labelnames}")
+        return tuple(str(v) for v in labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [compteurs par bucket (+Inf en dernier), somme, nombre]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else _format_value(bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+class _Timer:
+    """Gestionnaire de contexte qui observe la durée du bloc dans un histogramme"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+# ==================== REGISTRE ====================
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Exposition texte Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+# ==================== MÉTRIQUES DE L'APPLICATION ====================
+
+HTTP_REQUEST_SECONDS = histogram('wasteai_http_request_seconds',
+                                 "Durée de traitement des requêtes HTTP par endpoint Flask",
+                                 ('endpoint', 'method', 'status'))
+HTTP_IN_FLIGHT = gauge('wasteai_http_requests_in_flight', "Requêtes HTTP en cours de traitement")
+DB_QUERY_SECONDS = histogram('wasteai_db_query_seconds', "Durée des requêtes SQLite", ('operation',))
+INFERENCE_SECONDS = histogram('wasteai_inference_seconds', "Durée d'une inférence YOLO", ('method',))
+FRAMES_PROCESSED = counter('wasteai_camera_frames_processed_total', "Frames caméra traitées et publiées",
+                           ('source',))
+FRAMES_DROPPED = counter('wasteai_camera_frames_dropped_total', "Frames caméra perdues", ('source', 'reason'))
+BUFFER_FLUSHES = counter('wasteai_detection_buffer_flushes_total', "Vidages du buffer de détections en base")
+BUFFER_FLUSH_SIZE = histogram('wasteai_detection_buffer_flush_items', "Déchets écrits par vidage du buffer",
+                              buckets=SIZE_BUCKETS)
+MODEL_READY = gauge('wasteai_model_ready', "1 si le modèle YOLO est chargé et préchauffé")
+MODEL_INFERENCE_SECONDS = histogram('wasteai_model_inference_seconds',
+                                    "Durée d'inférence par modèle du registre et par voie (active, ab, shadow)",
+                                    ('model', 'route'))
+MODEL_DETECTIONS = counter('wasteai_model_detections_total', "Boîtes retournées par modèle et par voie",
+                           ('model', 'route'))
+SHADOW_DROPPED = counter('wasteai_model_shadow_dropped_total', "Inférences fantômes abandonnées (file pleine)")
+PASSWORD_HASH_SECONDS = histogram('wasteai_password_hash_seconds',
+                                  "Durée d'un hachage de mot de passe, attente dans la file comprise",
+                                  ('operation',))
+PASSWORD_HASH_REJECTED = counter('wasteai_password_hash_rejected_total',
+                                 "Hachages refusés (file pleine ou délai dépassé)")
+AUTH_THROTTLED = counter('wasteai_auth_throttled_total', "Tentatives d'authentification limitées", ('scope',))
+
+# ==================== SQLITE ====================
+
+def _operation(sql):
+    word = sql.lstrip().split(None, 1)[0].lower() if sql.strip() else ''
+    return word if word in ('select', 'insert', 'update', 'delete') else 'other'
+
+class TimedCursor(sqlite3.Cursor):
+    """Curseur qui mesure chaque execute/executemany
+
+    Pour un SELECT, execute() couvre la préparation et le calcul de la première ligne :
+    c'est là que SQLite fait l'essentiel du travail des agrégats et des tris.
+    """
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, _operation(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, _operation(sql))
+
+class TimedConnection(sqlite3.Connection):
+    """Connexion dont les curseurs sont instrumentés (à passer en factory de sqlite3.connect)"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
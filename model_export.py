@@ -0,0 +1,291 @@
+"""
+Export ONNX, quantification INT8 et comparaison latence/précision des variantes du modèle
+
+Exemple :
+    python model_export.py --model my_model.pt --calib calibration/ --eval dataset_val/
+
+Le dossier d'évaluation suit le format YOLO : images/*.jpg et labels/<nom>.txt
+(une ligne "classe cx cy w h" normalisée par objet). La variante gagnante se charge
+directement dans WasteDetector via WASTEAI_MODEL_PATH.
+"""
+import argparse
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.common import latency_summary, list_images, write_json
+from box_ops import box_iou
+from yolo_detector import WasteDetector, MODEL_PATH, CONFIDENCE_THRESHOLD, IMG_SIZE
+
+DEFAULT_OUT_DIR = 'models'
+# Export (onnx, onnxslim pour simplify=True) et quantification/inférence (onnxruntime)
+ONNX_PACKAGES = ('onnx', 'onnxslim', 'onnxruntime')
+
+def check_onnx_packages():
+    """Arrêter avant l'export si une dépendance ONNX manque (sinon l'échec survient après le chargement du modèle)"""
+    import importlib.util
+    missing = [name for name in ONNX_PACKAGES if importlib.util.find_spec(name) is None]
+    if missing:
+        raise SystemExit(f"❌ Dépendances ONNX manquantes : {', '.join(missing)} "
+                         f"(pip install -r requirements.txt)")
+
+# ==================== EXPORT ET QUANTIFICATION ====================
+
+def export_onnx(model_path, out_dir, imgsz=IMG_SIZE):
+    """Exporter le modèle de WasteDetector en ONNX FP32"""
+    detector = WasteDetector(model_path)
+    if not detector.model:
+        raise RuntimeError(f"Impossible de charger {model_path}")
+
+    exported = detector.model.export(format='onnx', imgsz=imgsz, simplify=True)
+    target = os.path.join(out_dir, os.path.splitext(os.path.basename(model_path))[0] + '_fp32.onnx')
+    shutil.move(exported, target)
+    print(f"✅ Export ONNX: {target}")
+    return target
+
+def copy_metadata(src_path, dst_path):
+    """Recopier les métadonnées ultralytics (classes, stride, imgsz) sur le modèle quantifié"""
+    import onnx
+    src = onnx.load(src_path)
+    dst = onnx.load(dst_path)
+    del dst.metadata_props[:]
+    dst.metadata_props.extend(src.metadata_props)
+    onnx.save(dst, dst_path)
+
+def quantize_dynamic_int8(fp32_path):
+    """Quantification dynamique : poids INT8, activations quantifiées à l'exécution"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    target = fp32_path.replace('_fp32.onnx', '_int8_dynamic.onnx')
+    quantize_dynamic(fp32_path, target, weight_type=QuantType.QInt8)
+    copy_metadata(fp32_path, target)
+    print(f"✅ Quantification dynamique INT8: {target}")
+    return target
+
+def letterbox(img, imgsz=IMG_SIZE):
+    """Redimensionner en conservant le ratio et compléter en gris, comme ultralytics"""
+    h, w = img.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    return canvas
+
+def to_input_tensor(img, imgsz=IMG_SIZE):
+    """Image BGR OpenCV -> tenseur NCHW float32 RGB normalisé"""
+    rgb = cv2.cvtColor(letterbox(img, imgsz), cv2.COLOR_BGR2RGB)
+    return np.ascontiguousarray(rgb.transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+def quantize_static_int8(fp32_path, calib_dir, imgsz=IMG_SIZE, limit=200):
+    """Quantification statique QDQ calibrée sur un dossier d'images représentatives"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import (quantize_static, CalibrationDataReader,
+                                          QuantFormat, QuantType)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    images = list_images(calib_dir)[:limit]
+    if not images:
+        raise RuntimeError(f"Aucune image de calibration dans {calib_dir}")
+
+    input_name = ort.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self.paths = iter(images)
+
+        def get_next(self):
+            for path in self.paths:
+                img = cv2.imread(path)
+                if img is not None:
+                    return {input_name: to_input_tensor(img, imgsz)}
+            return None
+
+    prepared = fp32_path.replace('_fp32.onnx', '_fp32_prep.onnx')
+    quant_pre_process(fp32_path, prepared)
+
+    target = fp32_path.replace('_fp32.onnx', '_int8_static.onnx')
+    quantize_static(prepared, target, ImageCalibrationReader(),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True)
+    os.remove(prepared)
+    copy_metadata(fp32_path, target)
+    print(f"✅ Quantification statique INT8 ({len(images)} images de calibration): {target}")
+    return target
+
+# ==================== ÉVALUATION ====================
+
+def load_labels(image_path, width, height):
+    """Lire les annotations YOLO d'une image : (boxes xyxy en pixels, classes)"""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    image_dir = os.path.dirname(image_path)
+    candidates = [
+        os.path.join(os.path.dirname(image_dir), 'labels', stem + '.txt'),
+        os.path.join(image_dir, stem + '.txt')
+    ]
+    for path in candidates:
+        if os.path.exists(path):
+            rows = np.loadtxt(path, ndmin=2, dtype=np.float64)
+            break
+    else:
+        rows = np.zeros((0, 5))
+
+    if len(rows) == 0:
+        return np.zeros((0, 4)), np.zeros(0, dtype=np.int64)
+
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, rows[:, 0].astype(np.int64)
+
+def average_precision(recall, precision):
+    """Aire sous la courbe précision/rappel (interpolation tous points, style VOC)"""
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    idx = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+def mean_average_precision(predictions, ground_truths, iou_threshold):
+    """mAP à un seuil d'IoU donné, moyenné sur les classes présentes dans les annotations"""
+    classes = set()
+    for _, gt_classes in ground_truths:
+        classes.update(gt_classes.tolist())
+
+    aps = []
+    for cls in sorted(classes):
+        n_gt = sum(int((gt_classes == cls).sum()) for _, gt_classes in ground_truths)
+        scores, hits = [], []
+        for (boxes, confs, pred_classes), (gt_boxes, gt_classes) in zip(predictions, ground_truths):
+            pred_mask = pred_classes == cls
+            p_boxes, p_confs = boxes[pred_mask], confs[pred_mask]
+            g_boxes = gt_boxes[gt_classes == cls]
+            order = np.argsort(-p_confs)
+            matched = np.zeros(len(g_boxes), dtype=bool)
+            ious = box_iou(p_boxes[order], g_boxes) if len(g_boxes) else np.zeros((len(order), 0))
+            for row, conf in zip(ious, p_confs[order]):
+                candidates = np.where(~matched & (row >= iou_threshold))[0]
+                hit = len(candidates) > 0
+                if hit:
+                    matched[candidates[np.argmax(row[candidates])]] = True
+                scores.append(conf)
+                hits.append(hit)
+
+        if not scores:
+            aps.append(0.0)
+            continue
+        order = np.argsort(-np.asarray(scores))
+        tp = np.cumsum(np.asarray(hits)[order])
+        fp = np.cumsum(~np.asarray(hits)[order])
+        aps.append(average_precision(tp / max(n_gt, 1), tp / (tp + fp)))
+
+    return float(np.mean(aps)) if aps else 0.0
+
+def benchmark_variant(model_path, images, conf, runs):
+    """Mesurer latence et précision d'une variante sur le jeu annoté"""
+    detector = WasteDetector(model_path)
+    if not detector.model:
+        raise RuntimeError(f"Impossible de charger {model_path}")
+
+    frames = [cv2.imread(path) for path in images]
+
+    # Première inférence = démarrage à froid
+    started = time.perf_counter()
+    detector.predict(frames[0], conf=conf)
+    cold_ms = round(1000 * (time.perf_counter() - started), 3)
+
+    predictions, ground_truths = [], []
+    for path, frame in zip(images, frames):
+        height, width = frame.shape[:2]
+        predictions.append(detector.predict(frame, conf=conf))
+        ground_truths.append(load_labels(path, width, height))
+
+    # Passes de latence au seuil de production
+    samples = []
+    for _ in range(runs):
+        for frame in frames:
+            started = time.perf_counter()
+            detector.predict(frame, conf=CONFIDENCE_THRESHOLD)
+            samples.append(time.perf_counter() - started)
+
+    map50 = mean_average_precision(predictions, ground_truths, 0.5)
+    map50_95 = float(np.mean([mean_average_precision(predictions, ground_truths, t)
+                              for t in np.arange(0.5, 0.96, 0.05)]))
+    return {
+        'path': model_path,
+        'size_mb': round(os.path.getsize(model_path) / 1e6, 2),
+        'cold_ms': cold_ms,
+        'latency': latency_summary(samples),
+        'map50': round(map50, 4),
+        'map50_95': round(map50_95, 4)
+    }
+
+def pick_winner(variants, max_map_drop):
+    """Variante la plus rapide (p50) dont la perte de mAP50 reste sous la tolérance"""
+    baseline = variants[0]
+    eligible = [v for v in variants if baseline['map50'] - v['map50'] <= max_map_drop]
+    return min(eligible, key=lambda v: v['latency']['p50_ms'])
+
+# ==================== MAIN ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporter, quantifier et comparer les variantes du modèle YOLO")
+    parser.add_argument('--model', default=MODEL_PATH, help="Poids PyTorch de référence (.pt)")
+    parser.add_argument('--eval', required=True, help="Dossier annoté (images/ + labels/ au format YOLO)")
+    parser.add_argument('--calib', help="Dossier d'images de calibration pour la quantification statique")
+    parser.add_argument('--out-dir', default=DEFAULT_OUT_DIR)
+    parser.add_argument('--imgsz', type=int, default=IMG_SIZE)
+    parser.add_argument('--runs', type=int, default=3, help="Passes de latence sur le jeu d'évaluation")
+    parser.add_argument('--conf', type=float, default=0.001, help="Seuil de confiance pour le calcul du mAP")
+    parser.add_argument('--max-map-drop', type=float, default=0.01, help="Perte de mAP50 tolérée pour la variante gagnante")
+    args = parser.parse_args()
+    check_onnx_packages()
+
+    images_dir = os.path.join(args.eval, 'images')
+    images = list_images(images_dir if os.path.isdir(images_dir) else args.eval)
+    if not images:
+        raise SystemExit(f"❌ Aucune image d'évaluation dans {args.eval}")
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    paths = [args.model]
+    fp32 = export_onnx(args.model, args.out_dir, args.imgsz)
+    paths.append(fp32)
+    paths.append(quantize_dynamic_int8(fp32))
+    if args.calib:
+        paths.append(quantize_static_int8(fp32, args.calib, args.imgsz))
+    else:
+        print("ℹ️ Pas de dossier --calib : quantification statique ignorée")
+
+    variants = []
+    for path in paths:
+        print(f"🔍 Évaluation de {path}")
+        variants.append(benchmark_variant(path, images, args.conf, args.runs))
+
+    baseline_map = variants[0]['map50']
+    for variant in variants:
+        variant['map50_drift'] = round(variant['map50'] - baseline_map, 4)
+
+    winner = pick_winner(variants, args.max_map_drop)
+
+    print(f"\n{'Variante':<45} {'p50 ms':>9} {'p95 ms':>9} {'img/s':>8} {'mAP50':>7} {'dérive':>8}")
+    for v in variants:
+        lat = v['latency']
+        print(f"{os.path.basename(v['path']):<45} {lat['p50_ms']:>9.2f} {lat['p95_ms']:>9.2f} "
+              f"{lat['throughput_per_s']:>8.2f} {v['map50']:>7.3f} {v['map50_drift']:>+8.3f}")
+
+    write_json(os.path.join(args.out_dir, 'comparison.json'), {
+        'eval_images': len(images),
+        'max_map_drop': args.max_map_drop,
+        'variants': variants,
+        'winner': winner['path']
+    })
+    print(f"\n🏆 Variante retenue: {winner['path']}")
+    print(f"   Pour l'utiliser : WASTEAI_MODEL_PATH={winner['path']} python app.py")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Hachage des mots de passe hors du thread de requête, borné et limité
+
+Un hachage scrypt/pbkdf2 coûte des dizaines de millisecondes de CPU. Lors d'une vague de
+connexions (changement d'équipe à l'usine), les hachages exécutés dans les threads de
+requête affamaient les flux caméra et l'ingestion. Ici :
+
+- un pool de HASH_WORKERS threads (priorité CPU abaissée sous Linux) exécute tous les
+  hachages ; hashlib relâche le GIL pendant le calcul ;
+- au-delà de HASH_MAX_PENDING hachages en cours ou en attente, la requête est refusée
+  tout de suite (HasherBusy -> 503 + Retry-After) au lieu d'allonger la file ;
+- des seaux à jetons limitent les tentatives par compte et par adresse IP (429) ;
+- la méthode de hachage se règle par WASTEAI_PASSWORD_METHOD ; un hachage d'une autre
+  méthode est recalculé à la première connexion réussie.
+
+Les limites sont par processus : avec serve.py, chaque worker a son pool et ses seaux.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+import metrics
+
+# Méthode werkzeug : 'scrypt:N:r:p' ou 'pbkdf2:sha256:itérations'
+PASSWORD_METHOD = os.environ.get('WASTEAI_PASSWORD_METHOD', 'scrypt:32768:8:1')
+SALT_LENGTH = int(os.environ.get('WASTEAI_PASSWORD_SALT_LENGTH', 16))
+HASH_WORKERS = int(os.environ.get('WASTEAI_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 4)))
+HASH_MAX_PENDING = int(os.environ.get('WASTEAI_HASH_MAX_PENDING', HASH_WORKERS * 8))
+HASH_TIMEOUT_S = 10.0
+HASH_NICE = 10
+
+class HasherBusy(Exception):
+    """File de hachage pleine : réessayer après `retry_after` secondes"""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Trop de connexions simultanées, réessayez")
+        self.retry_after = retry_after
+
+def normalize_method(method):
+    """Méthode complète telle que werkzeug l'écrit dans le hachage ('pbkdf2' -> 'pbkdf2:sha256:<itérations>')"""
+    name, *params = method.split(':')
+    if name == 'scrypt' and not params:
+        params = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        params = params + ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)][len(params):]
+    return ':'.join([name] + params)
+
+def _lower_priority():
+    # Sous Linux, setpriority accepte l'identifiant d'un thread : seul le hacheur est ralenti
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), HASH_NICE)
+    except (AttributeError, OSError):
+        pass
+
+class PasswordHasher:
+    def __init__(self, method=PASSWORD_METHOD, salt_length=SALT_LENGTH, workers=HASH_WORKERS,
+                 max_pending=HASH_MAX_PENDING, timeout_s=HASH_TIMEOUT_S):
+        self.method = normalize_method(method)
+        self.salt_length = salt_length
+        self.timeout_s = timeout_s
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash',
+                                            initializer=_lower_priority)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._dummy = None
+
+    def _run(self, operation, func, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.PASSWORD_HASH_REJECTED.inc()
+            raise HasherBusy()
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(func, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        # Le slot est rendu quand le hachage se termine (ou est annulé), pas quand la requête
+        # abandonne : un hachage encore en file ou en cours reste compté dans la limite
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout_s)
+        except FutureTimeout:
+            future.cancel()
+            metrics.PASSWORD_HASH_REJECTED.inc()
+            raise HasherBusy(retry_after=5)
+        finally:
+            metrics.PASSWORD_HASH_SECONDS.observe(time.perf_counter() - started, operation)
+
+    def hash(self, password):
+        return self._run('hash', generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored, password):
+        return self._run('verify', check_password_hash, stored, password)
+
+    def verify_unknown(self, password):
+        """Vérification factice pour un email inconnu : même coût, on ne révèle pas les comptes"""
+        if self._dummy is None:
+            self._dummy = self.hash(os.urandom(16).hex())
+        self.verify(self._dummy, password)
+        return False
+
+    def needs_rehash(self, stored):
+        """Hachage produit avec une autre méthode ou une autre longueur de sel
+
+        Les deux méthodes sont comparées sous leur forme complète : 'pbkdf2' configuré
+        correspond au 'pbkdf2:sha256:<itérations par défaut>' écrit par werkzeug.
+        """
+        method, _, rest = stored.partition('$')
+        salt = rest.partition('$')[0]
+        return normalize_method(method) != self.method or len(salt) != self.salt_length
+
+# ==================== LIMITATION DES TENTATIVES ====================
+
+class Throttle:
+    """Seau à jetons par clé (compte, adresse IP) : `burst` tentatives, puis `rate` par seconde"""
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}   # clé -> (jetons, instant de la dernière mise à jour)
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Consommer une tentative ; retourne 0 si autorisée, sinon le délai d'attente (s)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._purge(now)
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def _purge(self, now):
+        # Un seau plein n'apporte rien : on l'oublie
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
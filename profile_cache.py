@@ -0,0 +1,74 @@
+"""
+Cache des profils utilisateurs (en-tête des pages, /api/user/info et /api/profile)
+
+Chaque page charge le profil au démarrage ; sans cache, chaque navigation ouvrait une
+connexion SQLite pour relire la même ligne. Le cache garde le profil par utilisateur
+dans le processus, avec son ETag, et sert les 304 sans toucher la base.
+
+Invalidation :
+- dans le processus qui traite la modification (update_profile, upload_profile_picture,
+  changement de rôle, suppression) : immédiate ;
+- dans les autres workers (serve.py) : l'utilisateur qui modifie son profil reçoit dans sa
+  session la date de modification, une entrée chargée avant est relue ; les modifications
+  faites par un admin y sont visibles au plus tard après PROFILE_CACHE_TTL_S.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PROFILE_CACHE_TTL_S = float(os.environ.get('WASTEAI_PROFILE_CACHE_TTL', 60))
+PROFILE_CACHE_SIZE = 1024
+
+class ProfileCache:
+    def __init__(self, loader, ttl_s=PROFILE_CACHE_TTL_S, capacity=PROFILE_CACHE_SIZE):
+        # loader(user_id) -> dict du profil, None si l'utilisateur n'existe pas
+        self.loader = loader
+        self.ttl_s = ttl_s
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # user_id -> (profil, etag, chargé à (time.time()))
+        self._lock = threading.Lock()
+        # Incrémenté à chaque invalidation : un chargement qui la chevauche n'est pas conservé
+        self._epoch = 0
+
+    def get(self, user_id, changed_at=0):
+        """(profil, etag) de l'utilisateur, relu si absent, expiré ou antérieur à `changed_at`"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and now - entry[2] < self.ttl_s and entry[2] >= changed_at:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0], entry[1]
+            self.misses += 1
+            epoch = self._epoch
+
+        # Lecture hors verrou : un chargement lent ne bloque pas les autres utilisateurs
+        profile = self.loader(user_id)
+        if profile is None:
+            with self._lock:
+                self._entries.pop(user_id, None)
+            return None, None
+        digest = hashlib.sha1(json.dumps(profile, sort_keys=True, default=str).encode()).hexdigest()
+        etag = digest[:20]
+        with self._lock:
+            if epoch != self._epoch:
+                return profile, etag
+            self._entries[user_id] = (profile, etag, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return profile, etag
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._epoch += 1
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
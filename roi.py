@@ -0,0 +1,94 @@
+"""
+Régions d'intérêt (ROI) par caméra : n'envoyer au modèle que la zone utile de la frame
+
+Configuration JSON (WASTEAI_CAMERA_ROIS, défaut camera_rois.json), une entrée par source,
+coordonnées normalisées entre 0 et 1 pour rester valables quelle que soit la résolution :
+
+    {
+        "0": {"rect": [0.2, 0.35, 0.8, 0.95]},
+        "tapis-2": {"polygon": [[0.1, 0.4], [0.9, 0.3], [0.95, 1.0], [0.05, 1.0]]}
+    }
+
+La frame est recadrée sur le rectangle englobant de la ROI, l'extérieur du polygone est
+mis à zéro, puis les boîtes sont ramenées en coordonnées de la frame. Une détection dont
+le centre tombe hors de la ROI est écartée avant comptage.
+"""
+import json
+import os
+
+import cv2
+import numpy as np
+
+ROI_CONFIG_PATH = os.environ.get('WASTEAI_CAMERA_ROIS',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'camera_rois.json'))
+
+class RegionOfInterest:
+    def __init__(self, polygon):
+        self.polygon = np.asarray(polygon, dtype=np.float32)
+        if self.polygon.ndim != 2 or self.polygon.shape[1] != 2 or len(self.polygon) < 3:
+            raise ValueError("Une ROI est un polygone d'au moins 3 points [x, y]")
+        # Géométrie en pixels, recalculée seulement si la résolution change
+        self._shape = None
+
+    @classmethod
+    def from_config(cls, entry):
+        if 'rect' in entry:
+            x1, y1, x2, y2 = entry['rect']
+            return cls([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+        return cls(entry['polygon'])
+
+    def _prepare(self, shape):
+        if self._shape == shape:
+            return
+        height, width = shape
+        points = np.round(self.polygon * [width, height]).astype(np.int32)
+        points[:, 0] = np.clip(points[:, 0], 0, width)
+        points[:, 1] = np.clip(points[:, 1], 0, height)
+        x1, y1 = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        self.points = points
+        self.bbox = (int(x1), int(y1), int(x2), int(y2))
+        # Masque du polygone dans le repère du rectangle englobant
+        self.mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+        cv2.fillPoly(self.mask, [points - [x1, y1]], 255)
+        self.is_rect = bool(self.mask.all())
+        self._shape = shape
+
+    def crop(self, frame):
+        """Partie de la frame à inférer et son origine (x, y) dans la frame"""
+        self._prepare(frame.shape[:2])
+        x1, y1, x2, y2 = self.bbox
+        region = frame[y1:y2, x1:x2]
+        if not self.is_rect:
+            region = cv2.bitwise_and(region, region, mask=self.mask)
+        return region, (x1, y1)
+
+    def to_frame(self, boxes, scores, classes, origin):
+        """Ramener les boîtes du recadrage en coordonnées de la frame et écarter celles hors ROI"""
+        x1, y1 = origin
+        boxes = boxes + np.array([x1, y1, x1, y1], dtype=boxes.dtype)
+        # Centre des boîtes dans le repère du masque
+        cx = ((boxes[:, 0] + boxes[:, 2]) / 2 - x1).astype(np.int64)
+        cy = ((boxes[:, 1] + boxes[:, 3]) / 2 - y1).astype(np.int64)
+        height, width = self.mask.shape
+        inside = (cx >= 0) & (cx < width) & (cy >= 0) & (cy < height)
+        inside[inside] = self.mask[cy[inside], cx[inside]] > 0
+        return boxes[inside], scores[inside], classes[inside]
+
+    def draw(self, frame):
+        """Tracer le contour de la ROI sur la frame"""
+        self._prepare(frame.shape[:2])
+        cv2.polylines(frame, [self.points], True, (255, 200, 0), 1)
+        return frame
+
+def load_rois(path=ROI_CONFIG_PATH):
+    """ROI par identifiant de source caméra ; fichier absent = aucune ROI"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+        return {str(source): RegionOfInterest.from_config(entry) for source, entry in config.items()}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ ROI caméra ignorées ({path}): {e}")
+        return {}
@@ -0,0 +1,155 @@
+"""
+Mode de production : workers gunicorn pré-forkés avec modèle YOLO partagé
+
+    python serve.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+
+Le processus maître charge et préchauffe le modèle avant le fork : les workers héritent
+des poids (déjà fusionnés par la première inférence) en copy-on-write au lieu de charger
+chacun leur WasteDetector. La caméra n'est ouverte que par un worker désigné ; les autres
+lui relaient les routes caméra.
+
+Avec WASTEAI_INFERENCE_SERVER, le modèle n'est pas chargé ici mais dans
+inference_server.py, partagé par tous les workers via la mémoire partagée.
+
+Les assets statiques sont empreintés et précompressés au démarrage (assets.py).
+
+Linux/macOS uniquement (gunicorn, fcntl) ; sous Windows, utiliser python app.py.
+"""
+import argparse
+import fcntl
+import gc
+import os
+import threading
+
+from gunicorn.app.base import BaseApplication
+
+from thread_budget import load_budget
+
+# Un verrou par déploiement : à côté de sa base (même défaut que app.DB_PATH), ou
+# WASTEAI_CAMERA_LOCK ; deux instances sur la même machine ne se disputent pas la caméra
+_DB_PATH = os.environ.get('WASTEAI_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'waste.db'))
+CAMERA_LOCK_PATH = os.environ.get('WASTEAI_CAMERA_LOCK', _DB_PATH + '.camera.lock')
+
+# Descripteur du verrou caméra : conservé ouvert tant que le worker vit
+_camera_lock = None
+
+def set_torch_threads(threads):
+    """Limiter les threads intra-op de torch (sans effet si torch n'est pas chargé)"""
+    import sys
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+def preload_model(webapp):
+    """Charger et préchauffer le modèle dans le maître, avant le fork"""
+    if webapp.INFERENCE_SERVER:
+        # Le modèle vit dans le serveur d'inférence : les workers n'ouvrent qu'une connexion
+        print(f"ℹ️ Serveur d'inférence {webapp.INFERENCE_SERVER} : aucun modèle chargé ici")
+        return
+    if webapp.MODEL_LOADER.model_path.endswith('.onnx'):
+        # Les pools de threads onnxruntime ne survivent pas au fork : chargement par worker
+        print("ℹ️ Modèle ONNX : préchargement désactivé, chaque worker charge son modèle")
+        return
+
+    from yolo_detector import import_yolo
+    import_yolo()
+    # Un seul thread dans le maître : aucun pool OpenMP n'existe au moment du fork,
+    # chaque worker crée le sien après avoir fixé son propre nombre de threads
+    set_torch_threads(1)
+    webapp.MODEL_LOADER.load()
+    print(f"✅ Modèle préchargé avant fork: {webapp.MODEL_LOADER.status()['timings']}")
+
+    # Sortir les objets déjà alloués du suivi du GC : ses passages n'écriront plus
+    # dans leurs en-têtes, ce qui préserve le partage copy-on-write des pages
+    gc.collect()
+    gc.freeze()
+
+def claim_camera(lock_path):
+    """Tenter de devenir le worker caméra (verrou exclusif non bloquant)"""
+    global _camera_lock
+    fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    # Si le worker meurt, le verrou est libéré et son remplaçant le reprend
+    _camera_lock = fd
+    return True
+
+def start_camera_listener(webapp, port):
+    """Écouteur interne du worker caméra, qui reçoit les routes relayées"""
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', port, webapp.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='camera-listener', daemon=True).start()
+
+class WasteAIApplication(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        self.cfg.set('bind', self.options.bind)
+        self.cfg.set('workers', self.options.workers)
+        self.cfg.set('threads', self.options.threads)
+        self.cfg.set('worker_class', 'gthread')
+        self.cfg.set('timeout', self.options.timeout)
+        self.cfg.set('preload_app', True)
+        self.cfg.set('post_fork', self.post_fork)
+
+    def load(self):
+        # Importé dans le maître grâce à preload_app
+        import app as webapp
+        webapp.CAMERA_WORKER_PORT = self.options.camera_port
+        if self.options.preload:
+            preload_model(webapp)
+        return webapp.app
+
+    def post_fork(self, server, worker):
+        import app as webapp
+
+        set_torch_threads(self.options.torch_threads)
+        # Pour un torch importé après le fork (modèle non préchargé)
+        os.environ['OMP_NUM_THREADS'] = str(self.options.torch_threads)
+
+        webapp.CAMERA_OWNER = claim_camera(self.options.camera_lock)
+        if webapp.CAMERA_OWNER:
+            start_camera_listener(webapp, self.options.camera_port)
+            server.log.info(f"Worker {worker.pid} désigné pour la caméra "
+                            f"(écoute interne 127.0.0.1:{self.options.camera_port})")
+
+        if webapp.MODEL_LOADER.state == 'idle':
+            webapp.MODEL_LOADER.start()
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Serveur de production WasteAI (gunicorn pré-forké)")
+    parser.add_argument('--bind', default='0.0.0.0:8000')
+    parser.add_argument('--workers', type=int, default=max(2, cpus // 2))
+    parser.add_argument('--threads', type=int, default=4, help="Threads de requêtes par worker")
+    parser.add_argument('--torch-threads', type=int, default=None,
+                        help="Threads torch par worker (défaut : budget de l'hôte / workers)")
+    parser.add_argument('--timeout', type=int, default=120)
+    parser.add_argument('--camera-port', type=int, default=5001, help="Port interne du worker caméra")
+    parser.add_argument('--camera-lock', default=CAMERA_LOCK_PATH)
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        help="Charger le modèle dans chaque worker au lieu du maître")
+    args = parser.parse_args()
+
+    # Assets empreintés et précompressés, construits avant le chargement de l'application
+    import assets
+    manifest = assets.build()
+    print(f"✅ {len(manifest)} assets empreintés dans static/{assets.DIST_DIR}/")
+
+    if args.torch_threads is None and os.environ.get('OMP_NUM_THREADS', '').isdigit():
+        # Réglage explicite de l'opérateur : prioritaire sur le budget calibré
+        args.torch_threads = int(os.environ['OMP_NUM_THREADS'])
+    if args.torch_threads is None:
+        # Budget calibré pour un processus (thread_budget.py), partagé entre les workers
+        args.torch_threads = max(1, load_budget().inference_threads // args.workers)
+
+    WasteAIApplication(args).run()
+
+if __name__ == '__main__':
+    main()
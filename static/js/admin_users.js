@@ -1,7 +1,14 @@
 // Gestion des utilisateurs - Admin
 
+// État de la liste (pagination, recherche et tri côté serveur)
+let currentPage = 1;
+let currentSort = 'created_at';
+let currentOrder = 'desc';
+let searchTimer = null;
+
 document.addEventListener('DOMContentLoaded', () => {
     loadUserInfo();
+    setupFilters();
     loadUsers();
     setupMenuToggle();
 });
@@ -40,14 +47,61 @@ async function loadUserInfo() {
     }
 }
 
-// Charger la liste des utilisateurs
+// Recherche (avec délai de frappe), filtre de rôle et tri par colonne
+function setupFilters() {
+    document.getElementById('userSearch').addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            currentPage = 1;
+            loadUsers();
+        }, 300);
+    });
+
+    document.getElementById('roleFilter').addEventListener('change', () => {
+        currentPage = 1;
+        loadUsers();
+    });
+
+    document.querySelectorAll('.users-table th.sortable').forEach(th => {
+        th.addEventListener('click', () => {
+            const sort = th.dataset.sort;
+            if (sort === currentSort) {
+                currentOrder = currentOrder === 'asc' ? 'desc' : 'asc';
+            } else {
+                currentSort = sort;
+                // Texte : A→Z d'abord ; dates et nombres : plus récent / plus grand d'abord
+                currentOrder = sort === 'email' || sort === 'role' ? 'asc' : 'desc';
+            }
+            currentPage = 1;
+            loadUsers();
+        });
+    });
+}
+
+// Charger une page de la liste des utilisateurs
 async function loadUsers() {
+    const params = new URLSearchParams({
+        page: currentPage,
+        sort: currentSort,
+        order: currentOrder,
+        role: document.getElementById('roleFilter').value
+    });
+    const search = document.getElementById('userSearch').value.trim();
+    if (search) params.append('search', search);
+
     try {
-        const response = await fetch('/api/admin/users');
+        const response = await fetch(`/api/admin/users?${params}`);
         const data = await response.json();
 
         if (data.success) {
+            // Dernière page vidée par une suppression : revenir à la précédente
+            if (data.users.length === 0 && currentPage > 1) {
+                currentPage = Math.max(1, data.total_pages);
+                return loadUsers();
+            }
             displayUsers(data.users);
+            displaySortIndicators();
+            displayPagination(data.page, data.total_pages, data.total);
         } else {
             showError('Erreur lors du chargement des utilisateurs');
         }
@@ -57,18 +111,25 @@ async function loadUsers() {
     }
 }
 
+// Échapper le texte inséré dans le tableau
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text ?? '';
+    return div.innerHTML;
+}
+
 // Afficher les utilisateurs dans le tableau
 function displayUsers(users) {
     const tbody = document.getElementById('usersTableBody');
 
     if (users.length === 0) {
-        tbody.innerHTML = '<tr><td colspan="5" class="no-users">Aucun utilisateur</td></tr>';
+        tbody.innerHTML = '<tr><td colspan="7" class="no-users">Aucun utilisateur</td></tr>';
         return;
     }
 
     tbody.innerHTML = users.map(user => `
         <tr>
-            <td>${user.email}</td>
+            <td>${escapeHtml(user.email)}</td>
             <td>
                 <span class="role-badge ${user.role}">
                     ${user.role === 'admin' ? 'Admin' : 'Utilisateur'}
@@ -78,12 +139,16 @@ function displayUsers(users) {
             <td class="date-text">
                 ${user.last_login ? formatDate(user.last_login) : '<span class="never-logged">Jamais connecté</span>'}
             </td>
+            <td>${user.detections.toLocaleString('fr-FR')}</td>
+            <td class="date-text">
+                ${user.last_detection ? formatDate(user.last_detection) : '<span class="never-logged">Aucune</span>'}
+            </td>
             <td>
                 <div class="action-buttons">
                     <button class="btn-small btn-role" onclick="toggleRole(${user.id}, '${user.role}')">
                         ${user.role === 'admin' ? '↓ User' : '↑ Admin'}
                     </button>
-                    <button class="btn-small btn-delete" onclick="deleteUser(${user.id}, '${user.email}')">
+                    <button class="btn-small btn-delete" onclick="deleteUser(${user.id}, '${escapeHtml(user.email).replace(/'/g, "\\'")}')">
                         🗑️ Supprimer
                     </button>
                 </div>
@@ -92,6 +157,73 @@ function displayUsers(users) {
     `).join('');
 }
 
+// Indiquer la colonne et le sens du tri
+function displaySortIndicators() {
+    document.querySelectorAll('.users-table th.sortable').forEach(th => {
+        th.classList.remove('sorted-asc', 'sorted-desc');
+        if (th.dataset.sort === currentSort) {
+            th.classList.add(`sorted-${currentOrder}`);
+        }
+    });
+}
+
+// Afficher la pagination
+function displayPagination(currentPageNum, totalPages, totalItems) {
+    const paginationContainer = document.getElementById('paginationContainer');
+
+    if (totalPages <= 1) {
+        paginationContainer.innerHTML = '';
+        return;
+    }
+
+    let paginationHTML = `
+        <div class="pagination-info">
+            Page ${currentPageNum} sur ${totalPages} (${totalItems} utilisateur${totalItems > 1 ? 's' : ''})
+        </div>
+        <div class="pagination-buttons">
+            <button class="page-btn" onclick="goToPage(1)" ${currentPageNum === 1 ? 'disabled' : ''}>
+                <i class="fas fa-angle-double-left"></i>
+            </button>
+            <button class="page-btn" onclick="goToPage(${currentPageNum - 1})" ${currentPageNum === 1 ? 'disabled' : ''}>
+                <i class="fas fa-angle-left"></i>
+            </button>
+    `;
+
+    const maxPagesToShow = 5;
+    let startPage = Math.max(1, currentPageNum - Math.floor(maxPagesToShow / 2));
+    let endPage = Math.min(totalPages, startPage + maxPagesToShow - 1);
+
+    if (endPage - startPage < maxPagesToShow - 1) {
+        startPage = Math.max(1, endPage - maxPagesToShow + 1);
+    }
+
+    for (let i = startPage; i <= endPage; i++) {
+        paginationHTML += `
+            <button class="page-btn ${i === currentPageNum ? 'active' : ''}" onclick="goToPage(${i})">
+                ${i}
+            </button>
+        `;
+    }
+
+    paginationHTML += `
+            <button class="page-btn" onclick="goToPage(${currentPageNum + 1})" ${currentPageNum === totalPages ? 'disabled' : ''}>
+                <i class="fas fa-angle-right"></i>
+            </button>
+            <button class="page-btn" onclick="goToPage(${totalPages})" ${currentPageNum === totalPages ? 'disabled' : ''}>
+                <i class="fas fa-angle-double-right"></i>
+            </button>
+        </div>
+    `;
+
+    paginationContainer.innerHTML = paginationHTML;
+}
+
+// Aller à une page
+function goToPage(page) {
+    currentPage = page;
+    loadUsers();
+}
+
 // Changer le rôle d'un utilisateur
 async function toggleRole(userId, currentRole) {
     const newRole = currentRole === 'admin' ? 'user' : 'admin';
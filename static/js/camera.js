@@ -2,6 +2,8 @@
 
 let cameraActive = false;
 let videoFeedInterval = null;
+// camera?source=<nom> : choisir la source du registre (défaut : la première déclarée)
+const cameraSource = new URLSearchParams(window.location.search).get('source');
 
 // Fonction pour démarrer la caméra
 async function startCamera() {
@@ -12,7 +14,7 @@ async function startCamera() {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ action: 'start' })
+            body: JSON.stringify({ action: 'start', source: cameraSource })
         });
 
         const data = await response.json();
@@ -26,7 +28,8 @@ async function startCamera() {
             document.getElementById('noVideoDisplay').style.display = 'none';
             document.getElementById('videoFeed').style.display = 'block';
 
-            // Mettre à jour l'état du robot
+            // Mettre à jour l'état du robot (le statut en cache est périmé)
+            sessionStorage.removeItem(ROBOT_STATUS_KEY);
             updateRobotStatus(true);
 
             // Démarrer le flux vidéo
@@ -51,7 +54,7 @@ async function stopCamera() {
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ action: 'stop' })
+            body: JSON.stringify({ action: 'stop', source: cameraSource })
         });
 
         const data = await response.json();
@@ -69,7 +72,8 @@ async function stopCamera() {
             document.getElementById('noVideoDisplay').style.display = 'block';
             document.getElementById('detectionSummary').style.display = 'none';
 
-            // Mettre à jour l'état du robot
+            // Mettre à jour l'état du robot (le statut en cache est périmé)
+            sessionStorage.removeItem(ROBOT_STATUS_KEY);
             updateRobotStatus(false);
 
             console.log('✅ Caméra désactivée');
@@ -85,7 +89,10 @@ async function stopCamera() {
 // Fonction pour démarrer le flux vidéo
 function startVideoFeed() {
     const videoFeed = document.getElementById('videoFeed');
-    videoFeed.src = '/video_feed';
+    // camera?debug=1 : incruster FPS et durées par étape sur le flux
+    const debug = new URLSearchParams(window.location.search).get('debug') === '1';
+    const feedUrl = cameraSource ? `/video_feed/${encodeURIComponent(cameraSource)}` : '/video_feed';
+    videoFeed.src = debug ? `${feedUrl}?overlay=1` : feedUrl;
 
     // Démarrer la récupération périodique des détections (toutes les 2 secondes)
     if (window.detectionInterval) {
@@ -201,31 +208,48 @@ async function loadUserInfo() {
 }
 
 // Charger le statut du robot
+// Le statut est gardé en sessionStorage : naviguer entre les pages ne relance pas la requête
+const ROBOT_STATUS_KEY = 'wasteai.robotStatus';
+const ROBOT_STATUS_TTL_MS = 30000;
+
+function renderRobotStatus(data) {
+    document.getElementById('robotLocation').textContent = data.location.split(',')[0];
+    document.getElementById('robotCity').textContent = data.location.split(',').slice(1).join(',').trim();
+    document.getElementById('positionText').textContent = data.location.split(',')[0];
+
+    const battery = data.battery || 0;
+    document.getElementById('batteryFill').style.width = battery + '%';
+    document.getElementById('batteryPercent').textContent = battery + '%';
+
+    // Couleur de la batterie
+    const batteryFill = document.getElementById('batteryFill');
+    if (battery > 50) {
+        batteryFill.style.backgroundColor = '#10b981';
+    } else if (battery > 20) {
+        batteryFill.style.backgroundColor = '#f59e0b';
+    } else {
+        batteryFill.style.backgroundColor = '#ef4444';
+    }
+
+    updateRobotStatus(data.is_active);
+}
+
 async function loadRobotStatus() {
+    const cached = JSON.parse(sessionStorage.getItem(ROBOT_STATUS_KEY) || 'null');
+    if (cached) {
+        renderRobotStatus(cached.data);
+        if (Date.now() - cached.at < ROBOT_STATUS_TTL_MS) {
+            return;
+        }
+    }
+
     try {
         const response = await fetch('/api/robot/status');
         const data = await response.json();
 
         if (data.success) {
-            document.getElementById('robotLocation').textContent = data.location.split(',')[0];
-            document.getElementById('robotCity').textContent = data.location.split(',').slice(1).join(',').trim();
-            document.getElementById('positionText').textContent = data.location.split(',')[0];
-
-            const battery = data.battery || 0;
-            document.getElementById('batteryFill').style.width = battery + '%';
-            document.getElementById('batteryPercent').textContent = battery + '%';
-
-            // Couleur de la batterie
-            const batteryFill = document.getElementById('batteryFill');
-            if (battery > 50) {
-                batteryFill.style.backgroundColor = '#10b981';
-            } else if (battery > 20) {
-                batteryFill.style.backgroundColor = '#f59e0b';
-            } else {
-                batteryFill.style.backgroundColor = '#ef4444';
-            }
-
-            updateRobotStatus(data.is_active);
+            sessionStorage.setItem(ROBOT_STATUS_KEY, JSON.stringify({ at: Date.now(), data: data }));
+            renderRobotStatus(data);
         }
     } catch (error) {
         console.error('Erreur chargement statut robot:', error);
@@ -0,0 +1,244 @@
+"""
+Série temporelle de télémétrie des robots (batterie, position, activité)
+
+La table robots ne garde que le dernier état ; chaque échantillon est conservé ici :
+
+    robot_telemetry      échantillons bruts, horodatage en millisecondes
+    robot_telemetry_1m   agrégats par minute
+    robot_telemetry_1h   agrégats par heure
+
+Les tables sont WITHOUT ROWID avec (user_id, horodatage) pour clé primaire : les lignes
+d'un robot sont contiguës sur disque et une requête de plage est un simple parcours de clé.
+Les agrégats sont mis à jour à chaque ingestion (sommes, min/max, dernière position),
+sans tâche de fond. La rétention supprime les vieilles lignes de chaque résolution, au
+plus une fois par RETENTION_INTERVAL_S.
+"""
+import math
+import os
+import threading
+import time
+
+# Rétention par résolution (jours)
+RAW_RETENTION_DAYS = float(os.environ.get('WASTEAI_TELEMETRY_RAW_DAYS', 2))
+MINUTE_RETENTION_DAYS = float(os.environ.get('WASTEAI_TELEMETRY_MINUTE_DAYS', 30))
+HOUR_RETENTION_DAYS = float(os.environ.get('WASTEAI_TELEMETRY_HOUR_DAYS', 365))
+RETENTION_INTERVAL_S = 600
+
+MAX_BATCH = 5000    # Échantillons par requête d'ingestion
+MAX_POINTS = 1500   # Points visés par une requête de plage (choix de la résolution)
+
+# résolution -> (table, largeur d'un point en ms)
+RESOLUTIONS = {
+    'raw': ('robot_telemetry', 1),
+    'minute': ('robot_telemetry_1m', 60_000),
+    'hour': ('robot_telemetry_1h', 3_600_000)
+}
+
+_DAY_MS = 86_400_000
+_last_retention = 0.0
+_retention_lock = threading.Lock()
+
+def init_telemetry_db(c):
+    """Créer les tables de télémétrie (appelé par init_db)"""
+    c.execute('''CREATE TABLE IF NOT EXISTS robot_telemetry
+                 (user_id INTEGER NOT NULL,
+                  ts INTEGER NOT NULL,
+                  battery REAL,
+                  lat REAL,
+                  lon REAL,
+                  is_active INTEGER,
+                  PRIMARY KEY (user_id, ts)) WITHOUT ROWID''')
+    for table in ('robot_telemetry_1m', 'robot_telemetry_1h'):
+        # battery_sum / active_count : agrégats additifs, la moyenne se calcule à la lecture
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {table}
+                      (user_id INTEGER NOT NULL,
+                       bucket INTEGER NOT NULL,
+                       samples INTEGER NOT NULL,
+                       battery_sum REAL,
+                       battery_count INTEGER,
+                       battery_min REAL,
+                       battery_max REAL,
+                       active_count INTEGER,
+                       last_ts INTEGER,
+                       lat REAL,
+                       lon REAL,
+                       PRIMARY KEY (user_id, bucket)) WITHOUT ROWID''')
+
+# ==================== INGESTION ====================
+
+def _number(value, low=None, high=None):
+    if value is None:
+        return None
+    value = float(value)
+    if not math.isfinite(value) or (low is not None and not low <= value <= high):
+        raise ValueError(value)
+    return value
+
+def parse_samples(samples, now_ms=None):
+    """Valider un lot d'échantillons, retourne des tuples (ts, battery, lat, lon, is_active)
+
+    `ts` en secondes ou millisecondes epoch (défaut : maintenant). Lève ValueError avec
+    l'index du premier échantillon invalide.
+    """
+    if not isinstance(samples, list) or not samples:
+        raise ValueError("samples doit être une liste non vide")
+    if len(samples) > MAX_BATCH:
+        raise ValueError(f"Au plus {MAX_BATCH} échantillons par lot")
+    now_ms = now_ms or int(time.time() * 1000)
+    rows = []
+    for i, sample in enumerate(samples):
+        try:
+            ts = sample.get('ts')
+            if ts is None:
+                ts = now_ms
+            else:
+                ts = float(ts)
+                # Un horodatage en secondes est < 10^11 jusqu'en 5138
+                ts = int(ts * 1000 if ts < 1e11 else ts)
+            is_active = sample.get('is_active')
+            rows.append((
+                ts,
+                _number(sample.get('battery'), 0, 100),
+                _number(sample.get('lat'), -90, 90),
+                _number(sample.get('lon'), -180, 180),
+                None if is_active is None else int(bool(is_active))
+            ))
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            raise ValueError(f"Échantillon {i} invalide")
+    return rows
+
+def _rollup(rows, width_ms):
+    """Agréger un lot par intervalle de `width_ms` (même forme que les tables d'agrégats)"""
+    buckets = {}
+    for ts, battery, lat, lon, is_active in rows:
+        bucket = ts - ts % width_ms
+        agg = buckets.get(bucket)
+        if agg is None:
+            agg = buckets[bucket] = [0, 0.0, 0, None, None, 0, None, None, None]
+        agg[0] += 1
+        if battery is not None:
+            agg[1] += battery
+            agg[2] += 1
+            agg[3] = battery if agg[3] is None else min(agg[3], battery)
+            agg[4] = battery if agg[4] is None else max(agg[4], battery)
+        agg[5] += is_active or 0
+        if lat is not None and (agg[6] is None or ts >= agg[6]):
+            agg[6], agg[7], agg[8] = ts, lat, lon
+    return buckets
+
+def ingest(conn, user_id, rows):
+    """Enregistrer un lot validé et mettre à jour les agrégats, dans une seule transaction
+
+    Un échantillon déjà reçu (même horodatage) est ignoré : un robot qui renvoie son lot
+    après un timeout ne fausse pas les agrégats.
+    """
+    c = conn.cursor()
+    # Verrou d'écriture dès la lecture des doublons : deux lots concurrents du même robot
+    # ne peuvent pas agréger deux fois le même échantillon
+    c.execute('BEGIN IMMEDIATE')
+    c.execute('SELECT ts FROM robot_telemetry WHERE user_id = ? AND ts BETWEEN ? AND ?',
+              (user_id, min(row[0] for row in rows), max(row[0] for row in rows)))
+    seen = {row[0] for row in c.fetchall()}
+    fresh = []
+    for row in rows:
+        if row[0] not in seen:
+            seen.add(row[0])
+            fresh.append(row)
+    rows = fresh
+    c.executemany('''INSERT INTO robot_telemetry (user_id, ts, battery, lat, lon, is_active)
+                     VALUES (?, ?, ?, ?, ?, ?)''',
+                  [(user_id, *row) for row in rows])
+
+    for resolution in ('minute', 'hour'):
+        table, width_ms = RESOLUTIONS[resolution]
+        c.executemany(f'''INSERT INTO {table} (user_id, bucket, samples, battery_sum, battery_count,
+                                               battery_min, battery_max, active_count, last_ts, lat, lon)
+                          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                          ON CONFLICT (user_id, bucket) DO UPDATE SET
+                              samples = samples + excluded.samples,
+                              battery_sum = battery_sum + excluded.battery_sum,
+                              battery_count = battery_count + excluded.battery_count,
+                              battery_min = MIN(COALESCE(battery_min, excluded.battery_min), COALESCE(excluded.battery_min, battery_min)),
+                              battery_max = MAX(COALESCE(battery_max, excluded.battery_max), COALESCE(excluded.battery_max, battery_max)),
+                              active_count = active_count + excluded.active_count,
+                              lat = CASE WHEN excluded.last_ts >= COALESCE(last_ts, 0) THEN excluded.lat ELSE lat END,
+                              lon = CASE WHEN excluded.last_ts >= COALESCE(last_ts, 0) THEN excluded.lon ELSE lon END,
+                              last_ts = MAX(COALESCE(last_ts, 0), COALESCE(excluded.last_ts, 0))''',
+                      [(user_id, bucket, *agg) for bucket, agg in _rollup(rows, width_ms).items()])
+    conn.commit()
+    return len(rows)
+
+# ==================== RÉTENTION ====================
+
+def apply_retention(conn, now_ms=None):
+    """Supprimer les lignes plus vieilles que la rétention de leur résolution"""
+    now_ms = now_ms or int(time.time() * 1000)
+    c = conn.cursor()
+    deleted = 0
+    for (table, _), days in zip(RESOLUTIONS.values(), (RAW_RETENTION_DAYS, MINUTE_RETENTION_DAYS, HOUR_RETENTION_DAYS)):
+        column = 'ts' if table == 'robot_telemetry' else 'bucket'
+        c.execute(f'DELETE FROM {table} WHERE {column} < ?', (now_ms - int(days * _DAY_MS),))
+        deleted += c.rowcount
+    conn.commit()
+    return deleted
+
+def maybe_apply_retention(conn):
+    """Rétention déclenchée par l'ingestion, au plus une fois par RETENTION_INTERVAL_S"""
+    global _last_retention
+    with _retention_lock:
+        if time.monotonic() - _last_retention < RETENTION_INTERVAL_S:
+            return 0
+        _last_retention = time.monotonic()
+    return apply_retention(conn)
+
+# ==================== LECTURE ====================
+
+def pick_resolution(start_ms, end_ms, now_ms=None):
+    """Résolution la plus fine qui reste sous MAX_POINTS et dans sa rétention"""
+    now_ms = now_ms or int(time.time() * 1000)
+    span = end_ms - start_ms
+    # Brut : supposé à 1 Hz au plus
+    if span <= MAX_POINTS * 1000 and start_ms >= now_ms - RAW_RETENTION_DAYS * _DAY_MS:
+        return 'raw'
+    if span <= MAX_POINTS * RESOLUTIONS['minute'][1] and start_ms >= now_ms - MINUTE_RETENTION_DAYS * _DAY_MS:
+        return 'minute'
+    return 'hour'
+
+def query_range(conn, user_id, start_ms, end_ms, resolution=None):
+    """Points de [start_ms, end_ms] à la résolution demandée (ou choisie automatiquement)"""
+    resolution = resolution or pick_resolution(start_ms, end_ms)
+    table, _ = RESOLUTIONS[resolution]
+    c = conn.cursor()
+    if resolution == 'raw':
+        c.execute('''SELECT ts, battery, battery, battery, lat, lon, is_active, 1 FROM robot_telemetry
+                     WHERE user_id = ? AND ts BETWEEN ? AND ? ORDER BY ts''', (user_id, start_ms, end_ms))
+    else:
+        c.execute(f'''SELECT bucket, battery_sum / NULLIF(battery_count, 0), battery_min, battery_max,
+                             lat, lon, CAST(active_count AS REAL) / samples, samples
+                      FROM {table} WHERE user_id = ? AND bucket BETWEEN ? AND ? ORDER BY bucket''',
+                  (user_id, start_ms - start_ms % RESOLUTIONS[resolution][1], end_ms))
+    points = [{
+        'ts': row[0],
+        'battery': round(row[1], 2) if row[1] is not None else None,
+        'battery_min': row[2],
+        'battery_max': row[3],
+        'lat': row[4],
+        'lon': row[5],
+        'active': row[6],
+        'samples': row[7]
+    } for row in c.fetchall()]
+    return resolution, points
+
+def latest(conn, user_id):
+    """Dernier échantillon brut du robot, None s'il n'a jamais envoyé de télémétrie"""
+    c = conn.cursor()
+    c.execute('''SELECT ts, battery, lat, lon, is_active FROM robot_telemetry
+                 WHERE user_id = ? ORDER BY ts DESC LIMIT 1''', (user_id,))
+    row = c.fetchone()
+    if row is None:
+        return None
+    return {'ts': row[0], 'battery': row[1], 'lat': row[2], 'lon': row[3], 'is_active': row[4]}
+
+def delete_user_telemetry(c, user_id):
+    for table, _ in RESOLUTIONS.values():
+        c.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
@@ -0,0 +1,219 @@
+"""
+Budget de threads CPU : torch, onnxruntime, OpenCV et affinité des workers
+
+Par défaut torch, OpenCV et onnxruntime prennent chacun tous les cœurs ; avec les threads
+de requêtes et les workers caméra, la machine est sursouscrite et la latence d'inférence
+double sous charge. Le budget fixe un nombre de threads par bibliothèque et, si demandé,
+réserve des cœurs aux workers caméra et à l'inférence.
+
+Calibration (mesure WasteDetector sur plusieurs répartitions et retient la meilleure) :
+
+    python thread_budget.py --calibrate --model my_model.pt
+
+Le résultat est enregistré par nom d'hôte dans WASTEAI_THREAD_BUDGET
+(défaut models/thread_budget.json) et appliqué au démarrage de app.py, serve.py et
+inference_server.py.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import cv2
+
+THREAD_BUDGET_PATH = os.environ.get('WASTEAI_THREAD_BUDGET',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'thread_budget.json'))
+
+# inference_threads : threads intra-op torch/onnxruntime ; interop_threads : pool inter-op torch ;
+# opencv_threads : pool OpenCV (décodage, redimensionnement, JPEG) ;
+# camera_cpus / inference_cpus : cœurs réservés (affinité), None = pas d'affinité
+ThreadBudget = namedtuple('ThreadBudget', ['inference_threads', 'interop_threads', 'opencv_threads',
+                                           'camera_cpus', 'inference_cpus'],
+                          defaults=(None, None))
+
+def cpu_count():
+    """Cœurs utilisables par ce processus (affinité héritée comprise)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def default_budget():
+    """Répartition sans calibration : un cœur pour OpenCV et la caméra, le reste à l'inférence"""
+    cpus = cpu_count()
+    return ThreadBudget(inference_threads=max(1, cpus - 1), interop_threads=1, opencv_threads=1)
+
+def _read_profiles(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def load_budget(path=THREAD_BUDGET_PATH, host=None):
+    """Budget calibré pour cet hôte, sinon la répartition par défaut"""
+    try:
+        entry = _read_profiles(path).get(host or socket.gethostname())
+        if entry:
+            return ThreadBudget(**entry['budget'])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ Budget de threads ignoré ({path}): {e}")
+    return default_budget()
+
+def save_budget(budget, measurements, path=THREAD_BUDGET_PATH, host=None):
+    """Enregistrer le budget de l'hôte sans toucher aux profils des autres machines"""
+    profiles = _read_profiles(path)
+    profiles[host or socket.gethostname()] = {
+        'cpu_count': cpu_count(),
+        'budget': budget._asdict(),
+        'measurements': measurements
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, indent=2, ensure_ascii=False)
+    print(f"💾 Budget de threads enregistré pour {host or socket.gethostname()}: {path}")
+
+# ==================== APPLICATION ====================
+
+def apply_budget(budget):
+    """Appliquer le budget au processus courant
+
+    Les variables d'environnement doivent précéder l'import de torch (pool OpenMP) ; si torch
+    est déjà importé, ses réglages sont appliqués directement. OMP_NUM_THREADS et
+    MKL_NUM_THREADS déjà définis par l'opérateur sont conservés.
+    """
+    # Un réglage explicite de l'opérateur l'emporte sur le budget calibré
+    threads = int(os.environ.setdefault('OMP_NUM_THREADS', str(budget.inference_threads)))
+    os.environ.setdefault('MKL_NUM_THREADS', str(threads))
+    cv2.setNumThreads(budget.opencv_threads)
+
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(budget.interop_threads)
+        except RuntimeError:
+            # Le pool inter-op ne se redimensionne plus après le premier travail parallèle
+            pass
+
+def pin_current_thread(cpus):
+    """Restreindre le thread appelant aux cœurs `cpus` (Linux ; sans effet ailleurs)"""
+    if not cpus or not hasattr(os, 'sched_setaffinity'):
+        return False
+    try:
+        # Sous Linux, l'identifiant natif d'un thread est accepté comme pid
+        os.sched_setaffinity(threading.get_native_id(), cpus)
+        return True
+    except OSError as e:
+        print(f"⚠️ Affinité CPU {cpus} refusée: {e}")
+        return False
+
+@contextmanager
+def pinned(cpus):
+    """Exécuter un bloc sur les cœurs `cpus`, puis rendre au thread son affinité d'origine
+
+    Les threads OpenMP de torch sont créés à la première inférence d'un thread et héritent de
+    son affinité à cet instant : une inférence lancée depuis un thread caméra ou un thread de
+    requête passe par ce bloc pour que son équipe OpenMP tourne sur les cœurs d'inférence.
+    """
+    if not cpus or not hasattr(os, 'sched_getaffinity'):
+        yield
+        return
+    native_id = threading.get_native_id()
+    previous = os.sched_getaffinity(native_id)
+    if previous == set(cpus) or not pin_current_thread(cpus):
+        yield
+        return
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(native_id, previous)
+
+def apply_onnx_threads(detector, threads):
+    """Recréer la session onnxruntime d'un modèle ONNX avec `threads` threads intra-op
+
+    ultralytics ouvre la session avec les réglages par défaut (tous les cœurs) ; à appeler
+    après la première inférence, quand la session existe.
+    """
+    backend = getattr(getattr(detector.model, 'predictor', None), 'model', None)
+    session = getattr(backend, 'session', None)
+    if session is None:
+        return False
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    backend.session = onnxruntime.InferenceSession(session._model_path, sess_options=options,
+                                                   providers=session.get_providers())
+    return True
+
+# ==================== CALIBRATION ====================
+
+def candidate_budgets(cpus):
+    """Répartitions à mesurer : puissances de 2 pour l'inférence, OpenCV à 1 ou partagé"""
+    counts = sorted({1, 2, 4, 8, 16, cpus} & set(range(1, cpus + 1)))
+    budgets = []
+    for inference in counts:
+        for opencv in sorted({1, max(1, cpus - inference)}):
+            budgets.append(ThreadBudget(inference_threads=inference, interop_threads=1, opencv_threads=opencv))
+    return budgets
+
+def calibrate(model, images, iterations=20, warmup=3, imgsz=640):
+    """Mesurer detect_from_frame pour chaque répartition, retourne (meilleur budget, mesures)"""
+    from benchmarks.bench_inference import run_isolated
+
+    measurements = []
+    for budget in candidate_budgets(cpu_count()):
+        config = {
+            'model': model, 'images': images, 'method': 'frame', 'batch': 1, 'imgsz': imgsz,
+            'threads': budget.inference_threads, 'opencv_threads': budget.opencv_threads,
+            'interop_threads': budget.interop_threads, 'warmup': warmup, 'iterations': iterations
+        }
+        result = run_isolated(config)
+        measurements.append({'budget': budget._asdict(), 'p50_ms': result['warm']['p50_ms'],
+                             'p95_ms': result['warm']['p95_ms']})
+        print(f"⏱️ inférence {budget.inference_threads:>2} | OpenCV {budget.opencv_threads:>2} "
+              f"| p50 {result['warm']['p50_ms']:>8.1f} ms | p95 {result['warm']['p95_ms']:>8.1f} ms")
+
+    # p95 d'abord : c'est la latence de queue qui double quand la machine est sursouscrite
+    best = min(measurements, key=lambda m: (m['p95_ms'], m['p50_ms']))
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(cpu_count()))
+    budget = ThreadBudget(**best['budget'])
+    if budget.inference_threads < len(cores):
+        # Les premiers cœurs à l'inférence, les suivants aux workers caméra
+        budget = budget._replace(inference_cpus=cores[:budget.inference_threads],
+                                 camera_cpus=cores[budget.inference_threads:])
+    return budget, measurements
+
+def main():
+    from benchmarks.bench_inference import DEFAULT_IMAGES
+
+    parser = argparse.ArgumentParser(description="Budget de threads CPU de WasteAI")
+    parser.add_argument('--calibrate', action='store_true', help="Mesurer les répartitions et enregistrer la meilleure")
+    parser.add_argument('--model', default=None, help="Modèle à mesurer (défaut: MODEL_PATH)")
+    parser.add_argument('--images', nargs='+', default=DEFAULT_IMAGES)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--no-affinity', dest='affinity', action='store_false',
+                        help="Ne pas réserver de cœurs aux workers caméra et à l'inférence")
+    parser.add_argument('--path', default=THREAD_BUDGET_PATH)
+    args = parser.parse_args()
+
+    if not args.calibrate:
+        print(f"🧵 {socket.gethostname()} ({cpu_count()} cœurs): {load_budget(args.path)}")
+        return
+
+    if args.model is None:
+        from yolo_detector import MODEL_PATH
+        args.model = MODEL_PATH
+    budget, measurements = calibrate(args.model, args.images, args.iterations)
+    if not args.affinity:
+        budget = budget._replace(camera_cpus=None, inference_cpus=None)
+    print(f"✅ Meilleure répartition: {budget}")
+    save_budget(budget, measurements, args.path)
+
+if __name__ == '__main__':
+    main()
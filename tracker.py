@@ -0,0 +1,125 @@
+"""
+Suivi d'objets entre frames (association IoU en deux passes, à la ByteTrack)
+
+Une bouteille qui reste 10 frames dans le champ ne doit compter qu'une fois : chaque objet
+reçoit un identifiant de piste persistant et seules les nouvelles pistes sont comptées.
+
+À chaque frame inférée :
+1. les boîtes des pistes sont extrapolées (vitesse moyenne) ;
+2. les détections sûres (score >= high_threshold) sont associées aux pistes par IoU ;
+3. les détections faibles servent seulement à prolonger les pistes restantes (un objet
+   partiellement masqué garde son identifiant au lieu d'être recompté) ;
+4. une détection sûre non associée ouvre une piste provisoire, confirmée après `min_hits`
+   associations : c'est à ce moment qu'elle est comptée ;
+5. une piste sans détection pendant `max_age` frames est abandonnée.
+
+Toutes les pistes sont stockées dans des tableaux NumPy ; l'association est gloutonne sur
+la matrice d'IoU (par IoU décroissante), sans dépendance à scipy.
+"""
+import numpy as np
+
+from box_ops import box_iou
+
+class IoUTracker:
+    def __init__(self, high_threshold=0.5, low_threshold=0.1, match_iou=0.3,
+                 min_hits=2, max_age=15):
+        self.high_threshold = high_threshold
+        self.low_threshold = low_threshold
+        self.match_iou = match_iou
+        self.min_hits = min_hits
+        self.max_age = max_age
+        self.next_id = 1
+        self.reset()
+
+    def reset(self):
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocity = np.zeros((0, 4), dtype=np.float32)
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.age = np.zeros(0, dtype=np.int64)  # frames depuis la dernière association
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _match(self, tracks, boxes, classes, track_boxes):
+        """Association gloutonne par IoU décroissante, même classe uniquement
+
+        Retourne (indices de pistes, indices de détections) appariés.
+        """
+        if len(tracks) == 0 or len(boxes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        iou = box_iou(track_boxes[tracks], boxes)
+        iou[self.classes[tracks][:, None] != classes[None, :]] = 0
+        rows, cols = np.nonzero(iou >= self.match_iou)
+        order = np.argsort(-iou[rows, cols], kind='stable')
+        matched_tracks, matched_dets = [], []
+        used_tracks, used_dets = set(), set()
+        for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+            if row not in used_tracks and col not in used_dets:
+                used_tracks.add(row)
+                used_dets.add(col)
+                matched_tracks.append(row)
+                matched_dets.append(col)
+        return tracks[matched_tracks], np.array(matched_dets, dtype=np.int64)
+
+    def update(self, boxes, scores, classes):
+        """Intégrer les détections d'une frame
+
+        Retourne (identifiant de piste par détection, -1 si aucune ; classes des pistes
+        confirmées à cette frame, à compter).
+        """
+        track_ids = np.full(len(boxes), -1, dtype=np.int64)
+        # Position attendue des pistes à cette frame
+        predicted = self.boxes + self.velocity * (self.age[:, None] + 1)
+
+        high = np.nonzero(scores >= self.high_threshold)[0]
+        low = np.nonzero((scores >= self.low_threshold) & (scores < self.high_threshold))[0]
+
+        all_tracks = np.arange(len(self.ids))
+        t_high, d_high = self._match(all_tracks, boxes[high], classes[high], predicted)
+        d_high = high[d_high]
+        remaining = np.setdiff1d(all_tracks, t_high)
+        t_low, d_low = self._match(remaining, boxes[low], classes[low], predicted)
+        d_low = low[d_low]
+
+        matched_tracks = np.concatenate([t_high, t_low])
+        matched_dets = np.concatenate([d_high, d_low])
+
+        # Mise à jour des pistes associées (vitesse lissée par frame écoulée)
+        if len(matched_tracks):
+            elapsed = (self.age[matched_tracks] + 1)[:, None]
+            step = (boxes[matched_dets] - self.boxes[matched_tracks]) / elapsed
+            self.velocity[matched_tracks] = 0.5 * self.velocity[matched_tracks] + 0.5 * step
+            self.boxes[matched_tracks] = boxes[matched_dets]
+            self.hits[matched_tracks] += 1
+            self.age[matched_tracks] = 0
+        self.age[np.setdiff1d(all_tracks, matched_tracks)] += 1
+
+        confirmed = matched_tracks[self.hits[matched_tracks] == self.min_hits]
+        counted = self.classes[confirmed].tolist()
+        track_ids[matched_dets] = self.ids[matched_tracks]
+
+        # Nouvelles pistes provisoires pour les détections sûres non associées
+        new = np.setdiff1d(high, d_high)
+        if len(new):
+            new_ids = np.arange(self.next_id, self.next_id + len(new))
+            self.next_id += len(new)
+            self.boxes = np.concatenate([self.boxes, boxes[new]])
+            self.velocity = np.concatenate([self.velocity, np.zeros((len(new), 4), dtype=np.float32)])
+            self.classes = np.concatenate([self.classes, classes[new]])
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.hits = np.concatenate([self.hits, np.ones(len(new), dtype=np.int64)])
+            self.age = np.concatenate([self.age, np.zeros(len(new), dtype=np.int64)])
+            track_ids[new] = new_ids
+            if self.min_hits <= 1:
+                counted += classes[new].tolist()
+
+        # Abandon des pistes perdues
+        alive = self.age <= self.max_age
+        if not alive.all():
+            self.boxes, self.velocity = self.boxes[alive], self.velocity[alive]
+            self.classes, self.ids = self.classes[alive], self.ids[alive]
+            self.hits, self.age = self.hits[alive], self.age[alive]
+
+        return track_ids, counted
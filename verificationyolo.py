@@ -13,7 +13,7 @@ try:
     image_path = None
     for file in os.listdir('.'):
         if file.endswith(('.jpg', '.png', '.jpeg')):
-            image_path = test.jpg
+            image_path = file
             break
     
     if not image_path:
@@ -3,20 +3,43 @@ import numpy as np
 from datetime import datetime
 import sqlite3
 import os
+import gc
+import queue
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+import http_cache
+import metrics
+from box_ops import nms
+from thread_budget import pin_current_thread, pinned
 
 # Fix pour certaines erreurs de DLL sur Windows
 os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
 
-try:
-    from ultralytics import YOLO
-    TORCH_AVAILABLE = True
-except Exception as e:
-    print(f"⚠️ Ultralytics non disponible: {e}")
-    TORCH_AVAILABLE = False
+# Ultralytics (et donc torch) n'est importé qu'au premier chargement d'un modèle :
+# les routes qui n'ont pas besoin de YOLO ne paient pas le démarrage de torch.
+YOLO = None
+TORCH_AVAILABLE = None  # None = pas encore essayé
+
+def import_yolo():
+    """Importer ultralytics à la demande, retourne la classe YOLO ou None"""
+    global YOLO, TORCH_AVAILABLE
+    if TORCH_AVAILABLE is None:
+        try:
+            from ultralytics import YOLO as _YOLO
+            YOLO = _YOLO
+            TORCH_AVAILABLE = True
+        except Exception as e:
+            print(f"⚠️ Ultralytics non disponible: {e}")
+            TORCH_AVAILABLE = False
+    return YOLO
 
 # ==================== CONFIGURATION ====================
 
-MODEL_PATH = 'my_model.pt'
+# Poids PyTorch (.pt) ou export ONNX (.onnx, éventuellement quantifié INT8)
+MODEL_PATH = os.environ.get('WASTEAI_MODEL_PATH', 'my_model.pt')
 
 WASTE_CLASSES = {
     0: 'Papier',
@@ -27,27 +50,215 @@ WASTE_CLASSES = {
 }
 
 CONFIDENCE_THRESHOLD = 0.5
-DB_PATH = 'waste.db'
+DB_PATH = os.environ.get('WASTEAI_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'waste.db'))
+
+# Taille d'entrée du modèle (côté le plus long, en pixels)
+IMG_SIZE = 640
+
+# Inférence par tuiles pour les photos haute résolution (4K des robots) : les petits
+# objets restent visibles au lieu de disparaître dans la réduction à IMG_SIZE
+SLICE_SIZE = 640        # côté d'une tuile en pixels de l'image source
+SLICE_OVERLAP = 0.2     # recouvrement entre tuiles voisines (fraction de SLICE_SIZE)
+SLICE_MIN_SIDE = 1920   # en mode automatique, seules les images plus grandes sont découpées
+SLICE_BATCH = 8         # tuiles par appel au modèle
+SLICE_NMS_THRESHOLD = 0.5
+
+# ==================== OPTIONS D'INFÉRENCE ====================
+
+IOU_THRESHOLD = 0.7     # IoU de la NMS (défaut ultralytics)
+MAX_DET = 300           # boîtes max par image (défaut ultralytics)
+
+# Options d'un appel au modèle ; classes = tuple d'indices filtrés avant la NMS, None = toutes.
+# imgsz None = taille d'entrée du détecteur. Hashable : sert de clé de regroupement et de cache.
+InferenceOptions = namedtuple('InferenceOptions', ['conf', 'iou', 'classes', 'imgsz', 'max_det'],
+                              defaults=(CONFIDENCE_THRESHOLD, IOU_THRESHOLD, None, None, MAX_DET))
+DEFAULT_OPTIONS = InferenceOptions()
+
+# Tailles d'entrée préchauffées au chargement (échelle du contrôleur de latence)
+WARM_IMG_SIZES = (640, 512, 416, 320)
+
+def _bounded(name, value, cast, low, high):
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} invalide: {value!r}")
+    if not low <= value <= high:
+        raise ValueError(f"{name} doit être entre {low} et {high}")
+    return value
+
+@lru_cache(maxsize=256)
+def _parse_options(conf, iou, classes, imgsz, max_det):
+    options = {}
+    if conf is not None:
+        options['conf'] = _bounded('conf', conf, float, 0.01, 1.0)
+    if iou is not None:
+        options['iou'] = _bounded('iou', iou, float, 0.05, 1.0)
+    if imgsz is not None:
+        imgsz = _bounded('imgsz', imgsz, int, 160, 1280)
+        if imgsz % 32:
+            raise ValueError("imgsz doit être un multiple de 32")
+        options['imgsz'] = imgsz
+    if max_det is not None:
+        options['max_det'] = _bounded('max_det', max_det, int, 1, 1000)
+    if classes:
+        names = {name.lower(): index for index, name in WASTE_CLASSES.items()}
+        selected = set()
+        for item in str(classes).split(','):
+            item = item.strip()
+            if item.isdigit() and int(item) in WASTE_CLASSES:
+                selected.add(int(item))
+            elif item.lower() in names:
+                selected.add(names[item.lower()])
+            elif item:
+                raise ValueError(f"Classe inconnue: {item}")
+        options['classes'] = tuple(sorted(selected)) or None
+    return DEFAULT_OPTIONS._replace(**options)
+
+def parse_inference_options(values):
+    """Valider conf, iou, classes, imgsz et max_det depuis un dict (formulaire, JSON)
+
+    `classes` : indices ou noms séparés par des virgules ("Plastique,Métal" ou "1,2").
+    Lève ValueError avec un message lisible. Les jeux d'options déjà validés sont servis
+    par un cache LRU : les clients réguliers ne repayent pas la validation.
+    """
+    def raw(key):
+        value = values.get(key)
+        if isinstance(value, (list, tuple)):
+            value = ','.join(str(v) for v in value)
+        return None if value in (None, '') else str(value)
+    return _parse_options(raw('conf'), raw('iou'), raw('classes'), raw('imgsz'), raw('max_det'))
 
 # ==================== CLASSE DÉTECTEUR YOLO ====================
 
+def tile_grid(width, height, size=SLICE_SIZE, overlap=SLICE_OVERLAP):
+    """Origines (x, y) des tuiles couvrant l'image, la dernière collée au bord"""
+    def starts(length):
+        if length <= size:
+            return [0]
+        stride = max(1, int(size * (1 - overlap)))
+        positions = list(range(0, length - size, stride))
+        return positions + [length - size]
+    return [(x, y) for y in starts(height) for x in starts(width)]
+
+def _result_arrays(result):
+    """Convertir un résultat ultralytics en tableaux NumPy (boxes xyxy, scores, classes)"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+    return (boxes.xyxy.cpu().numpy().astype(np.float32),
+            boxes.conf.cpu().numpy().astype(np.float32),
+            boxes.cls.cpu().numpy().astype(np.int64))
+
 class WasteDetector:
+    # Cœurs d'inférence (thread_budget) : chaque appel du modèle y est exécuté, quel que
+    # soit le thread appelant (requête, caméra) ; fixé par ModelLoader
+    inference_cpus = None
+    
     def __init__(self, model_path=MODEL_PATH):
         """Initialiser le modèle YOLO"""
-        if not TORCH_AVAILABLE:
+        self.model_path = model_path
+        self.imgsz = IMG_SIZE
+        if import_yolo() is None:
             print("❌ YOLO/PyTorch non disponible")
             self.model = None
             return
         
         try:
-            self.model = YOLO(model_path)
+            if model_path.endswith('.onnx'):
+                # Les exports ONNX ne portent pas toujours la tâche dans leurs métadonnées
+                self.model = YOLO(model_path, task='detect')
+            else:
+                self.model = YOLO(model_path)
             print(f"✅ Modèle YOLO chargé: {model_path}")
         except Exception as e:
             print(f"❌ Erreur chargement modèle: {e}")
             self.model = None
     
-    def detect_from_image(self, image_path):
-        """Détecter les déchets dans une image"""
+    def warmup(self, sizes=WARM_IMG_SIZES):
+        """Lancer des inférences factices pour initialiser les poids et les noyaux
+
+        Une passe par taille d'entrée courante : le premier changement de résolution
+        (contrôleur de latence, option imgsz) ne paie pas d'initialisation.
+        """
+        if not self.model:
+            return False
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        self._infer([dummy], DEFAULT_OPTIONS, 'warmup')
+        threads = int(os.environ.get('OMP_NUM_THREADS', 0))
+        if self.model_path.endswith('.onnx') and threads:
+            # onnxruntime ignore OMP_NUM_THREADS : session recréée au budget du processus
+            from thread_budget import apply_onnx_threads
+            if apply_onnx_threads(self, threads):
+                self._infer([dummy], DEFAULT_OPTIONS, 'warmup')
+        if not self.model_path.endswith('.onnx'):
+            # Un export ONNX statique n'accepte que sa propre taille d'entrée
+            for imgsz in sizes:
+                if imgsz != self.imgsz:
+                    self._infer([dummy], DEFAULT_OPTIONS._replace(imgsz=imgsz), 'warmup')
+        return True
+    
+    def _infer(self, images, options, method):
+        """Inférence sur une liste d'images BGR, un tuple (boxes, scores, classes) par image
+
+        Point unique d'appel du modèle : les sous-classes (client distant) le remplacent.
+        `options` (InferenceOptions) est transmis à ultralytics, qui applique le filtre
+        de classes avant la NMS.
+        """
+        with metrics.INFERENCE_SECONDS.time(method), pinned(self.inference_cpus):
+            results = self.model(images if len(images) > 1 else images[0],
+                                 conf=options.conf, iou=options.iou,
+                                 classes=list(options.classes) if options.classes else None,
+                                 imgsz=options.imgsz or self.imgsz, max_det=options.max_det, verbose=False)
+        return [_result_arrays(r) for r in results]
+    
+    def predict(self, image, conf=CONFIDENCE_THRESHOLD, options=None):
+        """Inférence brute : retourne (boxes xyxy Nx4, scores N, classes N) en NumPy"""
+        return self._infer([image], options or DEFAULT_OPTIONS._replace(conf=conf), 'predict')[0]
+    
+    def predict_batch(self, images, conf=CONFIDENCE_THRESHOLD, options=None):
+        """Inférence groupée sur une liste d'images, un tuple (boxes, scores, classes) par image"""
+        return self._infer(list(images), options or DEFAULT_OPTIONS._replace(conf=conf), 'predict_batch')
+    
+    def predict_sliced(self, image, options=DEFAULT_OPTIONS, size=SLICE_SIZE, overlap=SLICE_OVERLAP,
+                       full_image=True):
+        """Inférence par tuiles : mêmes tableaux que predict(), en coordonnées de l'image
+
+        Les tuiles passent par lots de SLICE_BATCH dans le modèle. Avec `full_image`, une
+        passe sur l'image réduite s'ajoute pour les objets plus grands qu'une tuile. Les
+        doublons aux jonctions sont fusionnés par une NMS en intersection sur la plus
+        petite boîte (un objet coupé par le bord d'une tuile est inclus dans sa version entière).
+        """
+        height, width = image.shape[:2]
+        origins = tile_grid(width, height, size, overlap)
+        tiles = [image[y:y + size, x:x + size] for x, y in origins]
+        
+        # Taille d'entrée du modèle = taille de tuile : aucune réduction des tuiles
+        tile_options = options._replace(imgsz=size)
+        results = []
+        for start in range(0, len(tiles), SLICE_BATCH):
+            results += self._infer(tiles[start:start + SLICE_BATCH], tile_options, 'sliced')
+        
+        offsets = np.array([[x, y, x, y] for x, y in origins], dtype=np.float32)
+        boxes = [r[0] + offset for r, offset in zip(results, offsets)]
+        scores = [r[1] for r in results]
+        classes = [r[2] for r in results]
+        if full_image:
+            full = self._infer([image], options, 'sliced')[0]
+            boxes.append(full[0])
+            scores.append(full[1])
+            classes.append(full[2])
+        
+        boxes, scores, classes = np.concatenate(boxes), np.concatenate(scores), np.concatenate(classes)
+        # Chaque tuile rend jusqu'à max_det boîtes : le résultat fusionné garde la même limite
+        keep = nms(boxes, scores, classes, SLICE_NMS_THRESHOLD, metric='ios')[:options.max_det]
+        return boxes[keep], scores[keep], classes[keep]
+    
+    def detect_from_image(self, image_path, sliced=None, options=DEFAULT_OPTIONS):
+        """Détecter les déchets dans une image
+
+        sliced : True/False pour forcer l'inférence par tuiles, None = automatique
+        selon SLICE_MIN_SIDE. options : InferenceOptions (voir parse_inference_options).
+        """
         if not self.model:
             return None, "Modèle non disponible"
         
@@ -58,86 +269,94 @@ class WasteDetector:
                 return None, "Erreur: Impossible de charger l'image"
             
             # Inférence YOLO
-            results = self.model(img, conf=CONFIDENCE_THRESHOLD, verbose=False)
+            if sliced is None:
+                sliced = max(img.shape[:2]) > SLICE_MIN_SIDE
+            if sliced:
+                results = self.predict_sliced(img, options)
+            else:
+                results = self._infer([img], options, 'image')[0]
+            boxes, scores, classes = results
             
             detections = []
+            for box, conf, cls in zip(boxes, scores.tolist(), classes.tolist()):
+                detections.append({
+                    'waste_type': WASTE_CLASSES.get(cls, f'Déchet_{cls}'),
+                    'confidence': conf,
+                    'box': box
+                })
             
-            # Traiter les résultats
-            for r in results:
-                boxes = r.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        try:
-                            cls = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            
-                            waste_type = WASTE_CLASSES.get(cls, f'Déchet_{cls}')
-                            
-                            detections.append({
-                                'waste_type': waste_type,
-                                'confidence': conf,
-                                'box': box.xyxy[0].cpu().numpy() if hasattr(box.xyxy[0], 'cpu') else box.xyxy[0]
-                            })
-                        except Exception as e:
-                            print(f"⚠️ Erreur traitement detection: {e}")
-                            continue
-            
+            # results : tableaux (boxes, scores, classes) de l'inférence
             return detections, results
         
         except Exception as e:
             print(f"❌ Erreur détection: {e}")
             return None, str(e)
     
-    def detect_from_frame(self, frame):
-        """Détecter les déchets dans une frame OpenCV"""
+    def infer_frame(self, frame, roi=None, options=DEFAULT_OPTIONS):
+        """Inférence sur une frame : (boxes, scores, classes) en coordonnées de la frame
+
+        Avec une `roi` (roi.RegionOfInterest), seule la zone utile est inférée et les
+        détections hors ROI sont écartées.
+        """
+        if roi is None:
+            return self._infer([frame], options, 'frame')[0]
+        region, origin = roi.crop(frame)
+        return roi.to_frame(*self._infer([region], options, 'frame')[0], origin)
+    
+    def detect_from_frame(self, frame, timings=None, roi=None):
+        """Détecter les déchets dans une frame OpenCV
+
+        Si `timings` (dict) est fourni, y ajoute les durées 'inference' et 'draw' en secondes.
+        Les détections hors `roi` ne sont ni dessinées ni comptées.
+        """
         if not self.model:
             return frame, {}
         
         try:
             # Inférence YOLO
-            results = self.model(frame, conf=CONFIDENCE_THRESHOLD, verbose=False)
+            started = time.perf_counter()
+            boxes, scores, classes = self.infer_frame(frame, roi)
+            inferred = time.perf_counter()
             
-            detections_summary = {}
+            if roi is not None:
+                roi.draw(frame)
+            detections_summary = self.draw_detections(frame, boxes, scores, classes)
             
-            # Traiter les résultats
-            for r in results:
-                boxes = r.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        try:
-                            cls = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            
-                            waste_type = WASTE_CLASSES.get(cls, f'Déchet_{cls}')
-                            
-                            if waste_type not in detections_summary:
-                                detections_summary[waste_type] = 0
-                            detections_summary[waste_type] += 1
-                            
-                            # Afficher les détections sur l'image
-                            try:
-                                x1, y1, x2, y2 = map(int, box.xyxy[0][:4])
-                                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                                label = f"{waste_type} {conf:.2f}"
-                                cv2.putText(frame, label, (x1, y1 - 10), 
-                                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                            except:
-                                pass
-                        except Exception as e:
-                            continue
-            
-            # Afficher le nombre de détections
-            try:
-                cv2.putText(frame, f"Detections: {sum(detections_summary.values())}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            except:
-                pass
+            if timings is not None:
+                timings['inference'] = inferred - started
+                timings['draw'] = time.perf_counter() - inferred
             
             return frame, detections_summary
         
         except Exception as e:
             print(f"❌ Erreur détection frame: {e}")
             return frame, {}
+    
+    def draw_detections(self, frame, boxes, scores, classes, track_ids=None):
+        """Dessiner les boîtes sur la frame et retourner le décompte par type de déchet
+
+        Avec `track_ids` (tracker.IoUTracker), l'identifiant de piste suit le libellé.
+        """
+        detections_summary = {}
+        if track_ids is None:
+            track_ids = np.full(len(boxes), -1)
+        
+        for (x1, y1, x2, y2), conf, cls, track_id in zip(boxes.astype(int).tolist(), scores.tolist(),
+                                                         classes.tolist(), track_ids.tolist()):
+            waste_type = WASTE_CLASSES.get(cls, f'Déchet_{cls}')
+            detections_summary[waste_type] = detections_summary.get(waste_type, 0) + 1
+            label = f"{waste_type} {conf:.2f}" if track_id < 0 else f"{waste_type} #{track_id} {conf:.2f}"
+            
+            # Afficher les détections sur l'image
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, label, (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        
+        # Afficher le nombre de détections
+        cv2.putText(frame, f"Detections: {sum(detections_summary.values())}", 
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+        
+        return detections_summary
 
     def detect_from_webcam(self, user_id, duration=10):
         """Détecter en temps réel depuis la webcam (Legacy - à supprimer si non utilisé)"""
@@ -147,7 +366,7 @@ class WasteDetector:
     def save_detections_to_db(self, user_id, detections_dict):
         """Enregistrer les détections dans la BD"""
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = sqlite3.connect(DB_PATH, factory=metrics.TimedConnection)
             c = conn.cursor()
             
             for waste_type, quantity in detections_dict.items():
@@ -156,20 +375,363 @@ class WasteDetector:
                             VALUES (?, ?, ?, ?)''',
                          (user_id, waste_type, quantity, datetime.now()))
             
+            http_cache.bump_versions(c, http_cache.detection_scopes(user_id))
             conn.commit()
             conn.close()
             
+            metrics.BUFFER_FLUSHES.inc()
+            metrics.BUFFER_FLUSH_SIZE.observe(sum(detections_dict.values()))
             print(f"✅ {len(detections_dict)} type(s) de déchet enregistré(s)")
             return True
         except Exception as e:
             print(f"❌ Erreur BD: {str(e)}")
             return False
 
+# ==================== CHARGEMENT DIFFÉRÉ ====================
+
+class ModelLoader:
+    """Charge et préchauffe un WasteDetector dans un thread d'arrière-plan
+
+    `factory` construit le détecteur à partir de `model_path` : WasteDetector par défaut,
+    inference_server.InferenceClient (model_path = adresse du serveur) en mode distant.
+    """
+    
+    def __init__(self, model_path=MODEL_PATH, factory=None, cpus=None):
+        self.model_path = model_path
+        self.factory = factory or WasteDetector
+        # Cœurs réservés à l'inférence (thread_budget) : le chargement et chaque inférence
+        # du détecteur (WasteDetector.inference_cpus) y sont exécutés
+        self.cpus = cpus
+        self.state = 'idle'  # idle -> loading -> ready | failed
+        self.error = None
+        self.detector = None
+        self.timings = {}
+        self.created_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Démarrer le chargement en arrière-plan (sans effet s'il est déjà lancé)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = 'loading'
+            self._thread = threading.Thread(target=self._load, name='yolo-warmup', daemon=True)
+            self._thread.start()
+    
+    def load(self):
+        """Charger de façon synchrone (déjà chargé = sans effet)"""
+        self.start()
+        self._ready.wait()
+        return self.detector
+    
+    def _load(self):
+        started = time.monotonic()
+        try:
+            pin_current_thread(self.cpus)
+            if self.factory is WasteDetector:
+                import_yolo()
+            imported = time.monotonic()
+            detector = self.factory(self.model_path)
+            detector.inference_cpus = self.cpus
+            loaded = time.monotonic()
+            if not detector.model:
+                raise RuntimeError(f"Modèle non disponible: {self.model_path}")
+            detector.warmup()
+            warmed = time.monotonic()
+            
+            self.timings = {
+                'import_s': round(imported - started, 3),
+                'load_s': round(loaded - imported, 3),
+                'warmup_s': round(warmed - loaded, 3),
+                'total_s': round(warmed - started, 3),
+                'cold_start_s': round(warmed - self.created_at, 3)
+            }
+            self.detector = detector
+            self.state = 'ready'
+            print(f"✅ Modèle prêt en {self.timings['total_s']}s "
+                  f"(import {self.timings['import_s']}s, chargement {self.timings['load_s']}s, "
+                  f"préchauffage {self.timings['warmup_s']}s)")
+        except Exception as e:
+            self.error = str(e)
+            self.state = 'failed'
+            self.timings = {'total_s': round(time.monotonic() - started, 3)}
+            print(f"❌ Echec du chargement du modèle: {e}")
+        finally:
+            self._ready.set()
+    
+    def get(self):
+        """Retourner le détecteur s'il est prêt, sinon lancer le chargement et retourner None"""
+        if self.state == 'ready':
+            return self.detector
+        if self.state == 'idle':
+            self.start()
+        return None
+    
+    def wait(self, timeout=None):
+        """Attendre la fin du chargement, retourne True si le modèle est prêt"""
+        self._ready.wait(timeout)
+        return self.state == 'ready'
+    
+    def status(self):
+        """État du chargement pour les sondes de santé"""
+        return {
+            'model_path': self.model_path,
+            'state': self.state,
+            'ready': self.state == 'ready',
+            'error': self.error,
+            'timings': self.timings
+        }
+
+# ==================== REGISTRE DE MODÈLES ====================
+
+# Plafond mémoire des modèles chargés (Mo) : au-delà, les moins récemment utilisés sont déchargés
+MODEL_MEMORY_CAP_MB = float(os.environ.get('WASTEAI_MODEL_MEMORY_CAP_MB', 1024))
+SHADOW_QUEUE_SIZE = 4   # inférences fantômes en attente avant abandon
+
+def _model_size_mb(detector):
+    """Mémoire estimée d'un modèle : paramètres torch, sinon taille du fichier"""
+    try:
+        parameters = detector.model.model.parameters()
+        return sum(p.numel() * p.element_size() for p in parameters) / 1e6
+    except Exception:
+        pass
+    if os.path.isfile(str(detector.model_path)):
+        return os.path.getsize(detector.model_path) / 1e6
+    return 0.0
+
+class ModelRegistry(WasteDetector):
+    """WasteDetector dont les inférences sont routées vers des modèles nommés et versionnés
+
+    Chaque modèle (clé "nom:version") est chargé et préchauffé par son propre ModelLoader,
+    en arrière-plan ; il ne remplace le modèle actif qu'une fois prêt, par une simple
+    affectation : les requêtes en cours terminent sur l'ancien modèle.
+
+    Le routage se fait dans _infer : toutes les méthodes héritées (detect_from_image,
+    infer_frame, predict_sliced...) en profitent. Un candidat peut recevoir un pourcentage
+    du trafic, soit en A/B (il répond à la place du modèle actif), soit en fantôme (il
+    rejoue la même entrée en arrière-plan, sa réponse est seulement mesurée).
+
+    Chaque processus a son propre registre : avec serve.py, l'appel d'administration ne
+    concerne que le worker qui le reçoit (préférer alors le serveur d'inférence).
+    """
+    
+    def __init__(self, memory_cap_mb=MODEL_MEMORY_CAP_MB, factory=None, cpus=None):
+        self.factory = factory
+        self.cpus = cpus
+        self.memory_cap_mb = memory_cap_mb
+        self.loaders = {}       # clé -> ModelLoader
+        self.info = {}          # clé -> {'name', 'version', 'last_used', 'size_mb', 'stats'}
+        self.active_key = None
+        # Routage : (clé candidate, pourcentage, 'ab' | 'shadow'), remplacé d'un bloc
+        self.routing = None
+        self._lock = threading.Lock()
+        self._shadow_jobs = None
+        self._rng = np.random.default_rng()
+    
+    # ---------- Interface WasteDetector ----------
+    
+    @property
+    def active_loader(self):
+        return self.loaders[self.active_key]
+    
+    @property
+    def model(self):
+        loader = self.loaders.get(self.active_key)
+        return loader.detector.model if loader and loader.state == 'ready' else None
+    
+    @property
+    def model_path(self):
+        return self.active_loader.model_path
+    
+    @property
+    def imgsz(self):
+        detector = self.active_loader.detector
+        return detector.imgsz if detector else IMG_SIZE
+    
+    def get(self):
+        """Le registre s'il peut servir (modèle actif prêt), sinon None ; lance le chargement"""
+        return self if self.active_loader.get() else None
+    
+    def warmup(self, sizes=WARM_IMG_SIZES):
+        # Chaque modèle est préchauffé par son ModelLoader avant d'être servi
+        return self.model is not None
+    
+    def _infer(self, images, options, method):
+        routing = self.routing
+        key, route = self.active_key, 'active'
+        if routing and self._rng.random() * 100 < routing[1] and self._ready(routing[0]):
+            if routing[2] == 'ab':
+                key, route = routing[0], 'ab'
+            else:
+                # Copie : l'appelant dessine ensuite sur ses frames
+                self._submit_shadow(routing[0], [image.copy() for image in images], options, method)
+        return self._timed_infer(key, route, images, options, method)
+    
+    def _timed_infer(self, key, route, images, options, method):
+        detector = self.loaders[key].detector
+        started = time.perf_counter()
+        results = detector._infer(images, options, method)
+        elapsed = time.perf_counter() - started
+        detections = sum(len(boxes) for boxes, _, _ in results)
+        
+        metrics.MODEL_INFERENCE_SECONDS.observe(elapsed, key, route)
+        metrics.MODEL_DETECTIONS.inc(key, route, amount=detections)
+        info = self.info[key]
+        info['last_used'] = time.monotonic()
+        with self._lock:
+            stats = info['stats'].setdefault(route, {'calls': 0, 'images': 0, 'seconds': 0.0, 'detections': 0})
+            stats['calls'] += 1
+            stats['images'] += len(images)
+            stats['seconds'] += elapsed
+            stats['detections'] += detections
+        return results
+    
+    # ---------- Fantôme ----------
+    
+    def _submit_shadow(self, key, images, options, method):
+        with self._lock:
+            if self._shadow_jobs is None:
+                self._shadow_jobs = queue.Queue(maxsize=SHADOW_QUEUE_SIZE)
+                threading.Thread(target=self._shadow_loop, name='model-shadow', daemon=True).start()
+        try:
+            self._shadow_jobs.put_nowait((key, images, options, method))
+        except queue.Full:
+            # Le fantôme ne doit jamais ralentir le trafic réel : on abandonne
+            metrics.SHADOW_DROPPED.inc()
+    
+    def _shadow_loop(self):
+        while True:
+            key, images, options, method = self._shadow_jobs.get()
+            try:
+                if self._ready(key):
+                    self._timed_infer(key, 'shadow', images, options, method)
+            except Exception as e:
+                print(f"⚠️ Inférence fantôme ({key}): {e}")
+    
+    # ---------- Administration ----------
+    
+    def _ready(self, key):
+        loader = self.loaders.get(key)
+        return loader is not None and loader.state == 'ready'
+    
+    def add(self, name, loader, version='1', activate=False):
+        """Enregistrer un ModelLoader existant (modèle de démarrage)"""
+        key = f"{name}:{version}"
+        self.loaders[key] = loader
+        self.info[key] = {'name': name, 'version': version, 'last_used': time.monotonic(),
+                          'size_mb': None, 'stats': {}}
+        if activate or self.active_key is None:
+            self.active_key = key
+        return key
+    
+    def load(self, name, model_path, version=None, activate=True):
+        """Charger et préchauffer un modèle en arrière-plan, puis l'activer s'il est prêt"""
+        version = version or datetime.now().strftime('%Y%m%d%H%M%S')
+        key = f"{name}:{version}"
+        with self._lock:
+            if key in self.loaders and self.loaders[key].state != 'failed':
+                raise ValueError(f"Modèle déjà enregistré: {key}")
+            loader = ModelLoader(model_path, factory=self.factory, cpus=self.cpus)
+            self.loaders[key] = loader
+            self.info[key] = {'name': name, 'version': version, 'last_used': time.monotonic(),
+                              'size_mb': None, 'stats': {}}
+        threading.Thread(target=self._load, args=(key, activate), name=f'model-load-{key}', daemon=True).start()
+        return key
+    
+    def _load(self, key, activate):
+        loader = self.loaders[key]
+        if not loader.load():
+            return
+        self.info[key]['size_mb'] = round(_model_size_mb(loader.detector), 1)
+        if activate:
+            self.activate(key)
+        self.evict()
+    
+    def activate(self, key):
+        """Basculer atomiquement le trafic vers un modèle prêt"""
+        if not self._ready(key):
+            raise ValueError(f"Modèle non prêt: {key}")
+        previous, self.active_key = self.active_key, key
+        routing = self.routing
+        if routing and routing[0] == key:
+            self.routing = None
+        print(f"🔁 Modèle actif: {previous} -> {key}")
+    
+    def set_routing(self, key=None, percent=0, mode='shadow'):
+        """Envoyer `percent` % du trafic au candidat `key` (mode 'ab' ou 'shadow'), None = arrêt"""
+        if key is None or percent <= 0:
+            self.routing = None
+            return
+        if key not in self.loaders:
+            raise ValueError(f"Modèle inconnu: {key}")
+        if mode not in ('ab', 'shadow'):
+            raise ValueError("mode doit être 'ab' ou 'shadow'")
+        if key == self.active_key:
+            raise ValueError("Le candidat doit être différent du modèle actif")
+        self.routing = (key, min(float(percent), 100.0), mode)
+    
+    def unload(self, key):
+        """Décharger un modèle (ni actif ni candidat)"""
+        with self._lock:
+            if key == self.active_key or (self.routing and self.routing[0] == key):
+                raise ValueError(f"Modèle en service: {key}")
+            if self.loaders.pop(key, None) is None:
+                raise ValueError(f"Modèle inconnu: {key}")
+            self.info.pop(key, None)
+        # Les requêtes en cours gardent leur référence ; la mémoire est libérée après elles
+        gc.collect()
+    
+    def evict(self):
+        """Décharger les modèles les moins récemment utilisés au-delà du plafond mémoire"""
+        protected = {self.active_key, self.routing[0] if self.routing else None}
+        while True:
+            with self._lock:
+                ready = [key for key in self.loaders if self._ready(key)]
+                total = sum(self.info[key]['size_mb'] or 0 for key in ready)
+                candidates = sorted((key for key in ready if key not in protected),
+                                    key=lambda key: self.info[key]['last_used'])
+            if total <= self.memory_cap_mb or not candidates:
+                return
+            print(f"🧹 Plafond mémoire ({total:.0f}/{self.memory_cap_mb:.0f} Mo) : déchargement de {candidates[0]}")
+            self.unload(candidates[0])
+    
+    def status(self):
+        """Modèles enregistrés, modèle actif, routage et statistiques par voie"""
+        now = time.monotonic()
+        models = []
+        for key, loader in list(self.loaders.items()):
+            info = self.info.get(key)
+            if info is None:
+                continue
+            with self._lock:
+                stats = {route: dict(values, mean_ms=round(values['seconds'] / values['calls'] * 1000, 2),
+                                     detections_per_image=round(values['detections'] / max(1, values['images']), 2))
+                         for route, values in info['stats'].items()}
+            models.append({
+                'key': key,
+                'name': info['name'],
+                'version': info['version'],
+                'active': key == self.active_key,
+                'size_mb': info['size_mb'],
+                'idle_s': round(now - info['last_used'], 1),
+                'loader': loader.status(),
+                'stats': stats
+            })
+        routing = self.routing
+        return {
+            'active': self.active_key,
+            'routing': {'candidate': routing[0], 'percent': routing[1], 'mode': routing[2]} if routing else None,
+            'memory_cap_mb': self.memory_cap_mb,
+            'models': models
+        }
+
 # ==================== TEST ====================
 
 if __name__ == "__main__":
-    if TORCH_AVAILABLE:
-        detector = WasteDetector()
-        print("✅ Détecteur YOLO initialisé")
+    loader = ModelLoader()
+    if loader.load():
+        print(f"✅ Détecteur YOLO initialisé: {loader.status()['timings']}")
     else:
         print("❌ Impossible d'initialiser YOLO")
\ No newline at end of file